@@ -0,0 +1,75 @@
+"""
+Compare the resident memory of a chain holding 1M transactions kept in memory against one whose
+older blocks are moved to a BlockArchive.
+
+Usage: python benchmarks/bench_archive.py [--transactions 1000000] [--per-block 100]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from archive import BlockArchive  # noqa: E402
+from blockchain import Blockchain  # noqa: E402
+
+# Distinct wallets, each with an address the size of a hex-encoded RSA-3072 public key
+WALLETS = 200
+ADDRESS_LENGTH = 844
+
+
+def rss_mb():
+    """
+    Current resident set size of this process, in MB
+    """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def build_chain(mode, transactions, per_block):
+    """
+    Grow a chain to the requested number of transactions and print the RSS it takes
+    """
+    directory = tempfile.TemporaryDirectory()
+    archive = BlockArchive(os.path.join(directory.name, 'chain')) if mode == 'archive' else None
+    baseline = rss_mb()
+    start = perf_counter()
+
+    blockchain = Blockchain(archive=archive)
+    for index in range(transactions):
+        # Addresses decoded from request or peer JSON are separate string objects
+        sender_address = ''.join(f'{index % WALLETS:04x}' for _ in range(ADDRESS_LENGTH // 4))
+        recipient_address = ''.join(f'{(index + 1) % WALLETS:04x}' for _ in range(ADDRESS_LENGTH // 4))
+        blockchain.add_pending_transaction(blockchain.create_transaction(sender_address, recipient_address, 1.0))
+        if len(blockchain.transactions) == per_block:
+            blockchain.create_block(nonce=index, previous_hash=blockchain.block_hashes[-1])
+
+    print(f"{mode:>8} {transactions:>13} {rss_mb() - baseline:>10.1f} {perf_counter() - start:>10.1f}")
+    directory.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--transactions', type=int, default=1_000_000)
+    parser.add_argument('--per-block', type=int, default=100)
+    parser.add_argument('--mode', choices=['memory', 'archive'])
+    args = parser.parse_args()
+
+    if args.mode:
+        build_chain(args.mode, args.transactions, args.per_block)
+        return
+
+    # Each mode runs in its own process so they don't share allocations
+    print(f"{'mode':>8} {'transactions':>13} {'RSS (MB)':>10} {'build (s)':>10}")
+    for mode in ('memory', 'archive'):
+        subprocess.run([sys.executable, __file__, '--mode', mode,
+                        '--transactions', str(args.transactions), '--per-block', str(args.per_block)], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark the Flask server against the async server under a growing number of concurrent connections.
+Each connection sends requests back to back: /chain/summary for a cheap route, and /nodes/resolve
+on a node with neighbours that take NEIGHBOUR_LATENCY seconds to answer for a route that waits on its peers.
+The load generator runs in its own process, as do the server and the neighbours.
+
+Usage: python benchmarks/bench_asgi.py
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+import aiohttp
+import requests
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+CONNECTIONS = (10, 100, 500)
+DURATION = 3.0
+NEIGHBOURS = 10
+NEIGHBOUR_LATENCY = 0.2
+PORT = 5700
+NEIGHBOUR_PORT = 5800
+
+
+def serve_flask(port):
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    make_server('127.0.0.1', port, create_app(), threaded=True).serve_forever()
+
+
+def serve_async(port):
+    import uvicorn
+    from app.asgi import AsyncApp
+
+    uvicorn.run(AsyncApp(), host='127.0.0.1', port=port, log_level='error', backlog=2048)
+
+
+def serve_neighbours():
+    from aiohttp import web
+
+    async def summary(request):
+        await asyncio.sleep(NEIGHBOUR_LATENCY)
+        # As long as the benchmarked node, so its resolves never download anything
+        return web.json_response({'length': 1, 'tip_hash': '0' * 64})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get('/chain/summary', summary)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        for port in range(NEIGHBOUR_PORT, NEIGHBOUR_PORT + NEIGHBOURS):
+            await web.TCPSite(runner, '127.0.0.1', port, backlog=4096).start()
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+async def load(port, path, connections):
+    """
+    Keep connections busy with back to back requests for DURATION seconds.
+    Returns the requests per second, the 50th and 99th percentile latencies and the number of failed requests.
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + DURATION
+
+    async def connection(session):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                async with session.get(f'http://127.0.0.1:{port}{path}') as response:
+                    await response.read()
+                    if response.status != 200:
+                        raise RuntimeError(response.status)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+                await asyncio.sleep(0.01)
+
+    connector = aiohttp.TCPConnector(limit=connections)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(connection(session) for _ in range(connections)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    if not latencies:
+        return 0, float('nan'), float('nan'), errors
+    return (len(latencies) / elapsed, latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)], errors)
+
+
+def run_load(port, path, connections, results):
+    results.put(asyncio.run(load(port, path, connections)))
+
+
+def wait_until_up(port):
+    for _ in range(100):
+        try:
+            requests.get(f'http://127.0.0.1:{port}/chain/summary', timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+def main():
+    neighbours = multiprocessing.Process(target=serve_neighbours, daemon=True)
+    neighbours.start()
+
+    print(f"{'server':>7} {'route':>15} {'connections':>12} {'requests/sec':>13} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'errors':>7}")
+    for name, serve in (('flask', serve_flask), ('async', serve_async)):
+        server = multiprocessing.Process(target=serve, args=(PORT,), daemon=True)
+        server.start()
+        wait_until_up(PORT)
+        requests.post(f'http://127.0.0.1:{PORT}/nodes/register',
+                      json={'nodes': [f'http://127.0.0.1:{port}'
+                                      for port in range(NEIGHBOUR_PORT, NEIGHBOUR_PORT + NEIGHBOURS)]})
+
+        for path in ('/chain/summary', '/nodes/resolve'):
+            for connections in CONNECTIONS:
+                results = multiprocessing.Queue()
+                generator = multiprocessing.Process(target=run_load, args=(PORT, path, connections, results))
+                generator.start()
+                rate, p50, p99, errors = results.get()
+                generator.join()
+                print(f"{name:>7} {path:>15} {connections:>12} {rate:>13.0f} {p50 * 1000:>8.1f} "
+                      f"{p99 * 1000:>8.1f} {errors:>7}", flush=True)
+
+        server.terminate()
+        server.join()
+
+    neighbours.terminate()
+    neighbours.join()
+
+
+if __name__ == '__main__':
+    main()
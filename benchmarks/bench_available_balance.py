@@ -0,0 +1,35 @@
+"""
+Benchmark Blockchain.get_available_balance latency as the transaction pool grows.
+
+Usage: python benchmarks/bench_available_balance.py
+"""
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain, MINING_SENDER  # noqa: E402
+
+POOL_SIZES = [10, 100, 1_000, 10_000, 50_000]
+LOOKUPS = 10_000
+
+
+def main():
+    blockchain = Blockchain()
+
+    print(f"{'pending':>8} {'get_available_balance (us)':>28}")
+    for size in POOL_SIZES:
+        # Fill the pool with unsigned transactions spread over a hundred recipients, all with different values
+        while len(blockchain.transactions) < size:
+            recipient_address = f'address_{len(blockchain.transactions) % 100}'
+            blockchain.submit_transaction(MINING_SENDER, None, recipient_address, float(len(blockchain.transactions)))
+
+        seconds = timeit(lambda: blockchain.get_available_balance('address_0'), number=LOOKUPS)
+        print(f"{size:>8} {seconds / LOOKUPS * 1e6:>28.3f}")
+
+
+if __name__ == '__main__':
+    main()
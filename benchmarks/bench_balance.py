@@ -0,0 +1,37 @@
+"""
+Benchmark Blockchain.get_balance latency as the chain grows.
+
+Usage: python benchmarks/bench_balance.py
+"""
+import os
+import sys
+from timeit import timeit
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+
+CHAIN_SIZES = [10, 100, 1_000, 10_000, 100_000]
+LOOKUPS = 10_000
+
+
+def main():
+    blockchain = Blockchain()
+    miner_address = 'miner_address'
+
+    print(f"{'blocks':>8} {'get_balance (us)':>18}")
+    for size in CHAIN_SIZES:
+        # Grow the chain up to the requested size, one reward per block
+        while len(blockchain.chain) < size:
+            blockchain.submit_transaction(
+                MINING_SENDER, None, miner_address, MINING_REWARD)
+            blockchain.create_block(nonce=0, previous_hash='00')
+
+        seconds = timeit(lambda: blockchain.get_balance(miner_address), number=LOOKUPS)
+        print(f"{size:>8} {seconds / LOOKUPS * 1e6:>18.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Compare the throughput of submitting transactions one request at a time through /transactions/new
+against a single /transactions/batch request, signed inline and on a pool of worker processes.
+
+Usage: python benchmarks/bench_batch_transactions.py [--transactions 500] [--workers N]
+"""
+import argparse
+import binascii
+import os
+import sys
+from time import perf_counter
+from Crypto.PublicKey import RSA
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from app import create_app, routes  # noqa: E402
+from blockchain import Blockchain, MINING_SENDER  # noqa: E402
+
+# Same key size as /wallet/new
+KEY_SIZE = 3072
+WALLETS = 10
+
+
+def new_wallet():
+    private_key = RSA.generate(KEY_SIZE)
+    return (binascii.hexlify(private_key.publickey().exportKey(format='DER')).decode('ascii'),
+            binascii.hexlify(private_key.exportKey(format='DER')).decode('ascii'))
+
+
+def funded_blockchain(wallets, transactions):
+    """
+    Fresh blockchain where every wallet can afford all the transactions it sends
+    """
+    blockchain = Blockchain()
+    for public_key, _ in wallets:
+        blockchain.submit_transaction(MINING_SENDER, None, public_key, float(transactions))
+    blockchain.create_block(nonce=0, previous_hash='00')
+    return blockchain
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--transactions', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    wallets = [new_wallet() for _ in range(WALLETS)]
+    for public_key, private_key in wallets:
+        routes.wallets[public_key] = {'private_key': private_key, 'balance': 0.0}
+
+    payload = [{
+        'sender_address': wallets[index % WALLETS][0],
+        'sender_private_key': wallets[index % WALLETS][1],
+        'recipient_address': wallets[(index + 1) % WALLETS][0],
+        'amount': 1.0
+    } for index in range(args.transactions)]
+
+    client = create_app().test_client()
+
+    print(f"{'path':>22} {'transactions/s':>15}")
+
+    routes.blockchain = funded_blockchain(wallets, args.transactions)
+    start = perf_counter()
+    for transaction in payload:
+        client.post('/transactions/new', json=transaction)
+    print(f"{'/transactions/new':>22} {args.transactions / (perf_counter() - start):>15.1f}")
+
+    for workers in sorted({1, args.workers}):
+        routes.blockchain = funded_blockchain(wallets, args.transactions)
+        sign_transactions = routes.blockchain.sign_transactions
+        routes.blockchain.sign_transactions = lambda batch: sign_transactions(batch, workers=workers)
+
+        start = perf_counter()
+        response = client.post('/transactions/batch', json={'transactions': payload})
+        throughput = args.transactions / (perf_counter() - start)
+        assert response.get_json()['accepted'] == args.transactions
+
+        print(f"{f'/transactions/batch x{workers}':>22} {throughput:>15.1f}")
+        if routes.blockchain.signing_pool is not None:
+            routes.blockchain.signing_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
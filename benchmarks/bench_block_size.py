@@ -0,0 +1,59 @@
+"""
+Benchmark the cost of one block after a spike of SPIKE signed transactions, when a block takes the whole pool
+and when it takes at most 1000 transactions: proof of work, block hash, JSON size and validation by a peer.
+
+Usage: python benchmarks/bench_block_size.py
+"""
+import json
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+import blockchain as blockchain_module  # noqa: E402
+from blockchain import Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+from keys import KEY_SCHEMES  # noqa: E402
+
+SPIKE = 20_000
+LIMITS = (None, 1_000)
+
+
+def main():
+    public_key, private_key = KEY_SCHEMES['ed25519'].generate()
+    recipient_address, _ = KEY_SCHEMES['ed25519'].generate()
+
+    print(f"{'max per block':>14} {'transactions':>13} {'proof of work (ms)':>19} {'hash (ms)':>10} "
+          f"{'JSON (MB)':>10} {'validate (s)':>13}")
+    for limit in LIMITS:
+        blockchain_module.MAX_BLOCK_TRANSACTIONS = SPIKE if limit is None else limit
+        blockchain = Blockchain()
+        for index in range(SPIKE):
+            blockchain.submit_transaction(public_key, private_key, recipient_address, float(index))
+
+        transactions = blockchain.block_transactions()
+        start = perf_counter()
+        nonce = blockchain.proof_of_work(transactions=transactions)
+        proof_of_work = perf_counter() - start
+
+        reward = blockchain.create_transaction(MINING_SENDER, public_key, MINING_REWARD)
+        block = blockchain.create_block(nonce, blockchain.block_hash(blockchain.chain[-1]),
+                                        transactions=transactions + [reward])
+
+        start = perf_counter()
+        blockchain.hash(block)
+        block_hash = perf_counter() - start
+
+        # A peer that never saw the transactions checks their signatures
+        start = perf_counter()
+        assert Blockchain().valid_blocks(blockchain.chain[0], [block])
+        validate = perf_counter() - start
+
+        print(f"{limit or 'none':>14} {len(block['transactions']):>13} {proof_of_work * 1000:>19.1f} "
+              f"{block_hash * 1000:>10.1f} {len(json.dumps(block)) / 1e6:>10.2f} {validate:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
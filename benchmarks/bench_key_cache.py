@@ -0,0 +1,57 @@
+"""
+Benchmark submit_transaction latency for a few wallets that keep transacting,
+with the parsed RSA keys cached against parsing them for every transaction.
+
+Usage: python benchmarks/bench_key_cache.py
+"""
+import binascii
+import os
+import sys
+from time import perf_counter
+from Crypto.PublicKey import RSA
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain  # noqa: E402
+from keys import KeyCache  # noqa: E402
+
+# Same key size as /wallet/new
+KEY_SIZE = 3072
+WALLETS = 10
+TRANSACTIONS = 200
+
+
+def new_wallet():
+    private_key = RSA.generate(KEY_SIZE)
+    return (binascii.hexlify(private_key.publickey().exportKey(format='DER')).decode('ascii'),
+            binascii.hexlify(private_key.exportKey(format='DER')).decode('ascii'))
+
+
+def submit_latency(blockchain, wallets):
+    """
+    Average time to sign and verify a transaction, cycling over the wallets as senders
+    """
+    start = perf_counter()
+    for index in range(TRANSACTIONS):
+        public_key, private_key = wallets[index % len(wallets)]
+        recipient_address = wallets[(index + 1) % len(wallets)][0]
+        blockchain.submit_transaction(public_key, private_key, recipient_address, 1.0)
+    return (perf_counter() - start) / TRANSACTIONS
+
+
+def main():
+    wallets = [new_wallet() for _ in range(WALLETS)]
+
+    print(f"{'key cache':>10} {'latency (ms)':>13} {'hits':>6} {'misses':>7}")
+    for label, maxsize in (('off', 0), ('on', WALLETS)):
+        blockchain = Blockchain()
+        blockchain.keys = KeyCache(maxsize=maxsize)
+        latency = submit_latency(blockchain, wallets)
+        stats = blockchain.keys.stats()
+        print(f"{label:>10} {latency * 1e3:>13.3f} {stats['hits']:>6} {stats['misses']:>7}")
+
+
+if __name__ == '__main__':
+    main()
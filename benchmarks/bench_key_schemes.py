@@ -0,0 +1,47 @@
+"""
+Compare the wallet key schemes: key generation, signing and verification time, and address size.
+
+Usage: python benchmarks/bench_key_schemes.py
+"""
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from keys import KEY_SCHEMES  # noqa: E402
+
+KEY_PAIRS = {'rsa': 5, 'ed25519': 200}
+SIGNATURES = 200
+# A transaction as it is signed, with an RSA-sized address on both sides
+MESSAGE = b'{"recipient_address":"' + b'a' * 844 + b'","sender_address":"' + b'b' * 844 + b'","value":1.0}'
+
+
+def main():
+    print(f"{'scheme':>8} {'keygen (ms)':>12} {'sign (ms)':>10} {'verify (ms)':>12} {'address (chars)':>16}")
+    for name, scheme in KEY_SCHEMES.items():
+        start = perf_counter()
+        key_pairs = [scheme.generate() for _ in range(KEY_PAIRS[name])]
+        keygen = (perf_counter() - start) / KEY_PAIRS[name]
+
+        public_key, private_key = key_pairs[0]
+        signer = scheme.import_private_key(private_key)
+        verifier = scheme.import_public_key(public_key)
+
+        start = perf_counter()
+        for _ in range(SIGNATURES):
+            signature = signer.sign(MESSAGE)
+        sign = (perf_counter() - start) / SIGNATURES
+
+        start = perf_counter()
+        for _ in range(SIGNATURES):
+            assert verifier.verify(MESSAGE, signature)
+        verify = (perf_counter() - start) / SIGNATURES
+
+        print(f"{name:>8} {keygen * 1e3:>12.1f} {sign * 1e3:>10.3f} {verify * 1e3:>12.3f} {len(public_key):>16}")
+
+
+if __name__ == '__main__':
+    main()
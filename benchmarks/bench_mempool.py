@@ -0,0 +1,73 @@
+"""
+Benchmark the transactions pool as it grows: mining a block of BLOCK_SIZE of its transactions,
+listing the pending transactions of one address, and checking whether a transaction is already pending.
+The list the pool used to be, which rebuilt itself around every mined block and had to be scanned
+for everything else, is measured next to the mempool.
+
+Usage: python benchmarks/bench_mempool.py
+"""
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain, MINING_SENDER  # noqa: E402
+from mempool import transaction_hash  # noqa: E402
+
+POOL_SIZES = [1_000, 10_000, 100_000]
+BLOCK_SIZE = 1_000
+ADDRESSES = 1_000
+LOOKUPS = 100
+
+
+def list_pool_mine(blockchain, pool, block):
+    """
+    Take a block out of a list pool and rebuild the pending totals, as create_block used to
+    """
+    mined = set(map(id, block))
+    remaining = [transaction for transaction in pool if id(transaction) not in mined]
+    debits, credits = {}, {}
+    for transaction in remaining:
+        sender_id, recipient_id = blockchain.intern_transaction(transaction)
+        debits[sender_id] = debits.get(sender_id, 0) + transaction['value']
+        credits[recipient_id] = credits.get(recipient_id, 0) + transaction['value']
+    return remaining
+
+
+def timed(function, repeat=1):
+    start = perf_counter()
+    for _ in range(repeat):
+        function()
+    return (perf_counter() - start) / repeat * 1000
+
+
+def main():
+    print(f"{'pending':>8} {'pool':>8} {'mine block (ms)':>16} {'by address (ms)':>16} {'is pending (ms)':>16}")
+    for size in POOL_SIZES:
+        blockchain = Blockchain()
+        for index in range(size):
+            blockchain.submit_transaction(MINING_SENDER, None, f'address_{index % ADDRESSES}', float(index))
+        pool = list(blockchain.transactions)
+        block = pool[:BLOCK_SIZE]
+        # Submitted again, as a replayed request would
+        replayed = dict(pool[-1])
+
+        mine = timed(lambda: list_pool_mine(blockchain, pool, block))
+        by_address = timed(lambda: [transaction for transaction in pool
+                                    if 'address_7' in (transaction['sender_address'], transaction['recipient_address'])],
+                           repeat=LOOKUPS)
+        is_pending = timed(lambda: replayed in pool, repeat=LOOKUPS)
+        print(f"{size:>8} {'list':>8} {mine:>16.2f} {by_address:>16.3f} {is_pending:>16.3f}")
+
+        by_address = timed(lambda: blockchain.pending_transactions('address_7'), repeat=LOOKUPS)
+        is_pending = timed(lambda: transaction_hash(replayed) in blockchain.transactions, repeat=LOOKUPS)
+        # Only the pool's part of create_block
+        mine = timed(lambda: blockchain.remove_pending_transactions(map(transaction_hash, block)))
+        print(f"{size:>8} {'mempool':>8} {mine:>16.2f} {by_address:>16.3f} {is_pending:>16.3f}")
+
+
+if __name__ == '__main__':
+    main()
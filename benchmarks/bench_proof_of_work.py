@@ -0,0 +1,45 @@
+"""
+Benchmark proof_of_work hash rate and time-to-block against the number of mining workers.
+
+Usage: python benchmarks/bench_proof_of_work.py [--difficulties 3 4 5 6] [--workers 1 2 4 8] [--blocks 3]
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain, MINING_SENDER  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--difficulties', type=int, nargs='+', default=[3, 4, 5, 6])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count()])
+    parser.add_argument('--blocks', type=int, default=3, help='blocks mined per measurement')
+    args = parser.parse_args()
+
+    print(f"{'difficulty':>10} {'workers':>8} {'time-to-block (s)':>18} {'hashes/s':>12}")
+    for difficulty in args.difficulties:
+        for workers in sorted(set(args.workers)):
+            blockchain = Blockchain()
+            elapsed = 0.0
+            hashes = 0
+
+            for _ in range(args.blocks):
+                blockchain.submit_transaction(MINING_SENDER, None, 'miner_address', 1.0)
+                start = perf_counter()
+                nonce = blockchain.proof_of_work(workers=workers, difficulty=difficulty)
+                elapsed += perf_counter() - start
+                # Workers interleave the nonce space, so roughly nonce hashes were computed in total
+                hashes += nonce + 1
+                blockchain.create_block(nonce, blockchain.hash(blockchain.chain[-1]))
+
+            print(f"{difficulty:>10} {workers:>8} {elapsed / args.blocks:>18.3f} {hashes / elapsed:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
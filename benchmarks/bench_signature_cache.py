@@ -0,0 +1,63 @@
+"""
+Benchmark validating a peer chain full of signed transactions on a node that never saw them
+against the node that accepted them, whose verified-signature cache already holds them.
+
+Usage: python benchmarks/bench_signature_cache.py
+"""
+import binascii
+import copy
+import os
+import sys
+from time import perf_counter
+from Crypto.PublicKey import RSA
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+
+# Same key size as /wallet/new
+KEY_SIZE = 3072
+WALLETS = 10
+BLOCKS = 50
+TRANSACTIONS_PER_BLOCK = 20
+
+
+def new_wallet():
+    private_key = RSA.generate(KEY_SIZE)
+    return (binascii.hexlify(private_key.publickey().exportKey(format='DER')).decode('ascii'),
+            binascii.hexlify(private_key.exportKey(format='DER')).decode('ascii'))
+
+
+def main():
+    wallets = [new_wallet() for _ in range(WALLETS)]
+
+    # The node that accepts every transaction and mines the chain
+    blockchain = Blockchain()
+    for block in range(BLOCKS):
+        for index in range(TRANSACTIONS_PER_BLOCK):
+            sender_address, sender_private_key = wallets[index % WALLETS]
+            recipient_address = wallets[(index + 1) % WALLETS][0]
+            blockchain.submit_transaction(
+                sender_address, sender_private_key, recipient_address, float(block * TRANSACTIONS_PER_BLOCK + index))
+
+        previous_hash = blockchain.block_hash(blockchain.chain[-1])
+        nonce = blockchain.proof_of_work()
+        blockchain.submit_transaction(MINING_SENDER, None, wallets[0][0], MINING_REWARD)
+        blockchain.create_block(nonce=nonce, previous_hash=previous_hash)
+
+    # The same chain as it would come back from a peer
+    chain = copy.deepcopy(list(blockchain.chain))
+
+    print(f"{'node':>10} {'valid_chain (ms)':>17} {'verifications':>14}")
+    for label, node in (('new', Blockchain()), ('accepted', blockchain)):
+        misses = node.signatures.stats()['misses']
+        start = perf_counter()
+        assert node.valid_chain(chain)
+        elapsed = perf_counter() - start
+        print(f"{label:>10} {elapsed * 1e3:>17.1f} {node.signatures.stats()['misses'] - misses:>14}")
+
+
+if __name__ == '__main__':
+    main()
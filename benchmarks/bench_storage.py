@@ -0,0 +1,47 @@
+"""
+Benchmark node startup time when the chain is replayed from a BlockStore.
+
+Usage: python benchmarks/bench_storage.py
+"""
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+from storage import BlockStore  # noqa: E402
+
+CHAIN_SIZES = [10_000, 100_000]
+
+
+def main():
+    print(f"{'blocks':>8} {'startup (s)':>12}")
+    for size in CHAIN_SIZES:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'chain.db')
+
+            # Build the chain in memory, then write it in a single transaction
+            blockchain = Blockchain()
+            while len(blockchain.chain) < size:
+                blockchain.submit_transaction(MINING_SENDER, None, f'miner_{len(blockchain.chain) % 100}', MINING_REWARD)
+                blockchain.create_block(nonce=0, previous_hash=blockchain.block_hashes[-1])
+            store = BlockStore(path)
+            store.replace_blocks(fork=0, blocks=blockchain.chain, hashes=blockchain.block_hashes)
+            store.close()
+
+            start = perf_counter()
+            store = BlockStore(path)
+            restarted = Blockchain(store=store)
+            elapsed = perf_counter() - start
+            store.close()
+
+            assert len(restarted.chain) == size
+            print(f"{size:>8} {elapsed:>12.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark serving /chain for long chains: time to the first byte and peak memory of the response
+when the whole chain is built into one jsonify document, against streaming it as JSON and as NDJSON.
+
+Usage: python benchmarks/bench_stream_chain.py
+"""
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+from flask import jsonify
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from app import create_app  # noqa: E402
+from app import routes  # noqa: E402
+from blockchain import MINING_REWARD, MINING_SENDER  # noqa: E402
+
+CHAIN_LENGTHS = (1_000, 10_000, 100_000)
+TRANSACTIONS_PER_BLOCK = 5
+
+
+def grow_chain(blockchain, length):
+    while len(blockchain.chain) < length:
+        for index in range(TRANSACTIONS_PER_BLOCK):
+            blockchain.submit_transaction(MINING_SENDER, None, f'address_{index}', MINING_REWARD)
+        blockchain.create_block(nonce=len(blockchain.chain), previous_hash=blockchain.block_hashes[-1])
+
+
+def measure(app, read):
+    """
+    Time to the first chunk of a response and peak memory allocated until it is fully read
+    """
+    tracemalloc.start()
+    start = perf_counter()
+    with app.test_request_context():
+        chunks = read()
+        first_byte = next(chunks)
+        elapsed = perf_counter() - start
+        size = len(first_byte) + sum(len(chunk) for chunk in chunks)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def main():
+    app = create_app()
+    client = app.test_client()
+    blockchain = routes.blockchain
+
+    def whole():
+        # What /chain used to do
+        response = jsonify({'chain': list(blockchain.chain), 'length': len(blockchain.chain)})
+        return iter(response.response)
+
+    def streamed(accept):
+        return lambda: iter(client.get('/chain', headers={'Accept': accept}, buffered=False).response)
+
+    print(f"{'blocks':>8} {'response':>10} {'first byte (ms)':>16} {'peak memory (MB)':>17} {'size (MB)':>10}")
+    for length in CHAIN_LENGTHS:
+        grow_chain(blockchain, length)
+        for label, read in (('jsonify', whole), ('json', streamed('application/json')),
+                            ('ndjson', streamed('application/x-ndjson'))):
+            elapsed, peak, size = measure(app, read)
+            print(f"{length:>8} {label:>10} {elapsed * 1e3:>16.1f} {peak / 2**20:>17.1f} {size / 2**20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
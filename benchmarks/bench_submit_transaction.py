@@ -0,0 +1,85 @@
+"""
+Compare submit_transaction throughput when the node signs and then verifies its own signature,
+when it only signs after checking the private key is the sender's, and when clients send pre-signed
+transactions the node only verifies.
+
+Usage: python benchmarks/bench_submit_transaction.py
+"""
+import binascii
+import os
+import sys
+from time import perf_counter
+from Crypto.PublicKey import RSA
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain  # noqa: E402
+
+# Same key size as /wallet/new
+KEY_SIZE = 3072
+WALLETS = 10
+TRANSACTIONS = 200
+
+
+def new_wallet():
+    private_key = RSA.generate(KEY_SIZE)
+    return (binascii.hexlify(private_key.publickey().exportKey(format='DER')).decode('ascii'),
+            binascii.hexlify(private_key.exportKey(format='DER')).decode('ascii'))
+
+
+def sign_then_verify(blockchain, sender_address, sender_private_key, recipient_address, value, signature, sequence):
+    """
+    The submit path before the self-verify was dropped
+    """
+    transaction = blockchain.create_transaction(
+        sender_address, recipient_address, value, blockchain.next_sequence(sender_address))
+    transaction_signature = blockchain.sign_transaction(sender_private_key, transaction)
+    if blockchain.verify_transaction_signature(sender_address, transaction_signature, transaction):
+        blockchain.add_pending_transaction(transaction)
+
+
+def node_signed(blockchain, sender_address, sender_private_key, recipient_address, value, signature, sequence):
+    blockchain.submit_transaction(sender_address, sender_private_key, recipient_address, value)
+
+
+def presigned(blockchain, sender_address, sender_private_key, recipient_address, value, signature, sequence):
+    blockchain.submit_transaction(sender_address, None, recipient_address, value, signature=signature,
+                                  sequence=sequence)
+
+
+def main():
+    wallets = [new_wallet() for _ in range(WALLETS)]
+
+    # Clients sign their transactions ahead of time
+    signer = Blockchain()
+    submissions = []
+    for index in range(TRANSACTIONS):
+        sender_address, sender_private_key = wallets[index % WALLETS]
+        recipient_address = wallets[(index + 1) % WALLETS][0]
+        # Every sender numbers its transactions from 1
+        transaction = signer.create_transaction(sender_address, recipient_address, float(index), index // WALLETS + 1)
+        signature = signer.sign_transaction(sender_private_key, transaction)
+        submissions.append((sender_address, sender_private_key, recipient_address, float(index), signature,
+                            transaction['sequence']))
+
+    print(f"{'mode':>18} {'transactions/s':>15}")
+    for label, submit in (('sign + verify', sign_then_verify), ('sign only', node_signed), ('pre-signed', presigned)):
+        blockchain = Blockchain()
+        # Parse every key up front, so only the RSA operations are measured
+        for sender_address, sender_private_key in wallets:
+            blockchain.keys.signer(sender_private_key)
+            blockchain.keys.verifier(sender_address)
+
+        start = perf_counter()
+        for submission in submissions:
+            submit(blockchain, *submission)
+        throughput = TRANSACTIONS / (perf_counter() - start)
+
+        assert len(blockchain.transactions) == TRANSACTIONS
+        print(f"{label:>18} {throughput:>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
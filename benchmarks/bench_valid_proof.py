@@ -0,0 +1,47 @@
+"""
+Microbenchmark the nonce search of proof_of_work against calling valid_proof for every nonce.
+
+Usage: python benchmarks/bench_valid_proof.py
+"""
+import hashlib
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain, MINING_SENDER, difficulty_target, search_nonce_range  # noqa: E402
+
+POOL_SIZES = [1, 100, 10_000]
+# Unreachable difficulty, so both paths try exactly NONCES nonces
+DIFFICULTY = 64
+NONCES = 2_000
+
+
+def main():
+    print(f"{'pending':>8} {'valid_proof (hash/s)':>22} {'prefix reuse (hash/s)':>22} {'speedup':>8}")
+    for size in POOL_SIZES:
+        blockchain = Blockchain()
+        for index in range(size):
+            blockchain.submit_transaction(MINING_SENDER, None, f'address_{index}', 1.0)
+        transactions = list(blockchain.transactions)
+        last_hash = blockchain.hash(blockchain.chain[-1])
+
+        start = perf_counter()
+        for nonce in range(NONCES):
+            blockchain.valid_proof(transactions, last_hash, nonce, difficulty=DIFFICULTY)
+        baseline = NONCES / (perf_counter() - start)
+
+        # The same guess prefix proof_of_work hashes, serialized once
+        start = perf_counter()
+        prefix_state = hashlib.sha256((str(blockchain.proof_transactions(transactions))+str(last_hash)).encode())
+        search_nonce_range(prefix_state, difficulty_target(DIFFICULTY), 0, 1, NONCES)
+        fast = NONCES / (perf_counter() - start)
+
+        print(f"{size:>8} {baseline:>22.0f} {fast:>22.0f} {fast / baseline:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
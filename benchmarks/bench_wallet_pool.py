@@ -0,0 +1,62 @@
+"""
+Benchmark /wallet/new latency under a burst of concurrent requests, with every key pair generated
+in the request against a key pool filled ahead of the burst.
+
+Usage: python benchmarks/bench_wallet_pool.py [--requests 100] [--concurrency 16]
+"""
+import argparse
+import os
+import statistics
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from app import create_app, routes  # noqa: E402
+from keypool import KeyPool, WALLET_POOL_WORKERS  # noqa: E402
+
+
+def timed_request(client):
+    start = perf_counter()
+    response = client.post('/wallet/new')
+    assert response.status_code == 200
+    return perf_counter() - start
+
+
+def burst(requests, concurrency):
+    """
+    Send all the requests at once and return their latencies
+    """
+    client = create_app().test_client()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(lambda _: timed_request(client), range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--workers', type=int, default=WALLET_POOL_WORKERS)
+    args = parser.parse_args()
+
+    print(f"{'key pairs':>10} {'p50 (ms)':>10} {'p95 (ms)':>10} {'max (ms)':>10} {'burst (s)':>10}")
+    for label, size in (('inline', 0), ('pool', args.requests)):
+        routes.key_pool = KeyPool(size=size, workers=args.workers)
+        routes.key_pool.start()
+        # The pool is filled before the burst arrives, which is what it is for
+        routes.key_pool.wait_full()
+
+        start = perf_counter()
+        latencies = sorted(burst(args.requests, args.concurrency))
+        elapsed = perf_counter() - start
+
+        p50 = statistics.median(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{label:>10} {p50 * 1e3:>10.1f} {p95 * 1e3:>10.1f} {latencies[-1] * 1e3:>10.1f} {elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
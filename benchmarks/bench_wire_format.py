@@ -0,0 +1,81 @@
+"""
+Benchmark the formats a chain of 10k blocks can be sent to a neighbour in:
+bytes on the wire and decode time of JSON, NDJSON and the binary block format, uncompressed and with zlib.
+
+Usage: python benchmarks/bench_wire_format.py
+"""
+import json
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from blockchain import Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+from wire import decode_blocks, encode_blocks  # noqa: E402
+
+BLOCKS = 10_000
+WALLETS = 50
+TRANSACTIONS_PER_BLOCK = 5
+# Hex lengths of an RSA-3072 address and signature
+ADDRESS_LENGTH = 2 * 422
+SIGNATURE_LENGTH = 2 * 384
+CHUNK_SIZE = 64 * 1024
+
+
+def build_chain():
+    # Addresses and signatures only need the right shape to be encoded, they are never verified here
+    wallets = [os.urandom(ADDRESS_LENGTH // 2).hex() for _ in range(WALLETS)]
+    blockchain = Blockchain()
+    for block in range(BLOCKS):
+        transactions = [{
+            'sender_address': wallets[(block + index) % WALLETS],
+            'recipient_address': wallets[(block + index + 1) % WALLETS],
+            'value': float(index),
+            'signature': os.urandom(SIGNATURE_LENGTH // 2).hex()
+        } for index in range(TRANSACTIONS_PER_BLOCK)]
+        transactions.append({
+            'sender_address': MINING_SENDER, 'recipient_address': wallets[block % WALLETS], 'value': MINING_REWARD})
+        blockchain.create_block(nonce=block, previous_hash=blockchain.block_hashes[-1], transactions=transactions)
+    return list(blockchain.chain)
+
+
+def chunks(data):
+    return (data[offset:offset + CHUNK_SIZE] for offset in range(0, len(data), CHUNK_SIZE))
+
+
+def main():
+    chain = build_chain()
+
+    formats = (
+        ('json', lambda: json.dumps({'chain': chain, 'length': len(chain)}).encode(),
+         lambda data: json.loads(data)['chain']),
+        ('ndjson', lambda: ''.join(json.dumps(block) + '\n' for block in chain).encode(),
+         lambda data: [json.loads(line) for line in data.splitlines()]),
+        ('binary', lambda: b''.join(encode_blocks(chain, level=0)),
+         lambda data: list(decode_blocks(chunks(data)))),
+        ('binary+zlib', lambda: b''.join(encode_blocks(chain, level=1)),
+         lambda data: list(decode_blocks(chunks(data)))),
+    )
+
+    print(f"{'format':>12} {'size (MB)':>10} {'ratio':>6} {'encode (ms)':>12} {'decode (ms)':>12}")
+    json_size = None
+    for label, encode, decode in formats:
+        start = perf_counter()
+        data = encode()
+        encoded = perf_counter() - start
+
+        start = perf_counter()
+        blocks = decode(data)
+        decoded = perf_counter() - start
+        assert blocks == chain
+
+        json_size = json_size or len(data)
+        print(f"{label:>12} {len(data) / 2**20:>10.1f} {len(data) / json_size:>6.2f} "
+              f"{encoded * 1e3:>12.1f} {decoded * 1e3:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark read throughput of one node served by 1, 2 and 4 worker processes sharing their state
+through the SQLite store, like WSGI workers behind a load balancer.
+Each worker serves /chain/summary and /transactions/get on its own port and the clients spread over them.
+
+Usage: python benchmarks/bench_workers.py
+"""
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+WORKER_COUNTS = (1, 2, 4)
+CLIENTS = 8
+DURATION = 5.0
+BASE_PORT = 5600
+PATHS = ('/chain/summary', '/transactions/get')
+
+
+def serve(path, port):
+    # The store is configured through the environment before the routes create the node
+    os.environ['BLOCKCHAIN_DB'] = path
+    os.environ['BLOCKCHAIN_DB_SHARED'] = '1'
+    from werkzeug.serving import make_server
+    from app import create_app
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    make_server('127.0.0.1', port, create_app(), threaded=True).serve_forever()
+
+
+def client(ports, index, deadline, counts):
+    session = requests.Session()
+    done = 0
+    while time.time() < deadline:
+        port = ports[(index + done) % len(ports)]
+        response = session.get(f'http://127.0.0.1:{port}{PATHS[done % len(PATHS)]}')
+        assert response.status_code == 200
+        done += 1
+    counts.put(done)
+
+
+def wait_until_up(port):
+    for _ in range(100):
+        try:
+            requests.get(f'http://127.0.0.1:{port}/chain/summary', timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Worker on port {port} did not start')
+
+
+def main():
+    print(f"{'workers':>8} {'requests/sec':>13} {'consistent':>11}")
+    for workers in WORKER_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'chain.db')
+            ports = [BASE_PORT + index for index in range(workers)]
+            servers = [multiprocessing.Process(target=serve, args=(path, port), daemon=True) for port in ports]
+            for server in servers:
+                server.start()
+            for port in ports:
+                wait_until_up(port)
+
+            # A block mined by the first worker is seen by every worker
+            wallet = requests.post(f'http://127.0.0.1:{ports[0]}/wallet/new', json={'scheme': 'ed25519'}).json()
+            job = requests.post(f'http://127.0.0.1:{ports[0]}/mine', json={'miner_address': wallet['public_key']}).json()
+            while requests.get(f"http://127.0.0.1:{ports[0]}/mine/status/{job['job_id']}").json()['status'] != 'completed':
+                time.sleep(0.05)
+            summaries = {tuple(requests.get(f'http://127.0.0.1:{port}/chain/summary').json().values()) for port in ports}
+            consistent = len(summaries) == 1 and summaries.pop()[0] == 2
+
+            counts = multiprocessing.Queue()
+            deadline = time.time() + DURATION
+            clients = [multiprocessing.Process(target=client, args=(ports, index, deadline, counts))
+                       for index in range(CLIENTS)]
+            for process in clients:
+                process.start()
+            total = sum(counts.get() for _ in clients)
+            for process in clients:
+                process.join()
+            for server in servers:
+                server.terminate()
+                server.join()
+
+            print(f"{workers:>8} {total / DURATION:>13.0f} {str(consistent):>11}")
+
+
+if __name__ == '__main__':
+    main()
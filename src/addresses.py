@@ -0,0 +1,54 @@
+import threading
+
+
+class AddressRegistry:
+    """
+    Interning table of wallet addresses.
+    Every address seen by the node gets a small integer id, used as the key of the balance indexes,
+    and a single shared string object, used by every transaction that refers to it.
+    """
+
+    def __init__(self):
+
+        self.ids = {}
+        self.addresses = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __contains__(self, address):
+        return address in self.ids
+
+    def intern(self, address):
+        """
+        Id of an address, registering it if it is new
+        """
+        address_id = self.ids.get(address)
+        if address_id is None:
+            with self.lock:
+                address_id = self.ids.get(address)
+                if address_id is None:
+                    # The address goes in the list first, so an id is never seen before it can be expanded
+                    address_id = len(self.addresses)
+                    self.addresses.append(address)
+                    self.ids[address] = address_id
+        return address_id
+
+    def lookup(self, address):
+        """
+        Id of an address, or None if it was never registered
+        """
+        return self.ids.get(address)
+
+    def address(self, address_id):
+        """
+        Expand an id back to the full address
+        """
+        return self.addresses[address_id]
+
+    def canonical(self, address):
+        """
+        The shared string object of an address, so equal addresses are only kept in memory once
+        """
+        return self.addresses[self.intern(address)]
@@ -0,0 +1,173 @@
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from blockchain import CONSENSUS_TIMEOUT
+from . import create_app, routes
+
+# Number of threads running the Flask views and the blocking work of the async views
+ASGI_WORKERS = int(os.environ.get('ASGI_WORKERS', 32))
+# Bytes of a streamed response handed from the worker threads to the event loop at a time
+ASGI_CHUNK_SIZE = 64 * 1024
+
+
+def read_chunk(iterator, size=ASGI_CHUNK_SIZE):
+    """
+    Join the next pieces of a WSGI response until they fill a chunk, b'' once the response is over
+    """
+    pieces = []
+    length = 0
+    for piece in iterator:
+        pieces.append(piece)
+        length += len(piece)
+        if length >= size:
+            break
+    return b''.join(pieces)
+
+
+def wsgi_environ(scope, body):
+    """
+    WSGI environ of an ASGI HTTP request
+    """
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope['http_version'],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        # The whole body was read, so requests sent without a Content-Length keep theirs
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'], environ['REMOTE_PORT'] = scope['client'][0], str(scope['client'][1])
+
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        # Repeated headers are joined, as a WSGI server would
+        environ[name] = environ[name] + ',' + value if name in environ else value
+
+    return environ
+
+
+class AsyncApp:
+    """
+    ASGI application serving the routes of the Flask app on an event loop.
+    /nodes/resolve waits on the neighbours without holding a thread, and every other route runs
+    its Flask view on a thread pool, so signatures, key generation and block validation never block the loop.
+    """
+
+    def __init__(self, app=None, workers=ASGI_WORKERS):
+
+        self.app = app or create_app()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # Created on the event loop by the first request that talks to the neighbours
+        self.session = None
+        # Routes handled on the event loop, the others go to the Flask views
+        self.async_routes = {
+            ('GET', '/nodes/resolve'): self.consensus
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            handler = self.async_routes.get((scope['method'], scope['path']), self.call_wsgi)
+            await handler(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """
+        Answer the server's startup and shutdown events
+        """
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def get_session(self):
+        """
+        HTTP session to the neighbours, shared by all requests
+        """
+        if self.session is None or self.session.closed:
+            # No cap on the connections, which would queue resolves behind each other while they wait on slow neighbours
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=0),
+                timeout=aiohttp.ClientTimeout(total=CONSENSUS_TIMEOUT))
+        return self.session
+
+    async def close(self):
+        """
+        Close the session to the neighbours
+        """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def consensus(self, scope, receive, send):
+        """
+        /nodes/resolve, with the neighbours queried on the event loop.
+        The Flask view then only writes out the resulting chain.
+        """
+        replaced = await routes.blockchain.resolve_conflicts_async(self.get_session(), self.executor)
+        await self.call_wsgi(scope, receive, send, {routes.RESOLVED_ENVIRON_KEY: replaced})
+
+    async def call_wsgi(self, scope, receive, send, extra_environ=None):
+        """
+        Run the Flask view of a request on the thread pool, and stream its response back
+        """
+        loop = asyncio.get_running_loop()
+
+        body = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            body.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+
+        environ = wsgi_environ(scope, b''.join(body))
+        environ.update(extra_environ or {})
+
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+
+        result = await loop.run_in_executor(self.executor, self.app, environ, start_response)
+        try:
+            # Streamed views only produce their first piece, and may only start the response, once iterated
+            iterator = iter(result)
+            chunk = await loop.run_in_executor(self.executor, read_chunk, iterator)
+
+            status, headers = response
+            await send({
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+            })
+            while chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.executor, read_chunk, iterator)
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.executor, result.close)
@@ -1,10 +1,15 @@
-import binascii
-import Crypto
-from Crypto.PublicKey import RSA
-from flask import Blueprint, jsonify, request
+import json
+import os
+from flask import Blueprint, Response, jsonify, request
 from flask_swagger_ui import get_swaggerui_blueprint
 
-from blockchain import Blockchain, MINING_REWARD, MINING_SENDER
+from archive import ARCHIVE_PATH, BlockArchive
+from blockchain import NDJSON_MIMETYPE, Blockchain, DuplicateTransaction, PoolFull, SequenceGap
+from wire import BLOCKS_MIMETYPE, encode_blocks
+from keypool import KeyPool, generate_key_pair
+from keys import KEY_SCHEMES
+from mining import MiningScheduler
+from storage import BlockStore, STORAGE_PATH
 
 
 # Swagger UI setup
@@ -22,32 +27,140 @@ swaggerui_blueprint = get_swaggerui_blueprint(
 
 bp = Blueprint('routes', __name__)
 
+# Largest number of transactions accepted by /transactions/batch in one request
+TRANSACTION_BATCH_LIMIT = 10_000
+# WSGI environ key through which the async server hands the outcome of its consensus to /nodes/resolve
+RESOLVED_ENVIRON_KEY = 'chainalchemy.replaced'
+
+
+def block_range(chain):
+    """
+    Block numbers of the from and to query parameters, both included, defaulting to the whole chain.
+    Returns the range and an error response, one of them None.
+    """
+    # Block numbers start at 1, and both ends of the range are included
+    try:
+        first = int(request.args.get('from', 1))
+        last = int(request.args.get('to', len(chain)))
+    except ValueError:
+        return None, (jsonify({'error': 'from and to must be block numbers.'}), 400)
+
+    if first < 1 or ('to' in request.args and last < first):
+        return None, (jsonify({'error': 'Invalid block range.'}), 400)
+
+    return (first, min(last, len(chain))), None
+
+
+def iter_blocks(chain, first, last):
+    """
+    Blocks first to last of a chain, read one at a time while the response is sent
+    """
+    for index in range(first - 1, last):
+        try:
+            yield chain[index]
+        except IndexError:
+            # The chain got shorter while it was being sent
+            return
+
+
+def stream_blocks(chain, first, last, key, **fields):
+    """
+    Stream the blocks first to last of a chain without building the whole response in memory:
+    in the binary block format or one block per line for clients that accept them,
+    otherwise a JSON object holding the fields and the blocks under key
+    """
+    blocks = iter_blocks(chain, first, last)
+    headers = {'X-Chain-Length': str(len(chain))}
+
+    mimetype = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE, BLOCKS_MIMETYPE])
+    if mimetype == BLOCKS_MIMETYPE:
+        return Response(encode_blocks(blocks), mimetype=BLOCKS_MIMETYPE, headers=headers)
+    if mimetype == NDJSON_MIMETYPE:
+        return Response((json.dumps(block) + '\n' for block in blocks), mimetype=NDJSON_MIMETYPE, headers=headers)
+
+    def generate():
+        yield '{' + ''.join(f'{json.dumps(name)}: {json.dumps(value)}, ' for name, value in fields.items())
+        yield json.dumps(key) + ': ['
+        for position, block in enumerate(blocks):
+            yield (', ' if position else '') + json.dumps(block)
+        yield ']}'
+
+    return Response(generate(), mimetype='application/json', headers=headers)
+
+
+def sequence_error(fields):
+    """
+    Error message for the sequence number of a submitted transaction, None if it is valid or wasn't given
+    """
+    sequence = fields.get('sequence')
+    if sequence is None or (type(sequence) is int and sequence > 0):
+        return None
+    return 'sequence must be a positive integer.'
+
 
 @bp.route('/')
 def home():
     return jsonify({"message": "Welcome to Flask!"})
 
 
+# Keep the chain and wallets on disk when a storage path is configured
+store = BlockStore(STORAGE_PATH) if STORAGE_PATH else None
+# Move older blocks out of memory when an archive path is configured,
+# in files of their own for every worker process sharing the store
+archive = None
+if ARCHIVE_PATH:
+    archive = BlockArchive(f'{ARCHIVE_PATH}.{os.getpid()}' if store is not None and store.shared else ARCHIVE_PATH)
+
 wallets = {}
-blockchain = Blockchain()
+if store is not None:
+    for public_key_str, private_key_str in store.load_wallets().items():
+        wallets[public_key_str] = {'private_key': private_key_str, 'balance': 0.0}
+
+blockchain = Blockchain(store=store, archive=archive)
+mining_scheduler = MiningScheduler(blockchain)
+# Wallet key pairs generated ahead of time, when a pool size is configured
+key_pool = KeyPool()
+key_pool.start()
+
+
+@bp.before_request
+def sync_workers():
+    # Catch up with the blocks and transactions of the other workers sharing the store
+    blockchain.sync()
+
+
+def wallet_exists(address):
+    """
+    Whether a wallet was created on this node, by any of the workers sharing the store
+    """
+    if address not in wallets and store is not None and store.shared:
+        private_key = store.load_wallet(address)
+        if private_key is not None:
+            wallets[address] = {'private_key': private_key, 'balance': 0.0}
+    return address in wallets
 
 
 @bp.route('/wallet/new', methods=['POST'])
 def new_wallet():
-    random_gen = Crypto.Random.new().read
-    private_key = RSA.generate(3072, random_gen)
-    public_key = private_key.publickey()
-
-    public_key_str = binascii.hexlify(
-        public_key.exportKey(format='DER')).decode('ascii')
-    private_key_str = binascii.hexlify(
-        private_key.exportKey(format='DER')).decode('ascii')
+    # The key scheme can be picked in an optional JSON body
+    data = request.get_json(silent=True) or {}
+    scheme = data.get('scheme', key_pool.scheme)
+    if scheme not in KEY_SCHEMES:
+        return jsonify({'error': f"Unknown key scheme, must be one of: {', '.join(KEY_SCHEMES)}"}), 400
+
+    # Take a pre-generated key pair, and only generate one here when the pool is empty
+    key_pair = key_pool.pop() if scheme == key_pool.scheme else None
+    if key_pair is None:
+        key_pair = generate_key_pair(scheme)
+    public_key_str, private_key_str = key_pair
 
     # Save wallet in a dictionary with initial balance of 0
     wallets[public_key_str] = {
         'private_key': private_key_str,
         'balance': 0.0  # Starting each wallet with a 0
     }
+    if store is not None:
+        store.save_wallet(public_key=public_key_str, private_key=private_key_str)
 
     response = {
         'private_key': private_key_str,
@@ -57,44 +170,84 @@ def new_wallet():
     return jsonify(response), 200
 
 
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    response = {
+        'wallet_pool': key_pool.stats(),
+        'key_cache': blockchain.keys.stats(),
+        'signature_cache': blockchain.signatures.stats()
+    }
+    return jsonify(response), 200
+
+
 @bp.route('/transactions/new', methods=['POST'])
 def new_transaction():
     # Parse JSON payload
     data = request.get_json()
 
-    # Ensure all required fields are present in the JSON body
+    # Ensure all required fields are present in the JSON body, a transaction the client signed itself
+    # comes with its signature and the sequence number it signed instead of the private key
     required_fields = ['sender_address', 'sender_private_key', 'recipient_address', 'amount']
+    if 'signature' in data:
+        required_fields.remove('sender_private_key')
+        required_fields.append('sequence')
     for field in required_fields:
         if field not in data:
             return jsonify({'error': f"Missing required field: {field}"}), 400
 
     sender_address = data['sender_address']
-    sender_private_key = data['sender_private_key']
+    sender_private_key = data.get('sender_private_key')
     recipient_address = data['recipient_address']
+    # Picked by the node unless the client sends one
+    sequence = data.get('sequence')
+
+    error = sequence_error(data)
+    if error:
+        return jsonify({'error': error}), 400
 
     try:
         amount = float(data['amount'])
     except ValueError:
         return jsonify({'error': 'Amount must be a number.'}), 400
 
-    # Dynamically calculate the sender's balance
-    sender_balance = blockchain.get_available_balance(address=sender_address)
-
     # Check if sender and recipient exist (in the current context wallets dictionary)
-    if sender_address not in wallets:
+    if not wallet_exists(sender_address):
         return jsonify({'error': 'Sender address does not exist.'}), 400
 
-    if recipient_address not in wallets:
+    if not wallet_exists(recipient_address):
         return jsonify({'error': 'Recipient address does not exist.'}), 400
 
-    # Check if sender has enough balance dynamically
-    if sender_balance < amount:
-        return jsonify({'error': 'Insufficient balance.'}), 400
-
-    # Create a new Transaction
-    transaction_result = blockchain.submit_transaction(
-        sender_address, sender_private_key, recipient_address, amount
-    )
+    # Other requests of the same sender wait until this one is in the pool, so they see its debit
+    with blockchain.sender_lock(sender_address):
+        # Dynamically calculate the sender's balance
+        sender_balance = blockchain.get_available_balance(address=sender_address)
+
+        # Check if sender has enough balance dynamically
+        if sender_balance < amount:
+            return jsonify({'error': 'Insufficient balance.'}), 400
+
+        # Create a new Transaction
+        try:
+            if 'signature' in data:
+                try:
+                    transaction_result = blockchain.submit_transaction(
+                        sender_address, None, recipient_address, amount, signature=data['signature'],
+                        sequence=sequence
+                    )
+                except (TypeError, ValueError):
+                    transaction_result = False
+            else:
+                transaction_result = blockchain.submit_transaction(
+                    sender_address, sender_private_key, recipient_address, amount, sequence=sequence
+                )
+        except DuplicateTransaction:
+            return jsonify({'error': 'Transaction already submitted.',
+                            'next_sequence': blockchain.next_sequence(sender_address)}), 409
+        except SequenceGap:
+            return jsonify({'error': 'Sequence number skips pending or missing transactions.',
+                            'next_sequence': blockchain.next_sequence(sender_address)}), 400
+        except PoolFull:
+            return jsonify({'error': 'Transactions pool is full, try again later.'}), 503
 
     if not transaction_result:
         response = {'message': 'Invalid Transaction!'}
@@ -106,24 +259,138 @@ def new_transaction():
         return jsonify(response), 201
 
 
+@bp.route('/transactions/batch', methods=['POST'])
+def new_transactions():
+    # Parse JSON payload
+    data = request.get_json()
+
+    # Ensure the 'transactions' field is present and valid
+    if 'transactions' not in data or not isinstance(data['transactions'], list) or len(data['transactions']) == 0:
+        return jsonify({'error': 'Missing or invalid required field: transactions (must be a non-empty list)'}), 400
+
+    if len(data['transactions']) > TRANSACTION_BATCH_LIMIT:
+        return jsonify({'error': f'At most {TRANSACTION_BATCH_LIMIT} transactions can be submitted at once.'}), 400
+
+    # Check the fields of every transaction first, only the well-formed ones get signed
+    results = [None] * len(data['transactions'])
+    batch = []
+    positions = []
+    for position, item in enumerate(data['transactions']):
+        required_fields = ['sender_address', 'sender_private_key', 'recipient_address', 'amount']
+        if isinstance(item, dict) and 'signature' in item:
+            required_fields.remove('sender_private_key')
+            required_fields.append('sequence')
+        missing = [field for field in required_fields if not isinstance(item, dict) or field not in item]
+        if missing:
+            results[position] = {'status': 400, 'error': f"Missing required field: {missing[0]}"}
+            continue
+
+        error = sequence_error(item)
+        if error:
+            results[position] = {'status': 400, 'error': error}
+            continue
+
+        try:
+            amount = float(item['amount'])
+        except (TypeError, ValueError):
+            results[position] = {'status': 400, 'error': 'Amount must be a number.'}
+            continue
+
+        if not wallet_exists(item['sender_address']):
+            results[position] = {'status': 400, 'error': 'Sender address does not exist.'}
+        elif not wallet_exists(item['recipient_address']):
+            results[position] = {'status': 400, 'error': 'Recipient address does not exist.'}
+        else:
+            batch.append((item['sender_address'], item.get('sender_private_key'), item['recipient_address'],
+                          amount, item.get('signature'), item.get('sequence')))
+            positions.append(position)
+
+    # Sign and verify the whole batch at once
+    transactions = blockchain.sign_transactions(batch)
+
+    # Balances are checked in order, each accepted transaction counts towards the pending totals of the next ones
+    for position, item, transaction in zip(positions, batch, transactions):
+        if transaction is None:
+            results[position] = {'status': 406, 'error': 'Invalid Transaction!'}
+            continue
+
+        sender_address = transaction['sender_address']
+        with blockchain.sender_lock(sender_address):
+            if blockchain.get_available_balance(address=sender_address) < transaction['value']:
+                results[position] = {'status': 400, 'error': 'Insufficient balance.'}
+                continue
+
+            # The node numbered its transactions as if all the sender's earlier ones were accepted,
+            # the ones that follow a refused or concurrent one are signed again with the number now due
+            next_sequence = blockchain.next_sequence(sender_address)
+            if item[4] is None and item[5] is None and transaction['sequence'] != next_sequence:
+                transaction = blockchain.sign_transactions([item[:5] + (next_sequence,)], workers=1)[0]
+
+            try:
+                added = blockchain.add_pending_transaction(transaction)
+            except SequenceGap:
+                results[position] = {'status': 400, 'error': 'Sequence number skips pending or missing transactions.',
+                                     'next_sequence': next_sequence}
+                continue
+            except PoolFull:
+                results[position] = {'status': 503, 'error': 'Transactions pool is full, try again later.'}
+                continue
+            if not added:
+                results[position] = {'status': 409, 'error': 'Transaction already submitted.',
+                                     'next_sequence': next_sequence}
+                continue
+
+        results[position] = {
+            'status': 201,
+            'message': f'Transaction will be added to Block {len(blockchain.chain) + 1}'
+        }
+
+    response = {
+        'accepted': sum(result['status'] == 201 for result in results),
+        'results': results
+    }
+    return jsonify(response), 200
+
+
 @bp.route('/transactions/get', methods=['GET'])
 def get_transactions():
-    # Get pending transactions from transactions pool
-    transactions = blockchain.transactions
+    # Get pending transactions from transactions pool, only the address's ones are copied when filtering
+    address = request.args.get('address')
+    transactions = blockchain.pending_transactions(address=address)
 
     response = {'transactions': transactions}
+    # Clients that sign their transactions themselves number the next one with it
+    if address is not None:
+        response['next_sequence'] = blockchain.next_sequence(address)
     return jsonify(response), 200
 
 
 @bp.route('/chain', methods=['GET'])
 def full_chain():
-    response = {
-        'chain': blockchain.chain,
-        'length': len(blockchain.chain),
-    }
+    chain = blockchain.chain
+    block_numbers, error = block_range(chain)
+    if error:
+        return error
+
+    return stream_blocks(chain, *block_numbers, 'chain', length=len(chain))
+
+
+@bp.route('/chain/summary', methods=['GET'])
+def chain_summary():
+    response = blockchain.chain_summary()
     return jsonify(response), 200
 
 
+@bp.route('/chain/blocks', methods=['GET'])
+def chain_blocks():
+    chain = blockchain.chain
+    block_numbers, error = block_range(chain)
+    if error:
+        return error
+
+    return stream_blocks(chain, *block_numbers, 'blocks', length=len(chain))
+
+
 @bp.route('/mine', methods=['POST'])
 def mine():
     # Parse JSON payload
@@ -135,29 +402,41 @@ def mine():
 
     miner_address = data['miner_address']
 
-    # We run the proof of work algorithm to get the next proof...
-    last_block = blockchain.chain[-1]
-    nonce = blockchain.proof_of_work()
+    # The proof of work runs in the background, the client polls /mine/status for the block
+    job = mining_scheduler.submit(miner_address=miner_address)
+
+    response = {
+        'message': 'Mining job started',
+        'job_id': job.job_id,
+        'status': job.status
+    }
+    return jsonify(response), 202
+
+
+@bp.route('/mine/status/<job_id>', methods=['GET'])
+def mine_status(job_id):
+    job = mining_scheduler.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Mining job not found.'}), 404
+
+    return jsonify(job.to_dict()), 200
 
-    # Submit a reward transaction without a private key (since it's from the system)
-    blockchain.submit_transaction(
-        sender_address=MINING_SENDER,  # System address for mining rewards
-        sender_private_key=None,       # No private key needed for mining rewards
-        recipient_address=miner_address,  # Miner receives the reward
-        value=MINING_REWARD            # The reward for mining the block
-    )
 
-    # Forge the new Block by adding it to the chain
-    previous_hash = blockchain.hash(last_block)
-    block = blockchain.create_block(nonce, previous_hash)
+@bp.route('/mine/cancel/<job_id>', methods=['POST'])
+def mine_cancel(job_id):
+    job = mining_scheduler.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Mining job not found.'}), 404
+
+    if not mining_scheduler.cancel(job_id):
+        return jsonify({'error': 'Mining job already finished.'}), 409
+    # A job of another worker sharing the store is read again after the cancel
+    job = mining_scheduler.get(job_id)
 
     response = {
-        'message': "New Block Forged",
-        'block_number': block['block_number'],
-        'transactions': block['transactions'],
-        'nonce': block['nonce'],
-        'previous_hash': block['previous_hash'],
-        'miner_balance': blockchain.get_balance(miner_address)
+        'message': 'Mining job cancelled',
+        'job_id': job.job_id,
+        'status': job.status
     }
     return jsonify(response), 200
 
@@ -186,19 +465,15 @@ def register_nodes():
 
 @bp.route('/nodes/resolve', methods=['GET'])
 def consensus():
-    replaced = blockchain.resolve_conflicts()
+    # Under the async server the neighbours were already queried on the event loop
+    replaced = request.environ.get(RESOLVED_ENVIRON_KEY)
+    if replaced is None:
+        replaced = blockchain.resolve_conflicts()
+    chain = blockchain.chain
 
     if replaced:
-        response = {
-            'message': 'Our chain was replaced',
-            'new_chain': blockchain.chain
-        }
-    else:
-        response = {
-            'message': 'Our chain is authoritative',
-            'chain': blockchain.chain
-        }
-    return jsonify(response), 200
+        return stream_blocks(chain, 1, len(chain), 'new_chain', message='Our chain was replaced')
+    return stream_blocks(chain, 1, len(chain), 'chain', message='Our chain is authoritative')
 
 
 @bp.route('/nodes/get', methods=['GET'])
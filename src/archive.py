@@ -0,0 +1,386 @@
+import fcntl
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from collections.abc import MutableSequence
+from typing import OrderedDict
+
+# Path prefix of the archive files older blocks are moved to, unset to keep every block in memory
+ARCHIVE_PATH = os.environ.get('BLOCKCHAIN_ARCHIVE')
+# Number of most recent blocks that stay in memory as dictionaries
+ARCHIVE_HOT_BLOCKS = 1000
+
+# block_number, timestamp, nonce, first transaction record, transaction count, extra offset, extra length, previous hash
+HEADER = struct.Struct('<QdqQIQI32s')
+# sender id, recipient id, value kind, packed value, extra offset, extra length
+TRANSACTION = struct.Struct('<IIB8sQI')
+# Length prefix of the entries of the address table
+ADDRESS_LENGTH = struct.Struct('<I')
+
+VALUE_FLOAT = 0
+VALUE_INT = 1
+VALUE_EXTRA = 2
+
+BLOCK_FIELDS = ('block_number', 'timestamp', 'transactions', 'nonce', 'previous_hash')
+TRANSACTION_FIELDS = ('sender_address', 'recipient_address', 'value')
+HASH_PATTERN = re.compile('[0-9a-f]{64}')
+INT64_RANGE = range(-2**63, 2**63)
+
+
+class BlockArchive:
+    """
+    Compact append-only archive of blocks, read back through mmap.
+    Blocks are stored as fixed-width header records pointing at fixed-width transaction records,
+    addresses are interned in an address table and referenced by their index, and any field that
+    doesn't fit the fixed records is kept as JSON in an extra heap.
+    """
+
+    def __init__(self, path, hot_blocks=ARCHIVE_HOT_BLOCKS, generation=0):
+
+        if hot_blocks < 1:
+            raise ValueError('At least one block has to stay in memory')
+
+        self.path = path
+        # Number of most recent blocks an ArchivedChain keeps in memory
+        self.hot_blocks = hot_blocks
+        # Number of chains archived under this path before, each in its own set of files
+        self.generation = generation
+        self.lock = threading.Lock()
+        prefix = f'{path}.{generation}' if generation else path
+
+        # The files are emptied when opened, so another archive still mapping them, maybe in another
+        # process, would read garbage. Holding a lock on the headers file keeps them to one archive at a time.
+        headers = open(f'{prefix}.headers', 'r+b', opener=lambda name, flags: os.open(name, flags | os.O_CREAT, 0o666))
+        try:
+            fcntl.flock(headers, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            headers.close()
+            raise RuntimeError(f'Another archive is using {prefix}') from None
+        headers.truncate(0)
+
+        self.files = {'headers': headers}
+        self.files.update((name, open(f'{prefix}.{name}', 'w+b')) for name in ('transactions', 'addresses', 'extra'))
+        self.maps = {}
+        self.addresses = []
+        self.address_ids = {}
+        self.count = 0
+        self.transaction_count = 0
+
+    def __len__(self):
+        return self.count
+
+    def successor(self):
+        """
+        Empty archive with its own set of files, for a chain replacing the one archived here
+        """
+        return BlockArchive(self.path, hot_blocks=self.hot_blocks, generation=self.generation + 1)
+
+    def remove(self):
+        """
+        Close and delete the archive files of a chain that was replaced, which can't take new blocks anymore.
+        Its blocks can still be read from the maps, which stay valid until no chain reads them anymore.
+        """
+        with self.lock:
+            for archive_file in self.files.values():
+                archive_file.close()
+                os.remove(archive_file.name)
+
+    def close(self):
+        """
+        Close the mapped archive files
+        """
+        with self.lock:
+            for archive_map in self.maps.values():
+                archive_map.close()
+            for archive_file in self.files.values():
+                archive_file.close()
+
+    def remap(self):
+        """
+        Map the archive files again after they changed size
+        """
+        for archive_map in self.maps.values():
+            archive_map.close()
+
+        self.maps = {}
+        for name in ('headers', 'transactions', 'extra'):
+            archive_file = self.files[name]
+            archive_file.flush()
+            if os.fstat(archive_file.fileno()).st_size:
+                self.maps[name] = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def address_id(self, address):
+        """
+        Index of an address in the address table, adding it if it is new
+        """
+        address_id = self.address_ids.get(address)
+        if address_id is None:
+            address_id = len(self.addresses)
+            encoded = address.encode()
+            self.files['addresses'].write(ADDRESS_LENGTH.pack(len(encoded)) + encoded)
+            self.addresses.append(address)
+            self.address_ids[address] = address_id
+        return address_id
+
+    def write_extra(self, extra):
+        """
+        Append the fields that don't fit a fixed record to the extra heap, returns their offset and length
+        """
+        if not extra:
+            return 0, 0
+
+        encoded = json.dumps(extra).encode()
+        extra_file = self.files['extra']
+        extra_file.seek(0, os.SEEK_END)
+        offset = extra_file.tell()
+        extra_file.write(encoded)
+        return offset, len(encoded)
+
+    def read_extra(self, offset, length):
+        """
+        Read back fields written by write_extra
+        """
+        if not length:
+            return None
+        return json.loads(self.maps['extra'][offset:offset + length])
+
+    def encodable(self, block):
+        """
+        Check that a block has the fields every archived block needs
+        """
+        return (isinstance(block.get('block_number'), int)
+                and isinstance(block.get('transactions'), list)
+                and all(isinstance(transaction, dict)
+                        and isinstance(transaction.get('sender_address'), str)
+                        and isinstance(transaction.get('recipient_address'), str)
+                        for transaction in block['transactions']))
+
+    def encode_transaction(self, transaction):
+        """
+        Pack a transaction into a fixed-width record
+        """
+        extra = {key: value for key, value in transaction.items() if key not in TRANSACTION_FIELDS}
+        value = transaction.get('value')
+
+        if type(value) is float:
+            value_kind, packed_value = VALUE_FLOAT, struct.pack('<d', value)
+        elif type(value) is int and value in INT64_RANGE:
+            value_kind, packed_value = VALUE_INT, struct.pack('<q', value)
+        else:
+            value_kind, packed_value = VALUE_EXTRA, bytes(8)
+            extra['value'] = value
+
+        extra_offset, extra_length = self.write_extra(extra)
+        return TRANSACTION.pack(
+            self.address_id(transaction['sender_address']),
+            self.address_id(transaction['recipient_address']),
+            value_kind, packed_value, extra_offset, extra_length)
+
+    def encode_block(self, block):
+        """
+        Pack a block into a fixed-width header record and the records of its transactions
+        """
+        extra = {key: value for key, value in block.items() if key not in BLOCK_FIELDS}
+
+        # Fields that don't fit their fixed-width slot are kept in the extra heap instead
+        timestamp = block.get('timestamp')
+        if type(timestamp) is not float:
+            extra['timestamp'] = timestamp
+            timestamp = 0.0
+
+        nonce = block.get('nonce')
+        if type(nonce) is not int or nonce not in INT64_RANGE:
+            extra['nonce'] = nonce
+            nonce = 0
+
+        previous_hash = block.get('previous_hash')
+        if isinstance(previous_hash, str) and HASH_PATTERN.fullmatch(previous_hash):
+            previous_hash = bytes.fromhex(previous_hash)
+        else:
+            extra['previous_hash'] = previous_hash
+            previous_hash = bytes(32)
+
+        transactions = b''.join(self.encode_transaction(transaction) for transaction in block['transactions'])
+        extra_offset, extra_length = self.write_extra(extra)
+        header = HEADER.pack(
+            block['block_number'], timestamp, nonce, self.transaction_count,
+            len(block['transactions']), extra_offset, extra_length, previous_hash)
+
+        self.transaction_count += len(block['transactions'])
+        return header, transactions
+
+    def append_blocks(self, blocks):
+        """
+        Archive blocks after the ones already archived.
+        Stops at the first block missing required fields, returns the number of blocks archived.
+        """
+        with self.lock:
+            self.files['headers'].seek(0, os.SEEK_END)
+            self.files['transactions'].seek(0, os.SEEK_END)
+            self.files['addresses'].seek(0, os.SEEK_END)
+
+            archived = 0
+            for block in blocks:
+                if not self.encodable(block):
+                    break
+
+                header, transactions = self.encode_block(block)
+                self.files['headers'].write(header)
+                self.files['transactions'].write(transactions)
+                archived += 1
+
+            self.count += archived
+            self.remap()
+            return archived
+
+    def truncate(self, count):
+        """
+        Keep only the first `count` archived blocks
+        """
+        with self.lock:
+            if count < self.count:
+                first_transaction = HEADER.unpack_from(self.maps['headers'], count * HEADER.size)[3]
+                self.files['headers'].truncate(count * HEADER.size)
+                self.files['transactions'].truncate(first_transaction * TRANSACTION.size)
+                self.count = count
+                self.transaction_count = first_transaction
+                self.remap()
+
+    def decode_transaction(self, index):
+        """
+        Unpack the transaction record at an index of the transactions file
+        """
+        sender_id, recipient_id, value_kind, packed_value, extra_offset, extra_length = TRANSACTION.unpack_from(
+            self.maps['transactions'], index * TRANSACTION.size)
+
+        if value_kind == VALUE_FLOAT:
+            value = struct.unpack('<d', packed_value)[0]
+        elif value_kind == VALUE_INT:
+            value = struct.unpack('<q', packed_value)[0]
+        else:
+            value = None
+
+        transaction = OrderedDict({
+            'sender_address': self.addresses[sender_id],
+            'recipient_address': self.addresses[recipient_id],
+            'value': value
+        })
+        transaction.update(self.read_extra(extra_offset, extra_length) or {})
+        return transaction
+
+    def read_block(self, index):
+        """
+        Decode the archived block at a position of the chain
+        """
+        with self.lock:
+            (block_number, timestamp, nonce, first_transaction, transaction_count,
+             extra_offset, extra_length, previous_hash) = HEADER.unpack_from(self.maps['headers'], index * HEADER.size)
+
+            block = {
+                'block_number': block_number,
+                'timestamp': timestamp,
+                'transactions': [self.decode_transaction(first_transaction + offset)
+                                 for offset in range(transaction_count)],
+                'nonce': nonce,
+                'previous_hash': previous_hash.hex()
+            }
+            block.update(self.read_extra(extra_offset, extra_length) or {})
+            return block
+
+
+class ArchivedChain(MutableSequence):
+    """
+    List of blocks that keeps the most recent ones in memory and moves older ones to a BlockArchive.
+    Archived blocks are decoded every time they are accessed.
+    """
+
+    def __init__(self, archive, blocks=()):
+
+        self.archive = archive
+        # Number of blocks of this chain in the archive, which keeps growing with the chains sharing it
+        self.archived = 0
+        self.hot = []
+        for block in blocks:
+            self.append(block)
+
+    def __len__(self):
+        return self.archived + len(self.hot)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+
+        position = index + len(self) if index < 0 else index
+        if not 0 <= position < len(self):
+            raise IndexError('chain index out of range')
+
+        if position < self.archived:
+            return self.archive.read_block(position)
+        return self.hot[position - self.archived]
+
+    def __setitem__(self, index, block):
+        position = index + len(self) if index < 0 else index
+        if position < self.archived:
+            raise ValueError('Archived blocks are read-only')
+        self.hot[position - self.archived] = block
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if stop != len(self) or step != 1:
+                raise ValueError('Blocks can only be removed from the end of the chain')
+        else:
+            start = index + len(self) if index < 0 else index
+            if start != len(self) - 1:
+                raise ValueError('Blocks can only be removed from the end of the chain')
+
+        if start >= self.archived:
+            del self.hot[start - self.archived:]
+            return
+
+        # Bring the blocks before the cut back in memory, so the last block is never archived
+        keep = max(start - self.archive.hot_blocks, 0)
+        self.hot = [self.archive.read_block(position) for position in range(keep, start)]
+        self.archive.truncate(keep)
+        self.archived = keep
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, ArchivedChain)):
+            return NotImplemented
+        return len(self) == len(other) and all(block == other_block for block, other_block in zip(self, other))
+
+    def head(self, count):
+        """
+        New chain of the first `count` blocks, leaving this one untouched for whoever still reads it.
+        It shares the archive when the cut is past the archived blocks, since blocks are only ever added to it,
+        otherwise the blocks are archived again in a successor archive.
+        """
+        if count < self.archived:
+            return ArchivedChain(self.archive.successor(), (self[position] for position in range(count)))
+
+        chain = ArchivedChain(self.archive)
+        chain.archived, chain.hot = self.archived, self.hot[:count - self.archived]
+        return chain
+
+    def insert(self, index, block):
+        """
+        Blocks can only be inserted at the end, like append
+        """
+        if index < len(self):
+            raise ValueError('Blocks can only be added at the end of the chain')
+        self.append(block)
+
+    def append(self, block):
+        """
+        Add a block at the end of the chain
+        """
+        self.hot.append(block)
+
+        # Move the oldest blocks to the archive in batches, keeping hot_blocks in memory
+        if len(self.hot) >= 2 * self.archive.hot_blocks:
+            archived = self.archive.append_blocks(self.hot[:-self.archive.hot_blocks])
+            self.archived += archived
+            del self.hot[:archived]
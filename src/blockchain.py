@@ -1,31 +1,341 @@
+import asyncio
 import binascii
 import hashlib
+import itertools
 import json
+import multiprocessing
+import os
+import queue
 import requests
+import threading
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from time import time
 from urllib.parse import urlparse
 from uuid import uuid4
-from Crypto.PublicKey import RSA
-from Crypto.Hash import SHA256
-from Crypto.Signature import PKCS1_v1_5
 from typing import OrderedDict
 
+from addresses import AddressRegistry
+from archive import ArchivedChain
+from keys import KeyCache, SignatureCache
+from locks import ReadWriteLock
+from mempool import Mempool, transaction_hash
+from wire import BLOCKS_MIMETYPE, decode_blocks
+
 MINING_SENDER = "THE BLOCKCHAIN"
 MINING_REWARD = 1.0
 MINING_DIFFICULTY = 2
+# Number of processes proof_of_work spreads the nonce search over
+MINING_WORKERS = int(os.environ.get('MINING_WORKERS', 1))
+# Number of nonces a mining worker tries between checks of the stop signal
+MINING_BATCH_SIZE = 4096
+# Largest number of pending transactions mined into one block, next to the mining reward
+MAX_BLOCK_TRANSACTIONS = int(os.environ.get('MAX_BLOCK_TRANSACTIONS', 1000))
+# Number of neighbours resolve_conflicts queries at the same time
+CONSENSUS_WORKERS = 20
+# Seconds resolve_conflicts waits for all neighbours together
+CONSENSUS_TIMEOUT = 10
+# Media type of block streams, one JSON block per line
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Accept header of block downloads, the binary format first and JSON for older neighbours
+BLOCKS_ACCEPT = f'{BLOCKS_MIMETYPE}, {NDJSON_MIMETYPE};q=0.9, application/json;q=0.8'
+# Bytes read from the network at a time when decoding a binary block stream
+WIRE_CHUNK_SIZE = 64 * 1024
+# Number of processes a batch of transactions is signed and verified on
+SIGNING_WORKERS = int(os.environ.get('SIGNING_WORKERS', os.cpu_count() or 1))
+# Number of locks the senders are spread over, so their memory stays fixed however many senders there are
+SENDER_LOCK_STRIPES = 1024
+
+# Parsed keys of a signing worker process, each worker fills its own copy
+worker_keys = KeyCache()
+
+
+class PoolFull(Exception):
+    """
+    Raised when a transaction is submitted while the transactions pool is full
+    """
+
+
+class DuplicateTransaction(Exception):
+    """
+    Raised when the sender of a submitted transaction already used its sequence number,
+    for a pending transaction or one in the chain
+    """
+
+
+class SequenceGap(Exception):
+    """
+    Raised when a submitted transaction skips sequence numbers of its sender
+    """
+
+
+def difficulty_target(difficulty):
+    """
+    Digests starting with `difficulty` zero hex digits are exactly those below 16**(64-difficulty),
+    so mining can compare raw digest bytes against this bound instead of building hex strings.
+    Returns None when every digest satisfies the difficulty.
+    """
+    if difficulty <= 0:
+        return None
+    return (16**(64-difficulty)).to_bytes(32, 'big')
+
+
+def search_nonce_range(prefix_state, target, start, step, count):
+    """
+    Try `count` nonces from start, step apart, by copying a SHA-256 state that already holds the
+    serialized transactions and last hash. Returns the first valid nonce, or None.
+    """
+    if target is None:
+        return start
+
+    nonce = start
+    for _ in range(count):
+        guess = prefix_state.copy()
+        guess.update(str(nonce).encode())
+        if guess.digest() < target:
+            return nonce
+        nonce += step
+
+    return None
+
+
+def search_nonce(prefix, difficulty, start, step, found, results):
+    """
+    Try every step-th nonce from start until one satisfies the difficulty or another worker found one.
+    This function is run by each process of the parallel proof_of_work.
+    """
+    prefix_state = hashlib.sha256(prefix.encode())
+    target = difficulty_target(difficulty)
+    nonce = start
+
+    while not found.is_set():
+        result = search_nonce_range(prefix_state, target, nonce, step, MINING_BATCH_SIZE)
+        if result is not None:
+            results.put(result)
+            found.set()
+            return
+        nonce += step*MINING_BATCH_SIZE
+
+
+def transaction_message(transaction):
+    """
+    Bytes a transaction signature is computed over: the JSON of its sender, recipient, value and sequence number
+    with sorted keys and no whitespace, so clients can sign transactions themselves.
+    The sequence number makes every signature good for one transaction only, so a published one can't be
+    submitted again.
+    """
+    fields = {key: transaction[key] for key in ('sender_address', 'recipient_address', 'value')}
+    # Transactions without a sequence number sign it as null, and never pass verify_transaction
+    fields['sequence'] = transaction.get('sequence')
+    return json.dumps(fields, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def sign(keys, sender_private_key, transaction):
+    """
+    Sign a transaction with a private key parsed through a KeyCache
+    """
+    signer = keys.signer(sender_private_key)
+    return binascii.hexlify(signer.sign(transaction_message(transaction))).decode('ascii')
+
+
+def verify(keys, sender_address, signature, transaction):
+    """
+    Check a transaction signature with a public key parsed through a KeyCache
+    """
+    verifier = keys.verifier(sender_address)
+    return verifier.verify(transaction_message(transaction), binascii.unhexlify(signature))
+
+
+def sign_or_verify(sender_address, sender_private_key, signature, transaction, keys=None):
+    """
+    Check that a transaction comes from its sender. A transaction the client signed itself is verified,
+    otherwise it is signed with the private key once that key is checked to belong to the sender.
+    PKCS#1 v1.5 and Ed25519 signatures are deterministic, so verifying a signature the node just made is skipped.
+    Returns the signature, or None if the transaction isn't the sender's.
+    Without a KeyCache, the one of the worker process is used.
+    """
+    keys = worker_keys if keys is None else keys
+
+    if signature is not None:
+        return signature if verify(keys, sender_address, signature, transaction) else None
+
+    if keys.public_key(sender_private_key) != sender_address:
+        return None
+    return sign(keys, sender_private_key, transaction)
+
+
+def try_sign_or_verify(sender_address, sender_private_key, signature, transaction, keys=None):
+    """
+    sign_or_verify for batches, where keys and signatures that can't be parsed only reject their own transaction
+    """
+    try:
+        return sign_or_verify(sender_address, sender_private_key, signature, transaction, keys=keys)
+    except (TypeError, ValueError):
+        return None
 
 
 class Blockchain:
+    """
+    Chain, transactions pool and their indexes, shared by the threads serving requests.
+    Changes to the chain or the pool hold the write lock, and reads that need more than one
+    of them to agree hold the read lock. Proof of work, signatures and downloads from neighbours
+    run outside the lock, so readers only ever wait for a block being appended or a chain being swapped in.
+    """
 
-    def __init__(self):
+    def __init__(self, store=None, archive=None):
 
-        self.transactions = []
-        self.chain = []
+        self.lock = ReadWriteLock()
+        # Serializes the balance check and submission of each sender's transactions,
+        # senders with the same stripe share a lock
+        self.sender_locks = [threading.Lock() for _ in range(SENDER_LOCK_STRIPES)]
+        # Incremented every time the chain is replaced, so consensus can tell its download went stale
+        self.chain_version = 0
+        # Last sequence number every sender used in the chain, by address id
+        self.sequences = {}
+        # Pending transactions, with their indexes and running totals
+        self.transactions = Mempool()
+        # Optional BlockArchive older blocks of the chain are moved to
+        self.archive = archive
+        self.chain = self.new_chain([])
         self.nodes = set()
+        # Keep-alive connections to the neighbours, shared by the consensus threads
+        self.session = requests.Session()
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=CONSENSUS_WORKERS))
+        # Parsed RSA keys of the wallets that sign and verify transactions
+        self.keys = KeyCache()
+        # Transaction signatures already known to be valid, so received blocks don't verify them again
+        self.signatures = SignatureCache()
+        # Process pool batches of transactions are signed on, started on the first batch
+        self.signing_pool = None
+        # Held while the signing pool is started, so concurrent batches don't each start one
+        self.signing_pool_lock = threading.Lock()
+        # Integer id and shared string of every address in the chain and the transactions pool
+        self.addresses = AddressRegistry()
+        # Confirmed balance of every address id, kept in sync with self.chain
+        self.balances = {}
+        # Hash of every block of self.chain, at the same position
+        self.block_hashes = []
+        # Callbacks run after resolve_conflicts replaced the chain
+        self.chain_replaced_callbacks = []
         # Generate random number to be used as node_id
         self.node_id = str(uuid4()).replace('-', '')
-        # Create genesis block
-        self.create_block(nonce=0, previous_hash='00')
+        # Optional BlockStore every change to the chain is written to, set once the stored chain is loaded
+        self.store = None
+        # With a shared store, its data version, the sequence number of the last pooled transaction
+        # and the number of removals from the stored pool when we last caught up with the other workers
+        self.store_version = None
+        self.pool_seq = 0
+        self.pool_removals = 0
+
+        # Workers sharing a store start one at a time, so only the first one creates the genesis block
+        with store.exclusive() if store is not None else nullcontext():
+            if store is not None:
+                # Rebuild the chain and its indexes from what was stored before the restart
+                chain, hashes = store.load_blocks()
+                if chain:
+                    self.replace_chain(chain=chain, hashes=hashes)
+                self.store = store
+
+                if store.shared:
+                    self.node_id = store.node_id(default=self.node_id)
+                    self.store_version = store.data_version()
+                    self.nodes = store.load_nodes()
+                    self.load_pool()
+
+            if not self.chain:
+                # Create genesis block
+                self.create_block(nonce=0, previous_hash='00')
+
+    @property
+    def shared(self):
+        """
+        Whether the state is shared with other workers through the store
+        """
+        return self.store is not None and self.store.shared
+
+    @contextmanager
+    def synced(self):
+        """
+        With a shared store, hold its write lock after catching up with the other workers,
+        so a change applies to the latest state and is committed in one go. Does nothing otherwise.
+        """
+        if not self.shared:
+            yield
+            return
+
+        with self.store.exclusive():
+            self.sync()
+            yield
+
+    @contextmanager
+    def write(self):
+        """
+        Hold the write lock for a change, synced with the other workers first
+        """
+        with self.synced(), self.lock.write():
+            yield
+
+    def sync(self):
+        """
+        Catch up with the blocks and transactions other workers sharing the store committed since the last time.
+        Cheap when nothing changed. Skipped while another thread of this worker is writing,
+        as it catches up itself first and its own changes aren't committed yet.
+        """
+        if not self.shared or not self.store.lock.acquire(blocking=False):
+            return
+
+        try:
+            version = self.store.data_version()
+            if version == self.store_version:
+                return
+
+            with self.store.snapshot(), self.lock.write():
+                self.store_version = version
+                # Neighbours another worker registered
+                self.nodes = self.store.load_nodes()
+                tip = self.store.tip()
+
+                if tip is not None and tuple(tip) == (len(self.chain), self.block_hashes[-1]):
+                    # Only new transactions
+                    for seq, transaction in self.store.load_transactions(after=self.pool_seq):
+                        self.index_pending_transaction(transaction, seq=seq)
+                        self.pool_seq = seq
+                    # Another worker took transactions out of the pool
+                    if self.store.pool_removals() != self.pool_removals:
+                        self.load_pool()
+                    return
+
+                if self.store.block_hash(len(self.chain)) == self.block_hashes[-1]:
+                    # Blocks another worker added on top of ours
+                    blocks, hashes = self.store.load_blocks(after=len(self.chain))
+                    for block, block_hash in zip(blocks, hashes):
+                        self.chain.append(block)
+                        self.block_hashes.append(block_hash)
+                        self.update_balances(balances=self.balances, block=block)
+                        self.update_sequences(sequences=self.sequences, block=block)
+                else:
+                    # Another worker replaced the chain
+                    chain, hashes = self.store.load_blocks()
+                    self.install_chain(chain=chain, hashes=hashes, balances=self.build_balances(chain=chain),
+                                       sequences=self.build_sequences(chain=chain))
+                    for callback in self.chain_replaced_callbacks:
+                        callback()
+
+                # A new block took transactions out of the pool
+                self.load_pool()
+        finally:
+            self.store.lock.release()
+
+    def load_pool(self):
+        """
+        Rebuild the transactions pool from the shared store
+        """
+        self.transactions = Mempool(max_size=self.transactions.max_size)
+        self.pool_seq = 0
+        self.pool_removals = self.store.pool_removals()
+        for seq, transaction in self.store.load_transactions():
+            self.index_pending_transaction(transaction, seq=seq)
+            self.pool_seq = seq
 
     def register_node(self, node_url):
         """
@@ -34,125 +344,410 @@ class Blockchain:
         # Checking node_url has valid format
         parsed_url = urlparse(url=node_url)
         if parsed_url.netloc:
-            self.nodes.add(parsed_url.netloc)
+            node = parsed_url.netloc
         elif parsed_url.path:
             # Accepts an URL without scheme like '192.168.0.5:5000'.
-            self.nodes.add(parsed_url.path)
+            node = parsed_url.path
         else:
             raise ValueError('Invalid URL')
 
+        # Copy on write, so threads iterating over the nodes never see the set change
+        with self.write():
+            if self.shared:
+                self.store.add_node(node)
+            self.nodes = self.nodes | {node}
+
+    @contextmanager
+    def sender_lock(self, address):
+        """
+        Lock to hold from the balance check of a transaction until it is added to the pool,
+        so concurrent requests can't spend the same funds twice.
+        With a shared store the other workers' writes wait as well.
+        Only one sender lock may be held at a time, as senders can share one.
+        """
+        lock = self.sender_locks[hash(address) % len(self.sender_locks)]
+
+        with lock, self.synced():
+            yield
+
     def sign_transaction(self, sender_private_key, transaction):
         """
         Sign transaction with private key
         """
-        private_key = RSA.importKey(
-            binascii.unhexlify(sender_private_key))
-        signer = PKCS1_v1_5.new(private_key)
-        h = SHA256.new(str(transaction).encode('utf8'))
-        return binascii.hexlify(signer.sign(h)).decode('ascii')
+        return sign(self.keys, sender_private_key, transaction)
 
     def verify_transaction_signature(self, sender_address, signature, transaction):
         """
         Check that the provided signature corresponds to transaction
         signed by the public key (sender_address)
         """
-        public_key = RSA.importKey(
-            extern_key=binascii.unhexlify(sender_address))
-        verifier = PKCS1_v1_5.new(rsa_key=public_key)
-        h = SHA256.new(str(transaction).encode('utf-8'))
-        return verifier.verify(h, binascii.unhexlify(signature))
+        return verify(self.keys, sender_address, signature, transaction)
 
-    def submit_transaction(self, sender_address, sender_private_key, recipient_address, value):
+    def create_transaction(self, sender_address, recipient_address, value, sequence=None):
         """
-        Add a transaction to transactions array if the signature verified
+        Build a transaction with its fields in a fixed order, so it always hashes the same.
+        Transfers carry the sequence number of their sender, mining rewards have none.
         """
         transaction = OrderedDict({
-            'sender_address': sender_address,
-            'recipient_address': recipient_address,
+            'sender_address': self.addresses.canonical(sender_address),
+            'recipient_address': self.addresses.canonical(recipient_address),
             'value': value
         })
+        if sequence is not None:
+            transaction['sequence'] = sequence
+        return transaction
+
+    def next_sequence(self, address):
+        """
+        Sequence number the next transfer of a sender has to carry, one past its last one pending or in the chain
+        """
+        with self.lock.read():
+            sender_id = self.addresses.lookup(address)
+            last_sequence = self.transactions.last_sequence(sender_id)
+            if last_sequence is None:
+                last_sequence = self.sequences.get(sender_id, 0)
+            return last_sequence + 1
+
+    def submit_transaction(self, sender_address, sender_private_key, recipient_address, value, signature=None,
+                           sequence=None):
+        """
+        Add a transaction to transactions array if the signature verified.
+        A transaction signed by the client comes with its signature and sequence number and no private key,
+        and is only verified. Otherwise the node signs it, after checking the private key belongs to the sender,
+        with the next sequence number of the sender unless one is given.
+        Returns the number of the block it will be added to, or False if it isn't signed by its sender.
+        Raises DuplicateTransaction if the sender already used the sequence number, in the pool or in the chain,
+        SequenceGap if it skips sequence numbers, and PoolFull if the transactions pool is full.
+        """
+        if sender_address != MINING_SENDER and sequence is None:
+            sequence = self.next_sequence(sender_address)
+
+        transaction = self.create_transaction(
+            sender_address=sender_address,
+            recipient_address=recipient_address,
+            value=value,
+            sequence=sequence
+        )
 
         # If it's a mining reward, skip the signature process
         if sender_address == MINING_SENDER:
-            self.transactions.append(transaction)
-            return len(self.chain) + 1
+            with self.write():
+                if not self.add_pending_transaction(transaction):
+                    raise DuplicateTransaction('Transaction already submitted')
+                return len(self.chain) + 1
 
         # Manages transactions from wallet to another wallet
         else:
-            transaction_signature = self.sign_transaction(
-                sender_private_key=sender_private_key,
-                transaction=transaction
-            )
-            transaction_verification = self.verify_transaction_signature(
-                sender_address=sender_address,
-                signature=transaction_signature,
-                transaction=transaction
-            )
-
-            if transaction_verification:
-                self.transactions.append(transaction)
-                return len(self.chain) + 1
+            transaction_signature = sign_or_verify(
+                sender_address, sender_private_key, signature, transaction, keys=self.keys)
+
+            if transaction_signature is not None:
+                # The signature travels with the transaction, so every node can check it
+                transaction['signature'] = transaction_signature
+                self.signatures.add(transaction_message(transaction), transaction_signature)
+                with self.write():
+                    if not self.add_pending_transaction(transaction):
+                        raise DuplicateTransaction('Transaction already submitted')
+                    return len(self.chain) + 1
             else:
                 return False
 
-    def get_balance(self, address):
+    def sign_transactions(self, batch, workers=SIGNING_WORKERS):
+        """
+        Create and sign or verify a batch of
+        (sender_address, sender_private_key, recipient_address, value, signature, sequence) tuples,
+        where either the private key or the signature of the client is None, and so is the sequence number
+        when the node picks it. Picked sequence numbers follow on from the sender's previous transfer in the batch.
+        With more than one worker the RSA work is spread over a pool of processes.
+        Returns the transactions in the same order, with None in place of the ones that didn't verify.
+        Nothing is added to the transactions pool.
+        """
+        transactions = []
+        next_sequences = {}
+        for sender_address, _, recipient_address, value, _, sequence in batch:
+            if sender_address != MINING_SENDER:
+                if sequence is None:
+                    sequence = next_sequences.get(sender_address) or self.next_sequence(sender_address)
+                next_sequences[sender_address] = sequence + 1
+            transactions.append(self.create_transaction(
+                sender_address=sender_address, recipient_address=recipient_address, value=value, sequence=sequence))
+
+        # Mining rewards need no signature
+        signed = [index for index, (sender_address, *_) in enumerate(batch) if sender_address != MINING_SENDER]
+        senders = [batch[index][0] for index in signed]
+        private_keys = [batch[index][1] for index in signed]
+        signatures = [batch[index][4] for index in signed]
+        to_sign = [transactions[index] for index in signed]
+
+        if workers > 1 and len(signed) > 1:
+            with self.signing_pool_lock:
+                if self.signing_pool is None:
+                    self.signing_pool = ProcessPoolExecutor(max_workers=workers)
+            # Send the work over in a few chunks per worker rather than one transaction at a time
+            chunksize = max(len(signed) // (workers * 4), 1)
+            results = self.signing_pool.map(
+                try_sign_or_verify, senders, private_keys, signatures, to_sign, chunksize=chunksize)
+        else:
+            results = [try_sign_or_verify(*arguments, keys=self.keys)
+                       for arguments in zip(senders, private_keys, signatures, to_sign)]
+
+        for index, transaction_signature in zip(signed, results):
+            if transaction_signature is None:
+                transactions[index] = None
+            else:
+                transactions[index]['signature'] = transaction_signature
+                self.signatures.add(transaction_message(transactions[index]), transaction_signature)
+
+        return transactions
+
+    def verify_transaction(self, transaction):
+        """
+        Check the signature a transaction carries, unless it was already found valid.
+        Mining rewards need no signature.
+        """
+        if transaction['sender_address'] == MINING_SENDER:
+            return True
+
+        signature = transaction.get('signature')
+        sequence = transaction.get('sequence')
+        if not isinstance(signature, str) or type(sequence) is not int or sequence < 1:
+            return False
+
+        message = transaction_message(transaction)
+        if self.signatures.seen(message, signature):
+            return True
+
+        try:
+            valid = verify(self.keys, transaction['sender_address'], signature, transaction)
+        except (TypeError, ValueError):
+            return False
+
+        if valid:
+            self.signatures.add(message, signature)
+        return valid
+
+    def add_pending_transaction(self, transaction):
+        """
+        Add a transaction to the transactions pool.
+        Returns False if its sender already used its sequence number, in the pool or in the chain,
+        in which case nothing changes. Raises SequenceGap if it skips sequence numbers of its sender,
+        and PoolFull if the pool is full.
+        """
+        tx_hash = transaction_hash(transaction)
+
+        with self.write():
+            if tx_hash in self.transactions:
+                return False
+            # Mining rewards have no sender to replay them
+            if transaction['sender_address'] != MINING_SENDER:
+                next_sequence = self.next_sequence(transaction['sender_address'])
+                if transaction['sequence'] < next_sequence:
+                    return False
+                if transaction['sequence'] > next_sequence:
+                    raise SequenceGap(f'Expected sequence number {next_sequence}')
+            if self.transactions.full():
+                raise PoolFull('Transactions pool is full')
+
+            if not self.index_pending_transaction(transaction, tx_hash=tx_hash):
+                return False
+
+            # Only what the pool took goes to the shared store, and the pool never keeps what the store refused
+            if self.shared:
+                try:
+                    seq = self.store.add_transaction(transaction)
+                except Exception:
+                    self.transactions.remove(tx_hash)
+                    raise
+                self.transactions.seqs[tx_hash] = self.pool_seq = seq
+            return True
+
+    def index_pending_transaction(self, transaction, tx_hash=None, seq=None):
+        """
+        Add a transaction to the in-memory pool, along with its sequence number in a shared store.
+        Returns False if the pool refused it as a duplicate.
+        """
+        sender_id, recipient_id = self.intern_transaction(transaction)
+        if tx_hash is None:
+            tx_hash = transaction_hash(transaction)
+
+        with self.lock.write():
+            return self.transactions.add(tx_hash, transaction, sender_id, recipient_id, seq=seq)
+
+    def remove_pending_transactions(self, hashes):
         """
-        Calculate the balance of a wallet by iterating over the blockchain.
+        Take transactions out of the pool, and out of the shared store, by hash.
+        Hashes of transactions that aren't pending are skipped.
         """
-        balance = 0.0
+        seqs = []
+        with self.lock.write():
+            for tx_hash in hashes:
+                seq = self.transactions.seqs.get(tx_hash)
+                if self.transactions.remove(tx_hash) is not None and seq is not None:
+                    seqs.append(seq)
 
-        # Iterate through all blocks in the chain
-        for block in self.chain:
-            # Iterate through all transactions in each block
-            for transaction in block['transactions']:
-                # Check if the wallet is the sender
-                if transaction['sender_address'] == address:
-                    balance -= transaction['value']
+        if self.shared and seqs:
+            self.store.remove_transactions(seqs)
+            self.pool_removals = self.store.pool_removals()
 
-                # Check if the wallet is the recipient
-                if transaction['recipient_address'] == address:
-                    balance += transaction['value']
+    def remove_stale_transactions(self):
+        """
+        Take the pending transfers that no longer follow on from their sender's last sequence number in the chain
+        out of the pool, once another chain was swapped in: the ones it confirmed, or replaced with other
+        transfers, and the ones after a transfer it dropped, which could never be mined
+        """
+        with self.lock.write():
+            hashes = self.transactions.stale(self.sequences)
+        self.remove_pending_transactions(hashes)
 
-        return balance
+    def block_transactions(self):
+        """
+        Pending transactions the next block takes, the oldest MAX_BLOCK_TRANSACTIONS of the pool
+        """
+        with self.lock.read():
+            return self.transactions.select(MAX_BLOCK_TRANSACTIONS)
+
+    def pending_transactions(self, address=None):
+        """
+        Pending transactions oldest first, or only the ones an address sends or receives
+        """
+        with self.lock.read():
+            if address is None:
+                return list(self.transactions)
+
+            address_id = self.addresses.lookup(address)
+            if address_id is None:
+                return []
+            return self.transactions.for_address(address_id)
+
+    def intern_transaction(self, transaction):
+        """
+        Point the addresses of a transaction at their shared strings and return their ids
+        """
+        sender_id = self.addresses.intern(transaction['sender_address'])
+        recipient_id = self.addresses.intern(transaction['recipient_address'])
+
+        transaction['sender_address'] = self.addresses.address(sender_id)
+        transaction['recipient_address'] = self.addresses.address(recipient_id)
+        return sender_id, recipient_id
+
+    def update_balances(self, balances, block):
+        """
+        Apply the transactions of a block to a balance index
+        """
+        for transaction in block['transactions']:
+            sender_id, recipient_id = self.intern_transaction(transaction)
+
+            # Debit the sender, then credit the recipient
+            balances[sender_id] = balances.get(sender_id, 0.0) - transaction['value']
+            balances[recipient_id] = balances.get(recipient_id, 0.0) + transaction['value']
+
+    def update_sequences(self, sequences, block):
+        """
+        Move a sequence number index on past the transfers of a block
+        """
+        for transaction in block['transactions']:
+            if transaction['sender_address'] != MINING_SENDER and 'sequence' in transaction:
+                sequences[self.addresses.intern(transaction['sender_address'])] = transaction['sequence']
+
+    def revert_sequences(self, sequences, block):
+        """
+        Move a sequence number index back before the transfers of a block,
+        which are numbered one after the other for each sender
+        """
+        for transaction in reversed(block['transactions']):
+            if transaction['sender_address'] != MINING_SENDER and 'sequence' in transaction:
+                sender_id = self.addresses.intern(transaction['sender_address'])
+                if transaction['sequence'] > 1:
+                    sequences[sender_id] = transaction['sequence'] - 1
+                else:
+                    sequences.pop(sender_id, None)
+
+    def build_sequences(self, chain):
+        """
+        Build a sequence number index from scratch by iterating over a whole chain
+        """
+        sequences = {}
+        for block in chain:
+            self.update_sequences(sequences=sequences, block=block)
+        return sequences
+
+    def fork_sequences(self, fork):
+        """
+        Copy of the sequence number index as it was after the first `fork` blocks of our chain,
+        for validating blocks that build on them
+        """
+        with self.lock.read():
+            fork = min(fork, len(self.chain))
+            # Rebuilding the index is cheaper than reverting it when the fork is closer to the genesis block
+            if fork <= len(self.chain) - fork:
+                return self.build_sequences(chain=self.chain[:fork])
+
+            sequences = dict(self.sequences)
+            for block in reversed(self.chain[fork:]):
+                self.revert_sequences(sequences=sequences, block=block)
+            return sequences
+
+    def build_balances(self, chain):
+        """
+        Build a balance index from scratch by iterating over a whole chain.
+        """
+        balances = {}
+        for block in chain:
+            self.update_balances(balances=balances, block=block)
+        return balances
+
+    def get_balance(self, address):
+        """
+        Look up the confirmed balance of a wallet in the balance index.
+        """
+        with self.lock.read():
+            return self.balances.get(self.addresses.lookup(address), 0.0)
 
     def get_available_balance(self, address):
         """
         Calculate the user's available balance, including both confirmed transactions (in blocks)
         and pending transactions (in the transaction pool).
         """
-        confirmed_balance = self.get_balance(
-            address)  # Balance from mined blocks
+        with self.lock.read():
+            confirmed_balance = self.get_balance(
+                address)  # Balance from mined blocks
 
-        # Now, adjust the balance by considering pending transactions
-        pending_debits = 0
-        pending_credits = 0
-
-        for transaction in self.transactions:  # Loop through pending transactions
-            if transaction['sender_address'] == address:
-                # Subtract pending debits
-                pending_debits += transaction['value']
-            if transaction['recipient_address'] == address:
-                pending_credits += transaction['value']  # Add pending credits
+            # Now, adjust the balance by the running totals of the transaction pool
+            address_id = self.addresses.lookup(address)
+            pending_debits = self.transactions.debits.get(address_id, 0)
+            pending_credits = self.transactions.credits.get(address_id, 0)
 
         # Available balance is confirmed balance minus pending debits plus pending credits
         available_balance = confirmed_balance - pending_debits + pending_credits
         return available_balance
 
-    def create_block(self, nonce, previous_hash):
+    def create_block(self, nonce, previous_hash, transactions=None):
         """
-        Add a block of transactions to the blockchain
+        Add a block of transactions to the blockchain.
+        By default the block takes the oldest pending transactions, up to MAX_BLOCK_TRANSACTIONS.
+        When a list of transactions is given, only those are removed from the pool and anything else stays pending.
         """
-        block = {'block_number': len(self.chain) + 1,
-                 'timestamp': time(),
-                 'transactions': self.transactions,
-                 'nonce': nonce,
-                 'previous_hash': previous_hash}
+        with self.write():
+            if transactions is None:
+                transactions = self.block_transactions()
+
+            block = {'block_number': len(self.chain) + 1,
+                     'timestamp': time(),
+                     'transactions': transactions,
+                     'nonce': nonce,
+                     'previous_hash': previous_hash}
 
-        # Reset the current list of transactions
-        self.transactions = []
+            self.chain.append(block)
+            self.block_hashes.append(self.hash(block))
+            self.update_balances(balances=self.balances, block=block)
+            self.update_sequences(sequences=self.sequences, block=block)
 
-        self.chain.append(block)
-        return block
+            if self.store is not None:
+                self.store.append_block(block=block, block_hash=self.block_hashes[-1])
+            # Take the mined transactions out of the pool, the mining reward was never in it
+            self.remove_pending_transactions(map(transaction_hash, transactions))
+
+            return block
 
     def hash(self, block):
         """
@@ -163,24 +758,94 @@ class Blockchain:
 
         return hashlib.sha256(block_string).hexdigest()
 
-    def proof_of_work(self):
+    def block_hash(self, block):
+        """
+        Hash of a block, taken from the hash index when the block is part of our chain
+        """
+        index = block['block_number'] - 1
+        with self.lock.read():
+            if 0 <= index < len(self.block_hashes) and self.chain[index] is block:
+                return self.block_hashes[index]
+
+        return self.hash(block)
+
+    def proof_of_work(self, workers=MINING_WORKERS, difficulty=MINING_DIFFICULTY, transactions=None, cancel=None):
         """
-        Proof of work algorithm
+        Proof of work algorithm, over the transactions create_block takes by default unless a list is given.
+        With more than one worker the nonce space is interleaved across a pool of processes,
+        and all of them stop as soon as one finds a valid nonce.
+        Returns None if the optional cancel event is set before a nonce is found.
         """
+        if transactions is None:
+            transactions = self.block_transactions()
+
         last_block = self.chain[-1]
-        last_hash = self.hash(last_block)
+        last_hash = self.block_hash(last_block)
+
+        # Only the nonce changes between attempts, so the rest of the guess is serialized once
+        prefix = str(self.proof_transactions(transactions))+str(last_hash)
+
+        if workers > 1:
+            return self.parallel_proof_of_work(prefix=prefix, workers=workers, difficulty=difficulty, cancel=cancel)
+
+        prefix_state = hashlib.sha256(prefix.encode())
+        target = difficulty_target(difficulty)
 
         nonce = 0
-        while self.valid_proof(transactions=self.transactions, last_hash=last_hash, nonce=nonce) is False:
-            nonce += 1
+        while cancel is None or not cancel.is_set():
+            result = search_nonce_range(prefix_state, target, nonce, 1, MINING_BATCH_SIZE)
+            if result is not None:
+                return result
+            nonce += MINING_BATCH_SIZE
+
+        return None
+
+    def parallel_proof_of_work(self, prefix, workers, difficulty, cancel=None):
+        """
+        Run search_nonce on one process per worker and return the first nonce found,
+        or None if the cancel event is set first
+        """
+        context = multiprocessing.get_context()
+        found = context.Event()
+        results = context.Queue()
+        processes = [
+            context.Process(target=search_nonce, args=(prefix, difficulty, start, workers, found, results), daemon=True)
+            for start in range(workers)
+        ]
 
-        return nonce
+        for process in processes:
+            process.start()
+
+        try:
+            while True:
+                try:
+                    return results.get(timeout=0.1)
+                except queue.Empty:
+                    if cancel is not None and cancel.is_set():
+                        return None
+                    # Workers put their nonce before raising the found signal,
+                    # so they can only all be gone without it if they crashed
+                    if not found.is_set() and not any(process.is_alive() for process in processes):
+                        raise RuntimeError('All mining workers exited without finding a nonce')
+        finally:
+            # Stop the remaining workers
+            found.set()
+            for process in processes:
+                process.join()
+
+    def proof_transactions(self, transactions):
+        """
+        The fields of the transactions the proof of work covers, which leaves out their signatures
+        """
+        # Need to make sure that the dictionary is ordered. Otherwise we'll get a different hash
+        transaction_elements = ['sender_address', 'recipient_address', 'value']
+        return [OrderedDict((k, transaction[k]) for k in transaction_elements) for transaction in transactions]
 
     def valid_proof(self, transactions, last_hash, nonce, difficulty=MINING_DIFFICULTY):
         """
         Check if a hash value satisfies the mining conditions. This function is used within the proof_of_work function.
         """
-        guess = (str(transactions)+str(last_hash)+str(nonce)).encode()
+        guess = (str(self.proof_transactions(transactions))+str(last_hash)+str(nonce)).encode()
         guess_hash = hashlib.sha256(guess).hexdigest()
         return guess_hash[:difficulty] == '0'*difficulty
 
@@ -188,64 +853,531 @@ class Blockchain:
         """
         check if a bockchain is valid
         """
-        last_block = chain[0]
-        current_index = 1
+        # Blocks are numbered from the genesis block on
+        return chain[0]['block_number'] == 1 and self.valid_blocks(last_block=chain[0], blocks=chain[1:])
+
+    def valid_blocks(self, last_block, blocks):
+        """
+        check if a list of blocks is valid and correctly extends last_block
+        """
+        return self.hash_valid_blocks(last_block=last_block, blocks=blocks) is not None
+
+    def hash_valid_blocks(self, last_block, blocks, last_hash=None, sequences=None):
+        """
+        Validate blocks like valid_blocks, and return the hashes of last_block and blocks
+        computed along the way, or None if they aren't valid.
+        The hash of last_block is computed unless it is given.
+        Blocks validated one call at a time pass every call the same sequences, the fork_sequences of the block
+        the first one builds on, which is moved on past the blocks already validated.
+        """
+        hashes = [self.block_hash(last_block) if last_hash is None else last_hash]
+        if sequences is None:
+            sequences = self.fork_sequences(fork=last_block['block_number'])
 
-        while current_index < len(chain):
-            block = chain[current_index]
-            # print(last_block)
-            # print(block)
-            # print("\n-----------\n")
+        for block in blocks:
             # Check that the hash of the block is correct
-            if block['previous_hash'] != self.hash(last_block):
-                return False
+            if block['previous_hash'] != hashes[-1]:
+                return None
+
+            # Check that the block is numbered right after the one it builds on, as forks are located by it
+            if block['block_number'] != last_block['block_number'] + 1:
+                return None
+            last_block = block
 
             # Check that the Proof of Work is correct
             # Delete the reward transaction
             transactions = block['transactions'][:-1]
-            # Need to make sure that the dictionary is ordered. Otherwise we'll get a different hash
-            transaction_elements = [
-                'sender_address', 'recipient_address', 'value']
-            transactions = [OrderedDict(
-                (k, transaction[k]) for k in transaction_elements) for transaction in transactions]
 
             if not self.valid_proof(transactions=transactions, last_hash=block['previous_hash'], nonce=block['nonce']):
+                return None
+
+            # Check that every transfer was signed by its sender
+            if not all(self.verify_transaction(transaction) for transaction in block['transactions']):
+                return None
+
+            # Check that no transfer replays a sequence number its sender already used, or skips one
+            if not self.follow_sequences(block=block, sequences=sequences):
+                return None
+
+            hashes.append(self.block_hash(block))
+
+        return hashes
+
+    def follow_sequences(self, block, sequences):
+        """
+        Check that every transfer of a block carries the sequence number right after the last one of its sender
+        in sequences, and move sequences on past them
+        """
+        for transaction in block['transactions']:
+            if transaction['sender_address'] == MINING_SENDER:
+                continue
+
+            # Senders new to this node aren't interned for a chain that may not be valid
+            sender_id = self.addresses.lookup(transaction['sender_address'])
+            key = transaction['sender_address'] if sender_id is None else sender_id
+            if transaction.get('sequence') != sequences.get(key, 0) + 1:
                 return False
+            sequences[key] = transaction['sequence']
+
+        return True
+
+    def revert_balances(self, balances, block):
+        """
+        Undo the transactions of a block in a balance index
+        """
+        for transaction in reversed(block['transactions']):
+            sender_id = self.addresses.intern(transaction['sender_address'])
+            recipient_id = self.addresses.intern(transaction['recipient_address'])
+
+            balances[recipient_id] = balances.get(recipient_id, 0.0) - transaction['value']
+            balances[sender_id] = balances.get(sender_id, 0.0) + transaction['value']
+
+    def new_chain(self, blocks):
+        """
+        Chain container for a list of blocks, which moves older blocks to the archive if there is one
+        """
+        if self.archive is None:
+            return blocks
+
+        # A new chain gets its own archive files, so responses still streaming the old one keep reading it
+        archive = self.archive.successor() if len(self.archive) else self.archive
+        return ArchivedChain(archive=archive, blocks=blocks)
+
+    def retire_archive(self):
+        """
+        Remove the archive files of the previous chain once the current one was swapped in with its own.
+        Responses still streaming the previous chain read on from the mapped files until they end.
+        """
+        if self.archive is not None and self.chain.archive is not self.archive:
+            self.archive.remove()
+            self.archive = self.chain.archive
+
+    def replace_chain(self, chain, hashes=None):
+        """
+        Swap in a new chain together with its indexes and notify the chain_replaced_callbacks.
+        The hashes of the blocks are computed unless they are given.
+        """
+        if hashes is None:
+            hashes = [self.hash(block) for block in chain]
+
+        # Build the indexes for the new chain before swapping everything in together
+        balances = self.build_balances(chain=chain)
+        sequences = self.build_sequences(chain=chain)
+        with self.write():
+            chain = self.install_chain(chain=chain, hashes=hashes, balances=balances, sequences=sequences)
+
+            if self.store is not None:
+                self.store.replace_blocks(fork=0, blocks=chain, hashes=hashes)
+            self.remove_stale_transactions()
+
+        for callback in self.chain_replaced_callbacks:
+            callback()
+
+    def install_chain(self, chain, hashes, balances, sequences):
+        """
+        Swap in a chain with its hashes, balance index and sequence number index, returns the chain container
+        """
+        with self.lock.write():
+            chain = self.new_chain(chain)
+            self.chain, self.block_hashes, self.balances = chain, hashes, balances
+            self.sequences = sequences
+            self.chain_version += 1
+            self.retire_archive()
+            return chain
+
+    def splice_chain(self, fork, blocks, hashes=None):
+        """
+        Keep the first `fork` blocks of our chain and replace the rest with blocks.
+        Only the blocks that are dropped or added touch the indexes.
+        The hashes of the blocks are computed unless they are given.
+        """
+        if hashes is None:
+            hashes = [self.hash(block) for block in blocks]
+
+        if fork == 0:
+            self.replace_chain(chain=blocks, hashes=hashes)
+            return
+
+        with self.write():
+            for block in reversed(self.chain[fork:]):
+                self.revert_balances(balances=self.balances, block=block)
+                self.revert_sequences(sequences=self.sequences, block=block)
+
+            # Copy on write, so responses still streaming the old chain keep a consistent view of it
+            if isinstance(self.chain, list):
+                self.chain, self.block_hashes = self.chain[:fork], self.block_hashes[:fork]
+            else:
+                self.chain, self.block_hashes = self.chain.head(fork), self.block_hashes[:fork]
+                self.retire_archive()
+
+            for block, block_hash in zip(blocks, hashes):
+                self.chain.append(block)
+                self.block_hashes.append(block_hash)
+                self.update_balances(balances=self.balances, block=block)
+                self.update_sequences(sequences=self.sequences, block=block)
+            self.chain_version += 1
+
+            if self.store is not None:
+                self.store.replace_blocks(fork=fork, blocks=blocks, hashes=hashes)
+            self.remove_stale_transactions()
+
+        for callback in self.chain_replaced_callbacks:
+            callback()
+
+    def chain_summary(self):
+        """
+        Length and tip hash of our chain, which is all a neighbour needs to know if it should download it
+        """
+        with self.lock.read():
+            return {
+                'length': len(self.chain),
+                'tip_hash': self.block_hashes[-1]
+            }
+
+    def fetch_summary(self, node, timeout=CONSENSUS_TIMEOUT):
+        """
+        Ask a neighbour for the length and tip hash of its chain.
+        Returns None for neighbours that don't serve /chain/summary, so their full chain gets checked instead.
+        """
+        response = self.session.get(
+            url='http://' + node + '/chain/summary', timeout=timeout)
+
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+
+        summary = response.json()
+        return summary['length'], summary['tip_hash']
+
+    async def fetch_summary_async(self, session, node):
+        """
+        fetch_summary over an aiohttp session
+        """
+        async with session.get('http://' + node + '/chain/summary') as response:
+            if response.status == 404:
+                return None
+            response.raise_for_status()
+
+            summary = await response.json()
+        return summary['length'], summary['tip_hash']
+
+    @staticmethod
+    def until_deadline(items, deadline):
+        """
+        Items of an iterator, raising TimeoutError instead of reading on once the deadline passed
+        """
+        for item in items:
+            if deadline is not None and time() > deadline:
+                raise TimeoutError('Consensus deadline passed')
+            yield item
+
+    def read_blocks(self, response, key, deadline=None):
+        """
+        Blocks of a response, decoded as they arrive when the neighbour streams them in the binary
+        format or as NDJSON, or from the list under key of a JSON body for older neighbours.
+        Reading a stream past the deadline raises TimeoutError.
+        The response is closed once the blocks are read, the deadline passed or the generator is dropped.
+        """
+        with response:
+            content_type = response.headers.get('Content-Type', '')
+            if content_type.startswith(BLOCKS_MIMETYPE):
+                chunks = response.iter_content(chunk_size=WIRE_CHUNK_SIZE)
+                yield from decode_blocks(self.until_deadline(chunks, deadline))
+            elif content_type.startswith(NDJSON_MIMETYPE):
+                for line in self.until_deadline(response.iter_lines(), deadline):
+                    if line:
+                        yield json.loads(line)
+            else:
+                yield from response.json()[key]
+
+    def validate_stream(self, last_block, last_hash, blocks, deadline=None):
+        """
+        Validate blocks one at a time as they are read, so an invalid block stops the download
+        before the rest is parsed.
+        Returns the blocks and their hashes, or None at the first block that isn't valid.
+        Raises TimeoutError if the deadline passes first.
+        """
+        valid_blocks, hashes = [], [last_hash]
+        sequences = self.fork_sequences(fork=last_block['block_number'])
+
+        for block in self.until_deadline(blocks, deadline):
+            block_hashes = self.hash_valid_blocks(last_block=last_block, blocks=[block], last_hash=hashes[-1],
+                                                  sequences=sequences)
+            if block_hashes is None:
+                return None
 
+            valid_blocks.append(block)
+            hashes.append(block_hashes[1])
             last_block = block
-            current_index += 1
 
-        return True
+        return valid_blocks, hashes[1:]
+
+    def fetch_chain(self, node, timeout=CONSENSUS_TIMEOUT):
+        """
+        Download the chain of a neighbour and return it with the hashes of its blocks
+        if it is valid and longer than ours, otherwise None.
+        The chain is streamed and validated block by block, until the timeout.
+        """
+        deadline = time() + timeout
+        response = self.session.get(
+            url='http://' + node + '/chain', headers={'Accept': BLOCKS_ACCEPT}, timeout=timeout, stream=True)
 
-    def resolve_conflicts(self):
+        if response.status_code != 200:
+            response.close()
+            return None
+
+        # Streamed chains announce their length in a header, so a shorter one is never read
+        if response.headers.get('Content-Type', '').startswith((BLOCKS_MIMETYPE, NDJSON_MIMETYPE)):
+            length = int(response.headers['X-Chain-Length'])
+            blocks = self.read_blocks(response, 'chain', deadline)
+        else:
+            # Older neighbours send one JSON body, parsed once for both the length and the blocks
+            with response:
+                body = response.json()
+            length, blocks = body['length'], iter(body['chain'])
+
+        if length <= len(self.chain):
+            response.close()
+            return None
+
+        genesis = next(blocks, None)
+        if genesis is None or genesis.get('block_number') != 1:
+            return None
+
+        genesis_hash = self.hash(genesis)
+        result = self.validate_stream(last_block=genesis, last_hash=genesis_hash, blocks=blocks, deadline=deadline)
+        if result is None or len(result[0]) + 1 <= len(self.chain):
+            return None
+
+        return [genesis] + result[0], [genesis_hash] + result[1]
+
+    def fetch_blocks(self, node, first, last, timeout=CONSENSUS_TIMEOUT):
+        """
+        Download the blocks numbered first to last from a neighbour, as an iterator
+        that parses them while they arrive, until the timeout.
+        Returns None for neighbours that don't serve /chain/blocks.
+        """
+        deadline = time() + timeout
+        response = self.session.get(
+            url='http://' + node + '/chain/blocks', params={'from': first, 'to': last},
+            headers={'Accept': BLOCKS_ACCEPT}, timeout=timeout, stream=True)
+
+        if response.status_code == 404:
+            response.close()
+            return None
+        if response.status_code != 200:
+            response.close()
+            response.raise_for_status()
+
+        return self.read_blocks(response, 'blocks', deadline)
+
+    def fetch_divergent_blocks(self, node, length, deadline):
+        """
+        Download the blocks of a longer neighbour chain past our common ancestor.
+        Starting at our last block, it walks back in doubling steps until the first downloaded
+        block is one of ours, and only validates the blocks after it, one at a time as they arrive.
+        Returns how many of our blocks to keep, the blocks to append after them and their hashes,
+        or None if the neighbour's chain isn't valid.
+        """
+        local_length = len(self.chain)
+        first, last = local_length, length
+        step = 1
+        blocks = []
+
+        while True:
+            timeout = deadline - time()
+            if timeout <= 0:
+                return None
+
+            fetched = self.fetch_blocks(node, first, last, timeout)
+            if fetched is None:
+                # Older neighbour without ranged downloads, check its whole chain instead
+                result = self.fetch_chain(node, timeout)
+                return None if result is None else (0, *result)
+
+            first_block = next(fetched, None)
+            if first_block is None:
+                return None
+            first_hash = self.hash(first_block)
+
+            # A block matching ours means everything before it matches as well,
+            # and if not even the genesis block is shared the whole chain is new
+            if first_hash == self.block_hashes[first - 1] or first == 1:
+                result = self.validate_stream(last_block=first_block, last_hash=first_hash,
+                                              blocks=itertools.chain(fetched, blocks), deadline=deadline)
+                if result is None or len(result[0]) != length - first:
+                    return None
+                if first_hash == self.block_hashes[first - 1]:
+                    return (first, *result)
+                return 0, [first_block] + result[0], [first_hash] + result[1]
+
+            window = [first_block] + list(fetched)
+            if len(window) != last - first + 1:
+                return None
+            blocks = window + blocks
+
+            last = first - 1
+            first = max(first - step, 1)
+            step *= 2
+
+    def fetch_longer_blocks(self, nodes, length, deadline):
+        """
+        Try neighbours that announced the same chain one after the other, until one of them
+        returns it valid and longer than ours or the deadline passes.
+        A length of None means the neighbours didn't announce one, so their whole chain is downloaded.
+        Neighbours appended to the list while this runs are tried as well.
+        Returns how many of our blocks to keep, the blocks to append after them and their hashes, or None.
+        """
+        for node in nodes:
+            timeout = deadline - time()
+            if timeout <= 0:
+                break
+
+            try:
+                if length is None:
+                    result = self.fetch_chain(node, timeout)
+                    result = None if result is None else (0, *result)
+                else:
+                    result = self.fetch_divergent_blocks(node, length, deadline)
+            except Exception:
+                # A misbehaving neighbour must not stop us from asking the next one
+                continue
+
+            if result is not None:
+                return result
+
+        return None
+
+    def resolve_conflicts(self, timeout=CONSENSUS_TIMEOUT):
         """
         Resolve conflicts between blockchain's nodes
         by replacing our chain with the longest one in the network.
+        Neighbours are first asked for their chain summary, and only the ones that are longer than ours
+        are synced, concurrently, by downloading the blocks past our common ancestor.
+        Neighbours that fail or don't answer within the timeout are ignored.
         """
-        neighbours = self.nodes
-        new_chain = None
+        neighbours = list(self.nodes)
+        deadline = time() + timeout
 
         # We're only looking for chains longer than ours
-        max_length = len(self.chain)
-
-        # Grab and verify the chains from all the nodes in our network
-        for node in neighbours:
-            print('http://' + node + '/chain')
-            response = requests.get(
-                url='http://' + node + '/chain', timeout=10)
-
-            if response.status_code == 200:
-                length = response.json()['length']
-                chain = response.json()['chain']
-
-                # Check if the length is longer and the chain is valid
-                if length > max_length and self.valid_chain(chain):
-                    max_length = length
-                    new_chain = chain
-
-        # Replace our chain if we discovered a new, valid chain longer than ours
-        if new_chain:
-            self.chain = new_chain
-            return True
+        max_length, chain_version = self.chain_state()
+
+        executor = ThreadPoolExecutor(max_workers=CONSENSUS_WORKERS)
+        # Longer neighbours grouped by the chain they announced, so each chain is downloaded once
+        candidates = {}
+        downloads = []
+        try:
+            # Ask every neighbour for its chain summary, and start downloading as soon as one is longer
+            summaries = {executor.submit(self.fetch_summary, node, timeout): node for node in neighbours}
+            try:
+                for future in as_completed(summaries, timeout=timeout):
+                    if future.exception() is not None:
+                        continue
+
+                    candidate = self.add_candidate(candidates, summaries[future], future.result(), max_length)
+                    if candidate is not None:
+                        downloads.append(executor.submit(self.fetch_longer_blocks, *candidate, deadline))
+            except TimeoutError:
+                pass
+
+            # Grab and verify the candidate chains
+            done, _ = wait(downloads, timeout=max(deadline - time(), 0))
+        finally:
+            # Don't wait for the neighbours that missed the deadline, their downloads stop reading at it
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return self.adopt_longest_chain([future.result() for future in done], max_length, chain_version)
+
+    async def resolve_conflicts_async(self, session, executor, timeout=CONSENSUS_TIMEOUT):
+        """
+        resolve_conflicts for an event loop.
+        The chain summaries are fetched with an aiohttp session, without holding a thread per neighbour.
+        Only the downloads of longer chains, which validate every block they receive, run on the executor.
+        """
+        loop = asyncio.get_running_loop()
+        neighbours = list(self.nodes)
+        deadline = time() + timeout
+
+        max_length, chain_version = await loop.run_in_executor(executor, self.chain_state)
+
+        candidates = {}
+        downloads = []
+        summaries = {
+            asyncio.ensure_future(asyncio.wait_for(self.fetch_summary_async(session, node), timeout)): node
+            for node in neighbours
+        }
+        pending = set(summaries)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(deadline - time(), 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+
+                    candidate = self.add_candidate(candidates, summaries[task], task.result(), max_length)
+                    if candidate is not None:
+                        downloads.append(loop.run_in_executor(executor, self.fetch_longer_blocks, *candidate, deadline))
+        finally:
+            for task in pending:
+                task.cancel()
+
+        done = set()
+        if downloads:
+            done, pending = await asyncio.wait(downloads, timeout=max(deadline - time(), 0))
+            # Downloads that already started stop reading at the deadline, their result is dropped
+            for future in pending:
+                future.cancel()
+
+        results = [future.result() for future in done]
+        return await loop.run_in_executor(executor, self.adopt_longest_chain, results, max_length, chain_version)
+
+    def chain_state(self):
+        """
+        Length and version of our chain, read together
+        """
+        with self.lock.read():
+            return len(self.chain), self.chain_version
+
+    @staticmethod
+    def add_candidate(candidates, node, summary, max_length):
+        """
+        Group a neighbour with the ones that announced the same chain.
+        Returns the nodes and length to pass to fetch_longer_blocks when the neighbour announced
+        a new chain longer than ours, None otherwise. Neighbours without a summary get a group of their own.
+        """
+        if summary is None:
+            key, length = node, None
+        elif summary[0] > max_length:
+            key, length = summary, summary[0]
+        else:
+            return None
+
+        if key in candidates:
+            candidates[key].append(node)
+            return None
+        candidates[key] = [node]
+        return candidates[key], length
+
+    def adopt_longest_chain(self, results, max_length, chain_version):
+        """
+        Splice the longest of the downloaded chains into ours.
+        Returns True if our chain was replaced.
+        """
+        new_blocks = None
+        for result in results:
+            if result is not None and result[0] + len(result[1]) > max_length:
+                max_length = result[0] + len(result[1])
+                new_blocks = result
+
+        # Replace our chain if we discovered a new, valid chain longer than ours.
+        # Blocks mined meanwhile only extend our chain, but if it was replaced the fork point may be gone.
+        with self.write():
+            if new_blocks and max_length > len(self.chain) and self.chain_version == chain_version:
+                self.splice_chain(*new_blocks)
+                return True
 
         return False
@@ -0,0 +1,113 @@
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from keys import KEY_SCHEMES, WALLET_KEY_SCHEME
+
+# Number of key pairs generated ahead of /wallet/new requests, 0 generates every key pair in the request
+WALLET_POOL_SIZE = int(os.environ.get('WALLET_POOL_SIZE', 0))
+# Number of processes filling the pool
+WALLET_POOL_WORKERS = int(os.environ.get('WALLET_POOL_WORKERS', 1))
+
+
+def generate_key_pair(scheme=WALLET_KEY_SCHEME):
+    """
+    Generate a wallet key pair of a key scheme, returns the public and private keys as strings
+    """
+    return KEY_SCHEMES[scheme].generate()
+
+
+class KeyPool:
+    """
+    Key pairs of one key scheme generated in the background on a pool of processes, up to `size` of them,
+    so creating a wallet only has to take one
+    """
+
+    def __init__(self, size=WALLET_POOL_SIZE, workers=WALLET_POOL_WORKERS, scheme=WALLET_KEY_SCHEME):
+
+        self.size = size
+        self.workers = workers
+        self.scheme = scheme
+        self.key_pairs = deque()
+        self.condition = threading.Condition()
+        # Key pairs being generated right now
+        self.in_flight = 0
+        self.executor = None
+        self.threads = []
+        # Wallets created from the pool and wallets that had to generate their key pair themselves
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.key_pairs)
+
+    def start(self):
+        """
+        Start filling the pool, one background thread per worker process
+        """
+        if self.size <= 0 or self.threads:
+            return
+
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        for _ in range(self.workers):
+            thread = threading.Thread(target=self.fill, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def fill(self):
+        """
+        Background thread that keeps generating key pairs while the pool is below its size
+        """
+        while True:
+            with self.condition:
+                while len(self.key_pairs) + self.in_flight >= self.size:
+                    self.condition.wait()
+                self.in_flight += 1
+
+            try:
+                key_pair = self.executor.submit(generate_key_pair, self.scheme).result()
+            except Exception:
+                # Wallets keep being created inline if the worker processes are gone
+                with self.condition:
+                    self.in_flight -= 1
+                return
+
+            with self.condition:
+                self.in_flight -= 1
+                self.key_pairs.append(key_pair)
+                self.condition.notify_all()
+
+    def pop(self):
+        """
+        Take a pre-generated key pair, returns None if the pool is empty
+        """
+        with self.condition:
+            if not self.key_pairs:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            key_pair = self.key_pairs.popleft()
+            # Wake up a filler thread to replace it
+            self.condition.notify_all()
+            return key_pair
+
+    def wait_full(self, timeout=None):
+        """
+        Block until the pool reached its size, returns False if the timeout expired first
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: len(self.key_pairs) >= self.size, timeout=timeout)
+
+    def stats(self):
+        """
+        Depth of the pool against its size, and how many wallets were served from it
+        """
+        with self.condition:
+            return {
+                'depth': len(self.key_pairs),
+                'size': self.size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
@@ -0,0 +1,302 @@
+import binascii
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import Crypto
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Signature import PKCS1_v1_5, eddsa
+
+# Number of parsed keys kept for signing and for verification each, 0 parses every key again
+KEY_CACHE_SIZE = int(os.environ.get('KEY_CACHE_SIZE', 1024))
+# Number of verified transaction signatures remembered, 0 verifies every signature again
+SIGNATURE_CACHE_SIZE = int(os.environ.get('SIGNATURE_CACHE_SIZE', 100_000))
+# Key scheme of the wallets created by /wallet/new
+WALLET_KEY_SCHEME = os.environ.get('WALLET_KEY_SCHEME', 'rsa')
+
+
+class RSAKey:
+    """
+    Parsed RSA key, signing with PKCS#1 v1.5 over SHA-256
+    """
+
+    def __init__(self, key):
+
+        self.key = key
+        self.scheme = PKCS1_v1_5.new(key)
+        # Wallet address of the key, the hex-encoded DER public key without a prefix
+        self.address = binascii.hexlify(key.publickey().exportKey(format='DER')).decode('ascii')
+
+    def sign(self, message):
+        """
+        Signature of a message, needs a private key
+        """
+        return self.scheme.sign(SHA256.new(message))
+
+    def verify(self, message, signature):
+        """
+        Check the signature of a message
+        """
+        return self.scheme.verify(SHA256.new(message), signature)
+
+
+class Ed25519Key:
+    """
+    Parsed Ed25519 key, signing with pure EdDSA (RFC 8032)
+    """
+
+    def __init__(self, key):
+
+        self.key = key
+        self.scheme = eddsa.new(key, 'rfc8032')
+        # Wallet address of the key, the raw public key in hex after the scheme prefix
+        self.address = 'ed25519:' + key.public_key().export_key(format='raw').hex()
+
+    def sign(self, message):
+        """
+        Signature of a message, needs a private key
+        """
+        return self.scheme.sign(message)
+
+    def verify(self, message, signature):
+        """
+        Check the signature of a message
+        """
+        try:
+            self.scheme.verify(message, signature)
+            return True
+        except ValueError:
+            return False
+
+
+class RSAScheme:
+    """
+    The original wallet keys: RSA-3072, with keys and addresses as hex-encoded DER without a prefix
+    """
+
+    name = 'rsa'
+
+    def __init__(self, key_size=3072):
+
+        self.key_size = key_size
+
+    def generate(self):
+        """
+        Generate a key pair, returns the public and private keys as strings
+        """
+        random_gen = Crypto.Random.new().read
+        private_key = RSA.generate(self.key_size, random_gen)
+        public_key = private_key.publickey()
+
+        public_key_str = binascii.hexlify(
+            public_key.exportKey(format='DER')).decode('ascii')
+        private_key_str = binascii.hexlify(
+            private_key.exportKey(format='DER')).decode('ascii')
+        return public_key_str, private_key_str
+
+    def import_private_key(self, encoded):
+        """
+        Parse a private key string
+        """
+        return RSAKey(RSA.importKey(binascii.unhexlify(encoded)))
+
+    def import_public_key(self, encoded):
+        """
+        Parse a public key string
+        """
+        return RSAKey(RSA.importKey(binascii.unhexlify(encoded)))
+
+
+class Ed25519Scheme:
+    """
+    Ed25519 keys, written as 'ed25519:' followed by the raw 32-byte public key or private seed in hex
+    """
+
+    name = 'ed25519'
+
+    def generate(self):
+        """
+        Generate a key pair, returns the public and private keys as strings
+        """
+        private_key = eddsa.import_private_key(Crypto.Random.get_random_bytes(32))
+        return Ed25519Key(private_key).address, 'ed25519:' + private_key.seed.hex()
+
+    def import_private_key(self, encoded):
+        """
+        Parse a private key string
+        """
+        return Ed25519Key(eddsa.import_private_key(bytes.fromhex(encoded.partition(':')[2])))
+
+    def import_public_key(self, encoded):
+        """
+        Parse a public key string
+        """
+        return Ed25519Key(eddsa.import_public_key(bytes.fromhex(encoded.partition(':')[2])))
+
+# Key schemes by name, the name prefixes the keys and addresses of every scheme but RSA
+KEY_SCHEMES = {scheme.name: scheme for scheme in (RSAScheme(), Ed25519Scheme())}
+
+
+def key_scheme(encoded):
+    """
+    Scheme of a key or address string, from its prefix
+    """
+    if not isinstance(encoded, str):
+        raise TypeError('Keys must be strings')
+
+    name, separator, _ = encoded.partition(':')
+    if not separator:
+        return KEY_SCHEMES['rsa']
+    if name not in KEY_SCHEMES:
+        raise ValueError(f'Unknown key scheme: {name}')
+    return KEY_SCHEMES[name]
+
+
+class KeyCache:
+    """
+    Bounded LRU cache of parsed keys keyed by their string, so the keys of wallets
+    that keep transacting are only parsed once
+    """
+
+    def __init__(self, maxsize=KEY_CACHE_SIZE):
+
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.signers = OrderedDict()
+        self.verifiers = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def signer(self, private_key):
+        """
+        Parsed private key, of any key scheme
+        """
+        return self.get(self.signers, private_key, self.parse_private_key)
+
+    def public_key(self, private_key):
+        """
+        Wallet address of a private key
+        """
+        return self.signer(private_key).address
+
+    def verifier(self, public_key):
+        """
+        Parsed public key, of any key scheme
+        """
+        return self.get(self.verifiers, public_key, self.parse_public_key)
+
+    def parse_private_key(self, private_key):
+        """
+        Parse a private key with the scheme of its prefix
+        """
+        return key_scheme(private_key).import_private_key(private_key)
+
+    def parse_public_key(self, public_key):
+        """
+        Parse a public key with the scheme of its prefix
+        """
+        return key_scheme(public_key).import_public_key(public_key)
+
+    def get(self, entries, key, parse):
+        """
+        Look a key up in one of the caches, parsing it and evicting the least recently used entry on a miss
+        """
+        with self.lock:
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Parse outside the lock, two threads missing on the same key just both parse it
+        entry = parse(key)
+
+        if self.maxsize > 0:
+            with self.lock:
+                entries[key] = entry
+                if len(entries) > self.maxsize:
+                    entries.popitem(last=False)
+
+        return entry
+
+    def stats(self):
+        """
+        Hit and miss counters and the number of cached keys
+        """
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'signers': len(self.signers),
+                'verifiers': len(self.verifiers)
+            }
+
+    def clear(self):
+        """
+        Forget every cached key and reset the counters
+        """
+        with self.lock:
+            self.signers.clear()
+            self.verifiers.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class SignatureCache:
+    """
+    Bounded LRU set of (transaction hash, signature) pairs that were verified successfully,
+    so blocks carrying transactions this node already accepted skip the RSA work.
+    """
+
+    def __init__(self, maxsize=SIGNATURE_CACHE_SIZE):
+
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def key(self, message, signature):
+        """
+        Cache key of a signature over the signed bytes of a transaction
+        """
+        return hashlib.sha256(message).digest(), signature
+
+    def seen(self, message, signature):
+        """
+        Whether a signature over a transaction was verified before
+        """
+        key = self.key(message, signature)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, message, signature):
+        """
+        Remember a signature that verified, evicting the least recently used one if the cache is full
+        """
+        if self.maxsize <= 0:
+            return
+
+        key = self.key(message, signature)
+        with self.lock:
+            self.entries[key] = True
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        """
+        Hit and miss counters and the number of remembered signatures
+        """
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'signatures': len(self.entries)}
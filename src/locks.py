@@ -0,0 +1,83 @@
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Lock held by any number of readers at once or by a single writer.
+    Waiting writers go first, so a steady flow of readers can't starve them.
+    A thread can take the lock again while it holds it, except to upgrade a read to a write.
+    """
+
+    def __init__(self):
+
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.waiting_writers = 0
+        # Thread holding the write lock and how many times it took it
+        self.writer = None
+        self.writer_depth = 0
+        # Read locks held by the current thread
+        self.local = threading.local()
+
+    @contextmanager
+    def read(self):
+        """
+        Hold the lock for reading
+        """
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        """
+        Hold the lock for writing
+        """
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def acquire_read(self):
+        reads = getattr(self.local, 'reads', 0)
+        with self.condition:
+            # Threads already holding the lock don't queue behind waiting writers, or they would never wake up
+            if not reads and self.writer != threading.get_ident():
+                self.condition.wait_for(lambda: self.writer is None and not self.waiting_writers)
+            self.readers += 1
+        self.local.reads = reads + 1
+
+    def release_read(self):
+        self.local.reads -= 1
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        thread = threading.get_ident()
+        with self.condition:
+            if self.writer == thread:
+                self.writer_depth += 1
+                return
+            if getattr(self.local, 'reads', 0):
+                raise RuntimeError('A read lock cannot be upgraded to a write lock')
+
+            self.waiting_writers += 1
+            try:
+                self.condition.wait_for(lambda: self.writer is None and not self.readers)
+            finally:
+                self.waiting_writers -= 1
+            self.writer = thread
+            self.writer_depth = 1
+
+    def release_write(self):
+        with self.condition:
+            self.writer_depth -= 1
+            if not self.writer_depth:
+                self.writer = None
+                self.condition.notify_all()
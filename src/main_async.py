@@ -0,0 +1,8 @@
+import uvicorn
+
+from app.asgi import AsyncApp
+
+app = AsyncApp()
+
+if __name__ == "__main__":
+    uvicorn.run(app, port=5000)
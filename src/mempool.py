@@ -0,0 +1,159 @@
+import hashlib
+import itertools
+import json
+import os
+from collections import OrderedDict
+
+# Largest number of pending transactions kept, new ones are refused beyond it
+MEMPOOL_SIZE = int(os.environ.get('MEMPOOL_SIZE', 100_000))
+
+
+def transaction_hash(transaction):
+    """
+    SHA-256 hash of the content of a transaction, signature included, which identifies it in the pool
+    """
+    return hashlib.sha256(json.dumps(transaction, sort_keys=True).encode()).hexdigest()
+
+
+class Mempool:
+    """
+    Pending transactions keyed by their hash, oldest first, with the hashes each address sends and receives
+    and the running totals of pending debits and credits per address id.
+    Adding, looking up and removing a transaction don't depend on the size of the pool.
+    The pool isn't thread-safe, Blockchain changes it under its write lock.
+    """
+
+    def __init__(self, max_size=MEMPOOL_SIZE):
+
+        self.max_size = max_size
+        # Transactions by hash, in the order they were added. Unlike a dict, taking the oldest
+        # one out over and over doesn't leave holes that the next lookup of the oldest has to skip.
+        self.transactions = OrderedDict()
+        # Sender and recipient address ids and arrival number of every transaction, by hash
+        self.entries = {}
+        self.arrivals = 0
+        # Hashes of the pending transactions of every address id, as ordered sets
+        self.by_sender = {}
+        self.by_recipient = {}
+        # Running totals of pending debits and credits per address id
+        self.debits = {}
+        self.credits = {}
+        # Sequence number of every transaction in a shared store, by hash
+        self.seqs = {}
+        # Hashes of the pending transfers of every sender address id by sequence number, which only go up
+        self.by_sequence = {}
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def __iter__(self):
+        return iter(self.transactions.values())
+
+    def __contains__(self, tx_hash):
+        return tx_hash in self.transactions
+
+    def get(self, tx_hash):
+        """
+        Look up a pending transaction by hash, returns None if it isn't pending
+        """
+        return self.transactions.get(tx_hash)
+
+    def last_sequence(self, sender_id):
+        """
+        Highest sequence number of the pending transfers of a sender, None if it has none
+        """
+        pending = self.by_sequence.get(sender_id)
+        return next(reversed(pending)) if pending else None
+
+    def add(self, tx_hash, transaction, sender_id, recipient_id, seq=None):
+        """
+        Add a transaction to the pool. Returns False if it, or another transaction of its sender
+        with the same sequence number, was already pending.
+        Transfers have to come in the order of their sequence numbers.
+        """
+        # Mining rewards have no sequence number
+        sequence = transaction.get('sequence')
+        if tx_hash in self.transactions or sequence in self.by_sequence.get(sender_id, ()):
+            return False
+
+        self.transactions[tx_hash] = transaction
+        self.entries[tx_hash] = sender_id, recipient_id, self.arrivals
+        self.arrivals += 1
+        self.by_sender.setdefault(sender_id, {})[tx_hash] = None
+        self.by_recipient.setdefault(recipient_id, {})[tx_hash] = None
+        self.debits[sender_id] = self.debits.get(sender_id, 0) + transaction['value']
+        self.credits[recipient_id] = self.credits.get(recipient_id, 0) + transaction['value']
+        if seq is not None:
+            self.seqs[tx_hash] = seq
+        if sequence is not None:
+            self.by_sequence.setdefault(sender_id, {})[sequence] = tx_hash
+        return True
+
+    def remove(self, tx_hash):
+        """
+        Take a transaction out of the pool, returns it or None if it wasn't pending
+        """
+        transaction = self.transactions.pop(tx_hash, None)
+        if transaction is None:
+            return None
+
+        sender_id, recipient_id, _ = self.entries.pop(tx_hash)
+        self.seqs.pop(tx_hash, None)
+        pending = self.by_sequence.get(sender_id, {})
+        if pending.get(transaction.get('sequence')) == tx_hash:
+            del pending[transaction['sequence']]
+            if not pending:
+                del self.by_sequence[sender_id]
+        self.unindex(self.by_sender, self.debits, sender_id, tx_hash, transaction['value'])
+        self.unindex(self.by_recipient, self.credits, recipient_id, tx_hash, transaction['value'])
+        return transaction
+
+    @staticmethod
+    def unindex(index, totals, address_id, tx_hash, value):
+        """
+        Drop a transaction from the index and running total of one of its addresses
+        """
+        hashes = index[address_id]
+        del hashes[tx_hash]
+        if hashes:
+            totals[address_id] -= value
+        else:
+            # Without pending transactions left the total is exactly zero, not a rounding error away from it
+            del index[address_id]
+            del totals[address_id]
+
+    def select(self, limit):
+        """
+        The transactions to mine next, at most limit of them: the oldest ones, which also come
+        before any transaction spending what they credit
+        """
+        return list(itertools.islice(self.transactions.values(), limit))
+
+    def full(self):
+        """
+        Whether the pool holds its maximum number of transactions.
+        Pending transactions are never evicted to make room, as later ones may spend what they credit.
+        """
+        return len(self.transactions) >= self.max_size
+
+    def stale(self, last_sequences):
+        """
+        Hashes of the pending transfers that don't follow on from the last sequence number of their sender
+        in last_sequences, by sender address id: the ones whose number is used, and every one after a gap
+        """
+        hashes = []
+        for sender_id, pending in self.by_sequence.items():
+            expected = last_sequences.get(sender_id, 0) + 1
+            for sequence, tx_hash in pending.items():
+                if sequence == expected:
+                    expected += 1
+                else:
+                    hashes.append(tx_hash)
+        return hashes
+
+    def for_address(self, address_id):
+        """
+        Pending transactions an address sends or receives, oldest first
+        """
+        hashes = self.by_sender.get(address_id, {}).keys() | self.by_recipient.get(address_id, {}).keys()
+        return [self.transactions[tx_hash] for tx_hash in sorted(hashes, key=lambda tx_hash: self.entries[tx_hash][2])]
@@ -0,0 +1,264 @@
+import queue
+import threading
+from time import monotonic
+from uuid import uuid4
+
+from blockchain import MINING_REWARD, MINING_SENDER
+
+# Number of finished mining jobs kept around for /mine/status
+MINING_JOB_HISTORY = 100
+# Seconds between lookups of a cancel another worker recorded in the shared store, while a job mines
+MINING_CANCEL_POLL_INTERVAL = 0.5
+# Statuses of the jobs that haven't finished yet
+ACTIVE_STATUSES = ('queued', 'mining')
+
+
+class SharedCancelEvent:
+    """
+    Cancel event of a job that is also set by a cancel another worker recorded in the shared store,
+    looked up at most every MINING_CANCEL_POLL_INTERVAL seconds as the proof of work checks it very often
+    """
+
+    def __init__(self, event, store, job_id):
+
+        self.event = event
+        self.store = store
+        self.job_id = job_id
+        self.checked = float('-inf')
+
+    def is_set(self):
+        if not self.event.is_set() and monotonic() - self.checked >= MINING_CANCEL_POLL_INTERVAL:
+            self.checked = monotonic()
+            if self.store.job_cancelled(self.job_id):
+                self.event.set()
+        return self.event.is_set()
+
+
+class MiningJob:
+
+    def __init__(self, miner_address, store=None):
+
+        self.job_id = str(uuid4()).replace('-', '')
+        self.miner_address = miner_address
+        # One of 'queued', 'mining', 'completed', 'cancelled' or 'failed'
+        self.status = 'queued'
+        self.block = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.finished_event = threading.Event()
+        # Shared store the job is kept in for the other workers, None when it stays with this one
+        self.store = store
+
+    @classmethod
+    def from_dict(cls, fields, store=None):
+        """
+        Job as it was last stored by the worker running it
+        """
+        job = cls(miner_address=fields['miner_address'], store=store)
+        job.job_id = fields['job_id']
+        job.status = fields['status']
+        job.block = fields['block']
+        job.error = fields['error']
+        if job.status not in ACTIVE_STATUSES:
+            job.finished_event.set()
+        return job
+
+    def save(self):
+        """
+        Store the state of the job for the other workers, if it is shared
+        """
+        if self.store is not None:
+            self.store.save_job(self.job_id, self.to_dict(), finished=self.status not in ACTIVE_STATUSES)
+
+    def cancel_signal(self):
+        """
+        Event the proof of work checks to know when to stop, which other workers can set through a shared store
+        """
+        if self.store is None:
+            return self.cancel_event
+        return SharedCancelEvent(self.cancel_event, self.store, self.job_id)
+
+    def finish(self, status, block=None, error=None):
+        """
+        Record the outcome of the job and wake up anyone waiting on it
+        """
+        self.status = status
+        self.block = block
+        self.error = error
+        self.save()
+        self.finished_event.set()
+
+    def wait(self, timeout=None):
+        """
+        Block until the job has finished, returns False if the timeout expired first
+        """
+        return self.finished_event.wait(timeout=timeout)
+
+    def to_dict(self):
+        """
+        Serialize the job for the /mine/status endpoint
+        """
+        return {
+            'job_id': self.job_id,
+            'miner_address': self.miner_address,
+            'status': self.status,
+            'block': self.block,
+            'error': self.error
+        }
+
+
+class MiningScheduler:
+
+    def __init__(self, blockchain):
+
+        self.blockchain = blockchain
+        # Jobs are kept in a shared store as well, so any worker can report on them and cancel them
+        self.store = blockchain.store if blockchain.shared else None
+        # Jobs this worker runs
+        self.jobs = {}
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.thread = None
+        # A job mining on top of a chain that got replaced can never produce a valid block
+        blockchain.chain_replaced_callbacks.append(self.cancel_all)
+
+    def submit(self, miner_address):
+        """
+        Queue a new mining job and start the background mining thread if needed
+        """
+        job = MiningJob(miner_address=miner_address, store=self.store)
+
+        with self.lock:
+            self.jobs[job.job_id] = job
+            job.save()
+            self.forget_finished_jobs()
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+        self.queue.put(job)
+        return job
+
+    def get(self, job_id):
+        """
+        Look up a job by id, among the ones of every worker with a shared store. Returns None if it is unknown.
+        """
+        job = self.jobs.get(job_id)
+        if job is None and self.store is not None:
+            fields = self.store.load_job(job_id)
+            job = fields and MiningJob.from_dict(fields)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Ask a job to stop. Returns False if the job had already finished.
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return self.cancel_stored(job_id)
+        if job.finished_event.is_set():
+            return False
+
+        job.cancel_event.set()
+        # A job that hasn't started yet is finished right away
+        if job.status == 'queued':
+            job.finish(status='cancelled', error='Cancelled before mining started')
+        return True
+
+    def cancel_stored(self, job_id):
+        """
+        Ask the worker running a job to stop it through the shared store, it notices while mining.
+        Returns False if the job had already finished.
+        """
+        with self.store.exclusive():
+            if not self.store.cancel_job(job_id):
+                return False
+
+            # A job that hasn't started yet is finished right away
+            job = MiningJob.from_dict(self.store.load_job(job_id), store=self.store)
+            if job.status == 'queued':
+                job.finish(status='cancelled', error='Cancelled before mining started')
+        return True
+
+    def cancel_all(self):
+        """
+        Cancel every job that hasn't finished yet
+        """
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+
+    def forget_finished_jobs(self):
+        """
+        Drop the oldest finished jobs once there are more than MINING_JOB_HISTORY of them
+        """
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_event.is_set()]
+        for job_id in finished[:len(finished) - MINING_JOB_HISTORY]:
+            del self.jobs[job_id]
+        if self.store is not None:
+            self.store.forget_jobs(keep=MINING_JOB_HISTORY)
+
+    def run(self):
+        """
+        Background thread that runs the queued jobs one after the other
+        """
+        while True:
+            job = self.queue.get()
+            if job.finished_event.is_set():
+                continue
+
+            try:
+                self.mine(job)
+            except Exception as error:
+                job.finish(status='failed', error=str(error))
+
+    def mine(self, job):
+        """
+        Run the proof of work for a job and forge its block
+        """
+        # Another worker may have cancelled the job while it was queued
+        cancel = job.cancel_signal()
+        if cancel.is_set():
+            job.finish(status='cancelled', error='Cancelled before mining started')
+            return
+
+        job.status = 'mining'
+        job.save()
+        blockchain = self.blockchain
+
+        # Mine a snapshot of the oldest pending transactions, the rest and the ones submitted meanwhile stay pending
+        blockchain.sync()
+        with blockchain.lock.read():
+            last_block = blockchain.chain[-1]
+            transactions = blockchain.block_transactions()
+        # The proof of work runs without the lock, so requests are served while mining
+        nonce = blockchain.proof_of_work(transactions=transactions, cancel=cancel)
+
+        if nonce is None:
+            job.finish(status='cancelled', error='Cancelled while mining')
+            return
+
+        # Reward the miner with a transaction from the system, which needs no signature
+        reward = blockchain.create_transaction(
+            sender_address=MINING_SENDER,
+            recipient_address=job.miner_address,
+            value=MINING_REWARD
+        )
+
+        # The tip can't change between the check and the new block
+        with blockchain.write():
+            if blockchain.chain[-1] is not last_block:
+                job.finish(status='cancelled', error='The chain changed while mining')
+                return
+
+            # Forge the new Block by adding it to the chain
+            previous_hash = blockchain.block_hash(last_block)
+            block = blockchain.create_block(nonce, previous_hash, transactions=transactions + [reward])
+
+        job.finish(status='completed', block={
+            'block_number': block['block_number'],
+            'transactions': block['transactions'],
+            'nonce': block['nonce'],
+            'previous_hash': block['previous_hash'],
+            'miner_balance': blockchain.get_balance(job.miner_address)
+        })
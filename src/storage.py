@@ -0,0 +1,297 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Path of the SQLite file the node keeps its chain and wallets in, unset to keep everything in memory
+STORAGE_PATH = os.environ.get('BLOCKCHAIN_DB')
+# When commits are fsynced: 'full' after every block, 'normal' at WAL checkpoints only, 'off' never
+STORAGE_SYNC = os.environ.get('BLOCKCHAIN_DB_SYNC', 'full')
+# Share the chain, the transactions pool, the registered nodes, the node id and the mining jobs with every process
+# opening the same file, so several WSGI workers serve one node
+STORAGE_SHARED = os.environ.get('BLOCKCHAIN_DB_SHARED', '0') == '1'
+
+SYNC_POLICIES = {'full': 'FULL', 'normal': 'NORMAL', 'off': 'OFF'}
+
+
+class BlockStore:
+
+    def __init__(self, path, sync=STORAGE_SYNC, shared=STORAGE_SHARED):
+
+        if sync not in SYNC_POLICIES:
+            raise ValueError(f'Invalid sync policy: {sync}')
+
+        self.path = path
+        self.shared = shared
+        # Blocks are written from the request threads and from the mining thread,
+        # and a thread holding an exclusive section writes several times within it
+        self.lock = threading.RLock()
+        # Nesting depth of exclusive sections, whose writes are committed together when the outermost one ends
+        self.exclusive_depth = 0
+        # Wait for the other workers' writes instead of failing right away
+        self.connection = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(f'PRAGMA synchronous={SYNC_POLICIES[sync]}')
+        with self.connection:
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS blocks ('
+                'block_number INTEGER PRIMARY KEY, hash TEXT NOT NULL, body TEXT NOT NULL)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS wallets ('
+                'public_key TEXT PRIMARY KEY, private_key TEXT NOT NULL)')
+            if shared:
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS transactions ('
+                    'seq INTEGER PRIMARY KEY AUTOINCREMENT, body TEXT NOT NULL)')
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+                self.connection.execute('CREATE TABLE IF NOT EXISTS nodes (node TEXT PRIMARY KEY)')
+                self.connection.execute(
+                    'CREATE TABLE IF NOT EXISTS jobs ('
+                    'job_id TEXT PRIMARY KEY, body TEXT NOT NULL, '
+                    'finished INTEGER NOT NULL DEFAULT 0, cancelled INTEGER NOT NULL DEFAULT 0)')
+
+    @contextmanager
+    def write(self):
+        """
+        Hold the lock for a write, committed right away unless it is part of an exclusive section
+        """
+        with self.lock:
+            if self.exclusive_depth:
+                yield
+            else:
+                with self.connection:
+                    yield
+
+    @contextmanager
+    def exclusive(self):
+        """
+        Hold the database write lock, so no other process writes until the section ends.
+        Everything written within is committed together, or rolled back if it raises.
+        """
+        with self.lock:
+            if self.exclusive_depth:
+                self.exclusive_depth += 1
+                try:
+                    yield
+                finally:
+                    self.exclusive_depth -= 1
+                return
+
+            self.connection.execute('BEGIN IMMEDIATE')
+            self.exclusive_depth = 1
+            try:
+                yield
+            except BaseException:
+                self.connection.rollback()
+                raise
+            else:
+                self.connection.commit()
+            finally:
+                self.exclusive_depth = 0
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Hold the lock for several reads, which all see the same committed state of the database
+        """
+        with self.lock:
+            if self.connection.in_transaction:
+                yield
+                return
+
+            self.connection.execute('BEGIN')
+            try:
+                yield
+            finally:
+                self.connection.commit()
+
+    def data_version(self):
+        """
+        Counter that changes whenever another connection commits to the database
+        """
+        with self.lock:
+            return self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def append_block(self, block, block_hash):
+        """
+        Store a block added at the end of the chain
+        """
+        with self.write():
+            self.connection.execute(
+                'INSERT INTO blocks (block_number, hash, body) VALUES (?, ?, ?)',
+                (block['block_number'], block_hash, json.dumps(block)))
+
+    def replace_blocks(self, fork, blocks, hashes):
+        """
+        Keep the first `fork` stored blocks and replace the rest with blocks, in a single transaction
+        """
+        rows = [(fork + index + 1, block_hash, json.dumps(block))
+                for index, (block, block_hash) in enumerate(zip(blocks, hashes))]
+
+        with self.write():
+            self.connection.execute('DELETE FROM blocks WHERE block_number > ?', (fork,))
+            self.connection.executemany(
+                'INSERT INTO blocks (block_number, hash, body) VALUES (?, ?, ?)', rows)
+
+    def load_blocks(self, after=0):
+        """
+        Read back the stored chain and the hashes of its blocks, or only the blocks numbered above `after`
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT hash, body FROM blocks WHERE block_number > ? ORDER BY block_number', (after,)).fetchall()
+
+        chain = [json.loads(body) for _, body in rows]
+        hashes = [block_hash for block_hash, _ in rows]
+        return chain, hashes
+
+    def tip(self):
+        """
+        Number and hash of the last stored block, or None if no block is stored
+        """
+        with self.lock:
+            return self.connection.execute(
+                'SELECT block_number, hash FROM blocks ORDER BY block_number DESC LIMIT 1').fetchone()
+
+    def block_hash(self, block_number):
+        """
+        Hash of a stored block, or None if it isn't stored
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT hash FROM blocks WHERE block_number = ?', (block_number,)).fetchone()
+        return row and row[0]
+
+    def add_transaction(self, transaction):
+        """
+        Store a transaction added to the pool, returns its sequence number
+        """
+        with self.write():
+            return self.connection.execute(
+                'INSERT INTO transactions (body) VALUES (?)', (json.dumps(transaction),)).lastrowid
+
+    def remove_transactions(self, seqs):
+        """
+        Delete transactions taken out of the pool, by sequence number, and count the removal
+        so the other processes know to reload their pool
+        """
+        with self.write():
+            self.connection.executemany('DELETE FROM transactions WHERE seq = ?', [(seq,) for seq in seqs])
+            self.connection.execute(
+                "INSERT INTO meta (key, value) VALUES ('pool_removals', 1) "
+                "ON CONFLICT (key) DO UPDATE SET value = value + 1")
+
+    def pool_removals(self):
+        """
+        Number of times transactions were removed from the stored pool
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'pool_removals'").fetchone()
+        return int(row[0]) if row else 0
+
+    def load_transactions(self, after=0):
+        """
+        Read back the pool in order as (sequence number, transaction) pairs, or only the ones after a sequence number
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT seq, body FROM transactions WHERE seq > ? ORDER BY seq', (after,)).fetchall()
+        return [(seq, json.loads(body)) for seq, body in rows]
+
+    def node_id(self, default):
+        """
+        Node id shared by the processes opening the store, the first one to ask sets it to its default
+        """
+        with self.write():
+            self.connection.execute('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)', ('node_id', default))
+            return self.connection.execute("SELECT value FROM meta WHERE key = 'node_id'").fetchone()[0]
+
+    def add_node(self, node):
+        """
+        Store a registered neighbour node
+        """
+        with self.write():
+            self.connection.execute('INSERT OR IGNORE INTO nodes (node) VALUES (?)', (node,))
+
+    def load_nodes(self):
+        """
+        Read back the registered neighbour nodes as a set
+        """
+        with self.lock:
+            return {node for node, in self.connection.execute('SELECT node FROM nodes')}
+
+    def save_job(self, job_id, fields, finished):
+        """
+        Store the state of a mining job, whichever worker runs it
+        """
+        with self.write():
+            self.connection.execute(
+                'INSERT INTO jobs (job_id, body, finished) VALUES (?, ?, ?) '
+                'ON CONFLICT (job_id) DO UPDATE SET body = excluded.body, finished = excluded.finished',
+                (job_id, json.dumps(fields), int(finished)))
+
+    def load_job(self, job_id):
+        """
+        Read back the state of a mining job, or None if it isn't stored
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT body FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return row and json.loads(row[0])
+
+    def cancel_job(self, job_id):
+        """
+        Ask the worker running a mining job to stop it. Returns False if the job had already finished.
+        """
+        with self.write():
+            return self.connection.execute(
+                'UPDATE jobs SET cancelled = 1 WHERE job_id = ? AND finished = 0', (job_id,)).rowcount == 1
+
+    def job_cancelled(self, job_id):
+        """
+        Whether any worker asked to stop a mining job
+        """
+        with self.lock:
+            row = self.connection.execute('SELECT cancelled FROM jobs WHERE job_id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def forget_jobs(self, keep):
+        """
+        Delete the oldest finished mining jobs, keeping the `keep` most recent ones
+        """
+        with self.write():
+            self.connection.execute(
+                'DELETE FROM jobs WHERE finished = 1 AND rowid NOT IN '
+                '(SELECT rowid FROM jobs WHERE finished = 1 ORDER BY rowid DESC LIMIT ?)', (keep,))
+
+    def load_wallet(self, public_key):
+        """
+        Private key of a stored wallet, or None if it isn't stored
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT private_key FROM wallets WHERE public_key = ?', (public_key,)).fetchone()
+        return row and row[0]
+
+    def save_wallet(self, public_key, private_key):
+        """
+        Store the key pair of a new wallet
+        """
+        with self.write():
+            self.connection.execute(
+                'INSERT OR REPLACE INTO wallets (public_key, private_key) VALUES (?, ?)',
+                (public_key, private_key))
+
+    def load_wallets(self):
+        """
+        Read back the stored wallets as a dictionary of public key to private key
+        """
+        with self.lock:
+            return dict(self.connection.execute('SELECT public_key, private_key FROM wallets'))
+
+    def close(self):
+        """
+        Close the SQLite connection
+        """
+        with self.lock:
+            self.connection.close()
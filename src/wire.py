@@ -0,0 +1,312 @@
+import itertools
+import json
+import os
+import re
+import struct
+import zlib
+from typing import OrderedDict
+
+# Media type of the binary block format, offered to neighbours next to JSON and NDJSON
+BLOCKS_MIMETYPE = 'application/x-chainalchemy-blocks'
+# zlib level block streams are compressed with, 0 sends them uncompressed.
+# Signatures are random bytes that don't compress, so it is off unless blocks carry large extra fields.
+WIRE_COMPRESSION_LEVEL = int(os.environ.get('WIRE_COMPRESSION_LEVEL', 0))
+
+# Start of every block stream, followed by a flags byte
+MAGIC = b'CAB1'
+FLAG_ZLIB = 1
+
+# record type, payload length
+RECORD = struct.Struct('<BI')
+# Address added to the dictionary, as UTF-8 or as the bytes of a lowercase hex address
+RECORD_ADDRESS = 1
+RECORD_HEX_ADDRESS = 2
+# Block in fixed-width records, or as JSON when it is missing fields the records need
+RECORD_BLOCK = 3
+RECORD_JSON_BLOCK = 4
+
+# block_number, timestamp, nonce, previous hash, transaction count, extra length
+BLOCK = struct.Struct('<Qdq32sII')
+# sender id, recipient id, value kind, packed value, signature length, extra length
+TRANSACTION = struct.Struct('<IIB8sHI')
+
+VALUE_FLOAT = 0
+VALUE_INT = 1
+VALUE_EXTRA = 2
+
+BLOCK_FIELDS = ('block_number', 'timestamp', 'transactions', 'nonce', 'previous_hash')
+TRANSACTION_FIELDS = ('sender_address', 'recipient_address', 'value', 'signature')
+HASH_PATTERN = re.compile('[0-9a-f]{64}')
+HEX_PATTERN = re.compile('(?:[0-9a-f]{2})+')
+INT64_RANGE = range(-2**63, 2**63)
+UINT64_RANGE = range(2**64)
+SIGNATURE_LIMIT = 2**16
+
+
+class BlockEncoder:
+    """
+    Encoder of a stream of blocks into length-prefixed records.
+    Every address is sent once, the first time it appears, and referenced by its index in the
+    address dictionary afterwards. Hex addresses, hashes and signatures are sent as raw bytes,
+    and any field that doesn't fit the fixed records is kept as JSON next to them.
+    """
+
+    def __init__(self):
+
+        self.address_ids = {}
+
+    def record(self, record_type, payload):
+        return RECORD.pack(record_type, len(payload)) + payload
+
+    def address_id(self, address, records):
+        """
+        Index of an address in the dictionary, adding a record for it if it is new
+        """
+        address_id = self.address_ids.get(address)
+        if address_id is None:
+            address_id = len(self.address_ids)
+            self.address_ids[address] = address_id
+            if HEX_PATTERN.fullmatch(address):
+                records.append(self.record(RECORD_HEX_ADDRESS, bytes.fromhex(address)))
+            else:
+                records.append(self.record(RECORD_ADDRESS, address.encode()))
+        return address_id
+
+    def encodable(self, block):
+        """
+        Check that a block has every field of the fixed records
+        """
+        return (isinstance(block, dict)
+                and all(field in block for field in BLOCK_FIELDS)
+                and isinstance(block['transactions'], list)
+                and all(isinstance(transaction, dict)
+                        and isinstance(transaction.get('sender_address'), str)
+                        and isinstance(transaction.get('recipient_address'), str)
+                        and 'value' in transaction
+                        for transaction in block['transactions']))
+
+    def encode_transaction(self, transaction, records):
+        """
+        Pack a transaction into a fixed-width record followed by its signature and extra fields
+        """
+        extra = {key: value for key, value in transaction.items() if key not in TRANSACTION_FIELDS}
+
+        value = transaction['value']
+        if type(value) is float:
+            value_kind, packed_value = VALUE_FLOAT, struct.pack('<d', value)
+        elif type(value) is int and value in INT64_RANGE:
+            value_kind, packed_value = VALUE_INT, struct.pack('<q', value)
+        else:
+            value_kind, packed_value = VALUE_EXTRA, bytes(8)
+            extra['value'] = value
+
+        signature = transaction.get('signature', None)
+        if isinstance(signature, str) and HEX_PATTERN.fullmatch(signature) and len(signature) < 2 * SIGNATURE_LIMIT:
+            signature = bytes.fromhex(signature)
+        else:
+            if 'signature' in transaction:
+                extra['signature'] = signature
+            signature = b''
+
+        encoded_extra = json.dumps(extra).encode() if extra else b''
+        return TRANSACTION.pack(
+            self.address_id(transaction['sender_address'], records),
+            self.address_id(transaction['recipient_address'], records),
+            value_kind, packed_value, len(signature), len(encoded_extra)) + signature + encoded_extra
+
+    def encode(self, block):
+        """
+        Records of a block, preceded by the records of the addresses it introduces
+        """
+        if not self.encodable(block):
+            return self.record(RECORD_JSON_BLOCK, json.dumps(block).encode())
+
+        records = []
+        extra = {key: value for key, value in block.items() if key not in BLOCK_FIELDS}
+
+        # Fields that don't fit their fixed-width slot are kept as JSON instead
+        block_number = block['block_number']
+        if type(block_number) is not int or block_number not in UINT64_RANGE:
+            extra['block_number'] = block_number
+            block_number = 0
+
+        timestamp = block['timestamp']
+        if type(timestamp) is not float:
+            extra['timestamp'] = timestamp
+            timestamp = 0.0
+
+        nonce = block['nonce']
+        if type(nonce) is not int or nonce not in INT64_RANGE:
+            extra['nonce'] = nonce
+            nonce = 0
+
+        previous_hash = block['previous_hash']
+        if isinstance(previous_hash, str) and HASH_PATTERN.fullmatch(previous_hash):
+            previous_hash = bytes.fromhex(previous_hash)
+        else:
+            extra['previous_hash'] = previous_hash
+            previous_hash = bytes(32)
+
+        transactions = b''.join(self.encode_transaction(transaction, records) for transaction in block['transactions'])
+        encoded_extra = json.dumps(extra).encode() if extra else b''
+        payload = BLOCK.pack(
+            block_number, timestamp, nonce, previous_hash, len(block['transactions']),
+            len(encoded_extra)) + encoded_extra + transactions
+
+        records.append(self.record(RECORD_BLOCK, payload))
+        return b''.join(records)
+
+
+class BlockDecoder:
+    """
+    Decoder of the records written by BlockEncoder, fed with the bytes of a stream as they arrive
+    """
+
+    def __init__(self):
+
+        self.addresses = []
+        self.buffer = bytearray()
+
+    def decode_transaction(self, payload, offset):
+        """
+        Unpack the transaction record at an offset of a block payload, returns it and the offset after it
+        """
+        sender_id, recipient_id, value_kind, packed_value, signature_length, extra_length = \
+            TRANSACTION.unpack_from(payload, offset)
+        offset += TRANSACTION.size
+
+        if value_kind == VALUE_FLOAT:
+            value = struct.unpack('<d', packed_value)[0]
+        elif value_kind == VALUE_INT:
+            value = struct.unpack('<q', packed_value)[0]
+        else:
+            value = None
+
+        transaction = OrderedDict({
+            'sender_address': self.addresses[sender_id],
+            'recipient_address': self.addresses[recipient_id],
+            'value': value
+        })
+        signature = payload[offset:offset + signature_length].hex()
+        offset += signature_length
+        # The signature is added last, after the sequence number, as it was when the transaction was created
+        if extra_length:
+            transaction.update(json.loads(payload[offset:offset + extra_length]))
+            offset += extra_length
+        if signature_length:
+            transaction['signature'] = signature
+        return transaction, offset
+
+    def decode_block(self, payload):
+        """
+        Unpack a block record
+        """
+        block_number, timestamp, nonce, previous_hash, transaction_count, extra_length = BLOCK.unpack_from(payload)
+        offset = BLOCK.size
+        extra = json.loads(payload[offset:offset + extra_length]) if extra_length else {}
+        offset += extra_length
+
+        transactions = []
+        for _ in range(transaction_count):
+            transaction, offset = self.decode_transaction(payload, offset)
+            transactions.append(transaction)
+
+        if offset != len(payload):
+            raise ValueError('Block record has trailing bytes')
+
+        block = {
+            'block_number': block_number,
+            'timestamp': timestamp,
+            'transactions': transactions,
+            'nonce': nonce,
+            'previous_hash': previous_hash.hex()
+        }
+        block.update(extra)
+        return block
+
+    def feed(self, data):
+        """
+        Add bytes of the stream, yields the blocks they complete
+        """
+        self.buffer += data
+
+        offset = 0
+        while len(self.buffer) - offset >= RECORD.size:
+            record_type, length = RECORD.unpack_from(self.buffer, offset)
+            start = offset + RECORD.size
+            if len(self.buffer) - start < length:
+                break
+
+            payload = bytes(self.buffer[start:start + length])
+            offset = start + length
+
+            if record_type == RECORD_ADDRESS:
+                self.addresses.append(payload.decode())
+            elif record_type == RECORD_HEX_ADDRESS:
+                self.addresses.append(payload.hex())
+            elif record_type == RECORD_BLOCK:
+                yield self.decode_block(payload)
+            elif record_type == RECORD_JSON_BLOCK:
+                yield json.loads(payload)
+            else:
+                raise ValueError(f'Unknown record type {record_type}')
+
+        del self.buffer[:offset]
+
+    def close(self):
+        """
+        Check that the stream didn't stop in the middle of a record
+        """
+        if self.buffer:
+            raise ValueError('Block stream ends in the middle of a record')
+
+
+def encode_blocks(blocks, level=WIRE_COMPRESSION_LEVEL):
+    """
+    Encode blocks as a binary stream, yielding its bytes as each block is encoded.
+    The stream is compressed with zlib unless level is 0.
+    """
+    encoder = BlockEncoder()
+    compressor = zlib.compressobj(level) if level else None
+    yield MAGIC + bytes([FLAG_ZLIB if compressor else 0])
+
+    for block in blocks:
+        records = encoder.encode(block)
+        if compressor:
+            records = compressor.compress(records)
+        if records:
+            yield records
+
+    if compressor:
+        yield compressor.flush()
+
+
+def decode_blocks(chunks):
+    """
+    Decode a binary stream written by encode_blocks from an iterable of byte chunks,
+    yielding each block as soon as its bytes arrived
+    """
+    decoder = BlockDecoder()
+    chunks = iter(chunks)
+    header = b''
+    for chunk in chunks:
+        header += chunk
+        if len(header) > len(MAGIC):
+            break
+
+    if len(header) <= len(MAGIC) or not header.startswith(MAGIC):
+        raise ValueError('Not a block stream')
+
+    flags = header[len(MAGIC)]
+    decompressor = zlib.decompressobj() if flags & FLAG_ZLIB else None
+
+    for chunk in itertools.chain([header[len(MAGIC) + 1:]], chunks):
+        if decompressor:
+            chunk = decompressor.decompress(chunk)
+        yield from decoder.feed(chunk)
+
+    if decompressor:
+        if not decompressor.eof:
+            raise ValueError('Block stream is truncated')
+        yield from decoder.feed(decompressor.flush())
+    decoder.close()
@@ -0,0 +1,45 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.addresses import AddressRegistry  # noqa: E402
+
+
+class TestAddressRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = AddressRegistry()
+
+    def test_intern(self):
+        sender_id = self.registry.intern('sender_address')
+        recipient_id = self.registry.intern('recipient_address')
+
+        self.assertEqual((sender_id, recipient_id), (0, 1))
+        self.assertEqual(self.registry.intern('sender_address'), sender_id)
+        self.assertEqual(len(self.registry), 2)
+        self.assertIn('recipient_address', self.registry)
+
+    def test_lookup(self):
+        self.assertIsNone(self.registry.lookup('sender_address'))
+        # Looking an address up doesn't register it
+        self.assertEqual(len(self.registry), 0)
+
+        address_id = self.registry.intern('sender_address')
+        self.assertEqual(self.registry.lookup('sender_address'), address_id)
+        self.assertEqual(self.registry.address(address_id), 'sender_address')
+
+    def test_canonical(self):
+        address = ''.join(['sender', '_address'])
+        copy = ''.join(['sender', '_address'])
+        self.assertIsNot(address, copy)
+
+        self.assertIs(self.registry.canonical(address), address)
+        self.assertIs(self.registry.canonical(copy), address)
+
+
+if __name__ == '__main__':
+    unittest.main()
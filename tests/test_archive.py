@@ -0,0 +1,133 @@
+import copy
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.archive import ArchivedChain, BlockArchive  # noqa: E402
+from src.blockchain import Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+
+
+class TestBlockArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.archive = BlockArchive(os.path.join(self.directory.name, 'chain'), hot_blocks=2)
+
+    def tearDown(self):
+        self.archive.close()
+        self.directory.cleanup()
+
+    def build_blockchain(self, blocks, archive=None):
+        blockchain = Blockchain(archive=archive)
+        for index in range(blocks):
+            blockchain.submit_transaction(MINING_SENDER, None, f'miner_{index % 3}', MINING_REWARD)
+            blockchain.submit_transaction(MINING_SENDER, None, 'address', index)
+            blockchain.create_block(nonce=index, previous_hash=blockchain.block_hashes[-1])
+        return blockchain
+
+    def test_blocks_round_trip(self):
+        blockchain = self.build_blockchain(blocks=3)
+        # Fields that don't fit the fixed records
+        blockchain.chain[1]['extra_field'] = 'extra'
+        blockchain.chain[2]['transactions'][0]['signature'] = 'abcd'
+        blockchain.chain[2]['transactions'][1]['value'] = '12'
+        blockchain.chain[3]['nonce'] = 2**70
+
+        self.assertEqual(self.archive.append_blocks(blockchain.chain), 4)
+
+        for index, block in enumerate(blockchain.chain):
+            archived_block = self.archive.read_block(index)
+            self.assertEqual(archived_block, block)
+            self.assertEqual(blockchain.hash(archived_block), blockchain.hash(block))
+
+    def test_archive_path_used_once(self):
+        blockchain = self.build_blockchain(blocks=3)
+        self.archive.append_blocks(blockchain.chain)
+
+        # A second archive on the same path would empty the files the first one maps
+        with self.assertRaises(RuntimeError):
+            BlockArchive(self.archive.path, hot_blocks=2)
+        self.assertEqual([self.archive.read_block(index) for index in range(4)], blockchain.chain)
+
+        # The path is free again once the first archive is closed
+        self.archive.close()
+        self.archive = BlockArchive(self.archive.path, hot_blocks=2)
+        self.assertEqual(len(self.archive), 0)
+
+    def test_archiving_stops_at_block_missing_fields(self):
+        blockchain = self.build_blockchain(blocks=3)
+        del blockchain.chain[2]['transactions'][0]['sender_address']
+
+        self.assertEqual(self.archive.append_blocks(blockchain.chain), 2)
+
+    def test_archived_chain(self):
+        blockchain = self.build_blockchain(blocks=9)
+        chain = ArchivedChain(self.archive, blockchain.chain)
+
+        # Only the most recent blocks stay in memory
+        self.assertEqual(len(chain), 10)
+        self.assertEqual(len(self.archive), 8)
+        self.assertEqual(chain, blockchain.chain)
+        self.assertEqual(chain[-1], blockchain.chain[-1])
+        self.assertEqual(chain[3:5], blockchain.chain[3:5])
+        with self.assertRaises(IndexError):
+            chain[10]
+
+        # Cutting into the archive brings the blocks before the cut back in memory
+        del chain[5:]
+        self.assertEqual(chain, blockchain.chain[:5])
+        self.assertEqual(len(self.archive), 3)
+        with self.assertRaises(ValueError):
+            del chain[1]
+
+    def test_blockchain_with_archive(self):
+        blockchain = self.build_blockchain(blocks=9, archive=self.archive)
+
+        self.assertIs(blockchain.chain.archive, self.archive)
+        self.assertGreater(len(self.archive), 0)
+        # Archived blocks decode to exactly what was hashed when they were created
+        self.assertEqual(blockchain.block_hashes, [blockchain.hash(block) for block in blockchain.chain])
+        self.assertEqual(blockchain.balances, blockchain.build_balances(blockchain.chain))
+
+        # Splicing into archived history keeps the chain and its indexes consistent
+        blocks = [copy.deepcopy(block) for block in blockchain.chain[4:6]]
+        blockchain.splice_chain(2, blocks)
+        self.assertEqual(len(blockchain.chain), 4)
+        rebuilt_balances = blockchain.build_balances(blockchain.chain)
+        for address_id in set(blockchain.balances) | set(rebuilt_balances):
+            self.assertEqual(blockchain.balances.get(address_id, 0.0), rebuilt_balances.get(address_id, 0.0))
+        self.assertEqual(blockchain.block_hashes, [blockchain.hash(block) for block in blockchain.chain])
+        blockchain.chain.archive.close()
+
+    def test_replaced_chain_keeps_streams_consistent(self):
+        blockchain = self.build_blockchain(blocks=9, archive=self.archive)
+        old_chain, old_blocks = blockchain.chain, list(blockchain.chain)
+
+        # Splicing past the archived blocks shares the archive with the old chain
+        blockchain.splice_chain(9, [copy.deepcopy(old_blocks[9])])
+        self.assertIs(blockchain.chain.archive, self.archive)
+        self.assertEqual(old_chain, old_blocks)
+
+        # Splicing into archived history and replacing the chain archive their blocks in new files
+        blockchain.splice_chain(2, [copy.deepcopy(block) for block in old_blocks[2:9]])
+        spliced_chain, spliced_blocks = blockchain.chain, list(blockchain.chain)
+        self.assertIsNot(spliced_chain.archive, self.archive)
+        self.assertFalse(os.path.exists(self.archive.files['headers'].name))
+
+        blockchain.replace_chain(chain=[copy.deepcopy(block) for block in old_blocks])
+        self.assertEqual(blockchain.chain.archive.generation, 2)
+        self.assertEqual(blockchain.chain, old_blocks)
+
+        # The old chains still read as they were, from the removed files
+        self.assertEqual(old_chain, old_blocks)
+        self.assertEqual(spliced_chain, spliced_blocks)
+        blockchain.chain.archive.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+import aiohttp  # noqa: E402
+
+from src.app.asgi import AsyncApp  # noqa: E402
+from src.blockchain import NDJSON_MIMETYPE, Blockchain  # noqa: E402
+from tests.test_consensus import StandInPeer, mine_blocks  # noqa: E402
+
+
+def call(app, method, path, query='', headers=(), body=b''):
+    """
+    Send one HTTP request to an ASGI app, returns the status, the headers and the body of its response
+    """
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': method,
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000)
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        try:
+            await app(scope, receive, send)
+        finally:
+            await app.close()
+
+    asyncio.run(run())
+
+    start = sent[0]
+    headers = {name.decode(): value.decode() for name, value in start['headers']}
+    # The last message ends the response
+    assert not sent[-1].get('more_body', False)
+    return start['status'], headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+class TestAsyncApp(unittest.TestCase):
+
+    def setUp(self):
+        self.app = AsyncApp(workers=4)
+        self.blockchain = Blockchain()
+        patcher = patch('src.app.routes.blockchain', self.blockchain)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.peers = []
+
+    def tearDown(self):
+        for peer in self.peers:
+            peer.close()
+        self.app.executor.shutdown()
+
+    def test_flask_routes(self):
+        status, headers, body = call(self.app, 'GET', '/')
+        self.assertEqual(status, 200)
+        self.assertIn(b'Welcome to Flask!', body)
+
+        status, _, body = call(self.app, 'POST', '/nodes/register', headers=[('Content-Type', 'application/json')],
+                               body=json.dumps({'nodes': ['http://127.0.0.1:5001']}).encode())
+        self.assertEqual(status, 201)
+        self.assertEqual(json.loads(body)['total_nodes'], ['127.0.0.1:5001'])
+
+        status, _, _ = call(self.app, 'GET', '/mine/status/unknown')
+        self.assertEqual(status, 404)
+
+    def test_streamed_chain(self):
+        mine_blocks(self.blockchain, 3)
+
+        status, headers, body = call(self.app, 'GET', '/chain', query='from=2',
+                                     headers=[('Accept', NDJSON_MIMETYPE)])
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['content-type'], NDJSON_MIMETYPE)
+        self.assertEqual(headers['x-chain-length'], '4')
+        self.assertEqual([json.loads(line) for line in body.splitlines()], self.blockchain.chain[1:])
+
+    def test_resolve_on_event_loop(self):
+        peer_chain = Blockchain()
+        mine_blocks(peer_chain, 3)
+        peers = [StandInPeer(peer_chain), StandInPeer(Blockchain())]
+        self.peers.extend(peers)
+        for peer in peers:
+            self.blockchain.register_node(peer.node)
+
+        with patch.object(Blockchain, 'resolve_conflicts') as resolve_conflicts:
+            status, _, body = call(self.app, 'GET', '/nodes/resolve')
+
+        # The Flask view reused the outcome of the async consensus
+        resolve_conflicts.assert_not_called()
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)['message'], 'Our chain was replaced')
+        self.assertEqual(json.loads(body)['new_chain'], peer_chain.chain)
+        self.assertEqual(self.blockchain.chain, peer_chain.chain)
+
+        # Our chain is now as long as any of our neighbours'
+        status, _, body = call(self.app, 'GET', '/nodes/resolve')
+        self.assertEqual(json.loads(body)['message'], 'Our chain is authoritative')
+
+    def test_async_consensus_ignores_unreachable_neighbours(self):
+        peer_chain = Blockchain()
+        mine_blocks(peer_chain, 2)
+        peer = StandInPeer(peer_chain)
+        self.peers.append(peer)
+        self.blockchain.register_node(peer.node)
+        self.blockchain.register_node('127.0.0.1:1')
+
+        async def resolve():
+            async with aiohttp.ClientSession() as session:
+                return await self.blockchain.resolve_conflicts_async(session, ThreadPoolExecutor(max_workers=2))
+
+        self.assertTrue(asyncio.run(resolve()))
+        self.assertEqual(self.blockchain.chain, peer_chain.chain)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,18 +1,23 @@
 import os
 import sys
+import threading
+import time
 import unittest
+import unittest.mock
 import binascii
+import copy
 from uuid import uuid4
 from Crypto.PublicKey import RSA
-import requests
-
-from src.blockchain import MINING_REWARD, Blockchain, MINING_SENDER  # Assuming you save your class in a file called blockchain.py
-
 
 sys.path.insert(0, os.path.abspath(
     # to solve import issues in src
     os.path.join(os.path.dirname(__file__), '../src')))
 
+from src.blockchain import (  # noqa: E402
+    MINING_REWARD, Blockchain, DuplicateTransaction, MINING_SENDER, PoolFull, SENDER_LOCK_STRIPES, SequenceGap,
+    difficulty_target, transaction_message)
+from src.keys import KEY_SCHEMES  # noqa: E402
+
 class TestBlockchain(unittest.TestCase):
 
     def setUp(self):
@@ -74,12 +79,134 @@ class TestBlockchain(unittest.TestCase):
             self.sender_address, self.sender_private_key, self.recipient_address, 100)
         self.assertEqual(block_index, 2)
 
+        # Another payment of the same amount gets the next sequence number
+        self.blockchain.submit_transaction(
+            self.sender_address, self.sender_private_key, self.recipient_address, 100)
+        self.assertEqual([transaction['sequence'] for transaction in self.blockchain.transactions], [1, 2])
+        self.assertEqual(self.blockchain.next_sequence(self.sender_address), 3)
+
+        # A sequence number its sender already used is refused, whether pending or mined, and so is a gap
+        with self.assertRaises(DuplicateTransaction):
+            self.blockchain.submit_transaction(
+                self.sender_address, self.sender_private_key, self.recipient_address, 50, sequence=2)
+        with self.assertRaises(SequenceGap):
+            self.blockchain.submit_transaction(
+                self.sender_address, self.sender_private_key, self.recipient_address, 50, sequence=4)
+        self.blockchain.create_block(nonce=1, previous_hash='abcd')
+        with self.assertRaises(DuplicateTransaction):
+            self.blockchain.submit_transaction(
+                self.sender_address, self.sender_private_key, self.recipient_address, 100, sequence=2)
+        self.assertEqual(len(self.blockchain.transactions), 0)
+        self.assertEqual(self.blockchain.sequences, {self.blockchain.addresses.lookup(self.sender_address): 2})
+
+        # Sequence numbers are per sender, mining rewards have none
+        self.assertEqual(self.blockchain.next_sequence(self.recipient_address), 1)
+        self.assertEqual(self.blockchain.submit_transaction(MINING_SENDER, None, self.sender_address, 100), 3)
+        self.assertNotIn('sequence', next(iter(self.blockchain.transactions)))
+
+    def test_submit_presigned_transaction(self):
+        transaction = self.blockchain.create_transaction(self.sender_address, self.recipient_address, 100, 1)
+        signature = self.blockchain.sign_transaction(self.sender_private_key, transaction)
+
+        # Clients that sign themselves only send the signature and the sequence number they signed, which are verified
+        block_index = self.blockchain.submit_transaction(
+            self.sender_address, None, self.recipient_address, 100, signature=signature, sequence=1)
+        self.assertEqual(block_index, 2)
+
+        # The signature doesn't cover another amount or sequence number
+        self.assertFalse(self.blockchain.submit_transaction(
+            self.sender_address, None, self.recipient_address, 200, signature=signature, sequence=2))
+        self.assertFalse(self.blockchain.submit_transaction(
+            self.sender_address, None, self.recipient_address, 100, signature=signature, sequence=2))
+        self.assertEqual(len(self.blockchain.transactions), 1)
+
+    def test_transaction_message(self):
+        transaction = self.blockchain.create_transaction(self.sender_address, self.recipient_address, 100, 1)
+        self.assertEqual(transaction_message(transaction), (
+            '{"recipient_address":"%s","sender_address":"%s","sequence":1,"value":100}'
+            % (self.recipient_address, self.sender_address)).encode())
+
+    def test_submit_transaction_with_another_wallet_key(self):
+        # The node skips verifying its own signature, but still refuses to sign for another wallet
+        other_private_key = binascii.hexlify(RSA.generate(1024).exportKey(format='DER')).decode('ascii')
+        with unittest.mock.patch.object(self.blockchain, 'verify_transaction_signature') as mock_verify:
+            self.assertFalse(self.blockchain.submit_transaction(
+                self.sender_address, other_private_key, self.recipient_address, 100))
+            self.assertEqual(self.blockchain.submit_transaction(
+                self.sender_address, self.sender_private_key, self.recipient_address, 100), 2)
+            mock_verify.assert_not_called()
+        self.assertEqual(len(self.blockchain.transactions), 1)
+
+    def test_ed25519_transactions(self):
+        public_key, private_key = KEY_SCHEMES['ed25519'].generate()
+
+        self.assertEqual(self.blockchain.submit_transaction(public_key, private_key, self.sender_address, 100), 2)
+        previous_hash = self.blockchain.hash(self.blockchain.chain[-1])
+        nonce = self.blockchain.proof_of_work()
+        self.blockchain.submit_transaction(MINING_SENDER, None, public_key, MINING_REWARD)
+        self.blockchain.create_block(nonce=nonce, previous_hash=previous_hash)
+
+        # Chains mixing RSA and Ed25519 wallets validate on a node that never saw their transactions
+        self.assertTrue(Blockchain().valid_chain(self.blockchain.chain))
+
     def test_submit_invalid_transaction(self):
         # Invalid transaction (wrong signature)
         with self.assertRaises(ValueError):
             self.blockchain.submit_transaction(
                 self.sender_address, 'invalid_private_key', self.recipient_address, 100)
 
+    def test_sign_transactions(self):
+        signature = self.blockchain.sign_transaction(
+            self.sender_private_key,
+            self.blockchain.create_transaction(self.sender_address, self.recipient_address, 4.0, 4))
+        batch = [
+            (self.sender_address, self.sender_private_key, self.recipient_address, 1.0, None, None),
+            (self.sender_address, 'invalid_private_key', self.recipient_address, 2.0, None, None),
+            (MINING_SENDER, None, self.recipient_address, MINING_REWARD, None, None),
+            (self.sender_address, self.sender_private_key, self.recipient_address, 3.0, None, None),
+            (self.sender_address, None, self.recipient_address, 4.0, signature, 4),
+            (self.sender_address, None, self.recipient_address, 5.0, signature, 4),
+        ]
+
+        # Inline and on a pool of worker processes, bad keys only reject their own transaction
+        for workers in (1, 2):
+            transactions = self.blockchain.sign_transactions(batch, workers=workers)
+            self.assertEqual([transaction and transaction['value'] for transaction in transactions],
+                             [1.0, None, MINING_REWARD, 3.0, 4.0, None])
+            # The node numbers the sender's transfers one after the other
+            self.assertEqual([transaction and transaction.get('sequence') for transaction in transactions],
+                             [1, None, None, 3, 4, None])
+
+        # Nothing was added to the pool
+        self.assertEqual(len(self.blockchain.transactions), 0)
+        self.blockchain.signing_pool.shutdown()
+
+    def test_concurrent_batches_start_one_signing_pool(self):
+        batch = [(self.sender_address, self.sender_private_key, self.recipient_address, value, None, None)
+                 for value in (1.0, 2.0)]
+        started = threading.Barrier(4)
+
+        def sign_batch():
+            started.wait()
+            self.blockchain.sign_transactions(batch, workers=2)
+
+        pool = unittest.mock.Mock()
+        pool.map.side_effect = lambda function, *arguments, **options: ['signature' for _ in arguments[0]]
+
+        def start_pool(max_workers):
+            # Starting processes takes a while, long enough for the other batches to get there
+            time.sleep(0.05)
+            return pool
+
+        with unittest.mock.patch('src.blockchain.ProcessPoolExecutor', side_effect=start_pool) as executor:
+            threads = [threading.Thread(target=sign_batch) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        executor.assert_called_once_with(max_workers=2)
+
     def test_get_balance(self):
         # Mining reward, expect no reduction in balance for the mining sender
         self.blockchain.submit_transaction(
@@ -89,6 +216,25 @@ class TestBlockchain(unittest.TestCase):
         balance = self.blockchain.get_balance(self.recipient_address)
         self.assertEqual(balance, MINING_REWARD)
 
+    def test_get_balance_across_blocks(self):
+        # Reward the sender twice, then spend part of it in a later block
+        for _ in range(2):
+            self.blockchain.submit_transaction(
+                MINING_SENDER, None, self.sender_address, MINING_REWARD)
+            self.blockchain.create_block(nonce=1, previous_hash='abcd')
+
+        self.blockchain.submit_transaction(
+            self.sender_address, self.sender_private_key, self.recipient_address, 0.5)
+        self.blockchain.create_block(nonce=2, previous_hash='abcd')
+
+        self.assertEqual(self.blockchain.get_balance(self.sender_address), 2 * MINING_REWARD - 0.5)
+        self.assertEqual(self.blockchain.get_balance(self.recipient_address), 0.5)
+        self.assertEqual(self.blockchain.get_balance('unknown_address'), 0.0)
+
+        # The incremental index must match a full rebuild from the chain
+        self.assertEqual(self.blockchain.balances,
+                         self.blockchain.build_balances(self.blockchain.chain))
+
     def test_get_available_balance(self):
         # Submit a mining reward transaction (add it to pending transactions)
         self.blockchain.submit_transaction(
@@ -114,6 +260,112 @@ class TestBlockchain(unittest.TestCase):
         self.assertEqual(available_balance, confirmed_balance + 50)
 
 
+    def test_pending_totals(self):
+        # Pending debits and credits are tracked as transactions enter the pool
+        self.blockchain.submit_transaction(
+            self.sender_address, self.sender_private_key, self.recipient_address, 30)
+        self.blockchain.submit_transaction(
+            self.sender_address, self.sender_private_key, self.recipient_address, 20)
+
+        sender_id = self.blockchain.addresses.lookup(self.sender_address)
+        recipient_id = self.blockchain.addresses.lookup(self.recipient_address)
+        self.assertEqual(self.blockchain.transactions.debits[sender_id], 50)
+        self.assertEqual(self.blockchain.transactions.credits[recipient_id], 50)
+        self.assertEqual(self.blockchain.get_available_balance(self.sender_address), -50)
+
+        # Mining the pool clears the pending totals and moves them to the confirmed balances
+        self.blockchain.create_block(nonce=1, previous_hash='abcd')
+
+        self.assertEqual(self.blockchain.transactions.debits, {})
+        self.assertEqual(self.blockchain.transactions.credits, {})
+        self.assertEqual(self.blockchain.get_available_balance(self.sender_address), -50)
+        self.assertEqual(self.blockchain.get_available_balance(self.recipient_address), 50)
+
+    def test_replayed_transaction_pooled_once(self):
+        transaction = self.blockchain.create_transaction(MINING_SENDER, self.recipient_address, 5.0)
+        self.assertTrue(self.blockchain.add_pending_transaction(transaction))
+        self.assertFalse(self.blockchain.add_pending_transaction(dict(transaction)))
+
+        self.assertEqual(len(self.blockchain.transactions), 1)
+        self.assertEqual(self.blockchain.get_available_balance(self.recipient_address), 5.0)
+
+        # Once mined, the same transaction can be pooled again
+        self.blockchain.create_block(nonce=1, previous_hash='abcd')
+        self.assertTrue(self.blockchain.add_pending_transaction(dict(transaction)))
+
+    def test_sender_locks_are_striped(self):
+        for index in range(2 * SENDER_LOCK_STRIPES):
+            with self.blockchain.sender_lock(f'address_{index}'):
+                pass
+
+        # However many senders come by, the locks stay the same
+        self.assertEqual(len(self.blockchain.sender_locks), SENDER_LOCK_STRIPES)
+        with self.blockchain.sender_lock('address_0'):
+            self.assertTrue(self.blockchain.sender_locks[hash('address_0') % SENDER_LOCK_STRIPES].locked())
+
+    def test_full_pool_refuses_transactions(self):
+        self.blockchain.transactions.max_size = 2
+        # A spend relying on a pending credit
+        self.blockchain.submit_transaction(MINING_SENDER, None, self.sender_address, 10.0)
+        self.blockchain.submit_transaction(self.sender_address, self.sender_private_key, self.recipient_address, 10.0)
+
+        # The credit isn't evicted to make room, the new transaction is refused
+        with self.assertRaises(PoolFull):
+            self.blockchain.submit_transaction(MINING_SENDER, None, self.recipient_address, 1.0)
+        self.assertEqual([pending['value'] for pending in self.blockchain.transactions], [10.0, 10.0])
+
+        self.blockchain.create_block(nonce=1, previous_hash='abcd')
+        self.assertEqual(self.blockchain.get_balance(self.sender_address), 0.0)
+        self.assertEqual(self.blockchain.submit_transaction(MINING_SENDER, None, self.recipient_address, 1.0), 3)
+
+    def test_block_takes_oldest_transactions(self):
+        for value in (1.0, 2.0, 3.0):
+            self.blockchain.submit_transaction(MINING_SENDER, None, self.recipient_address, value)
+
+        with unittest.mock.patch('src.blockchain.MAX_BLOCK_TRANSACTIONS', 2):
+            transactions = self.blockchain.block_transactions()
+            # By default the proof of work covers the transactions the next block takes
+            nonce = self.blockchain.proof_of_work()
+
+        reward = self.blockchain.create_transaction(MINING_SENDER, 'miner_address', MINING_REWARD)
+        block = self.blockchain.create_block(
+            nonce=nonce, previous_hash=self.blockchain.hash(self.blockchain.chain[-1]), transactions=transactions + [reward])
+
+        self.assertEqual([transaction['value'] for transaction in block['transactions']], [1.0, 2.0, MINING_REWARD])
+        self.assertEqual([pending['value'] for pending in self.blockchain.transactions], [3.0])
+        self.assertTrue(self.blockchain.valid_chain(self.blockchain.chain))
+        self.assertEqual(self.blockchain.get_available_balance(self.recipient_address), 6.0)
+
+    def test_pending_transactions_by_address(self):
+        self.blockchain.submit_transaction(MINING_SENDER, None, self.sender_address, 10.0)
+        self.blockchain.submit_transaction(
+            self.sender_address, self.sender_private_key, self.recipient_address, 4.0)
+        self.blockchain.submit_transaction(MINING_SENDER, None, 'other_address', 1.0)
+
+        self.assertEqual([pending['value'] for pending in self.blockchain.pending_transactions(self.sender_address)],
+                         [10.0, 4.0])
+        self.assertEqual(len(self.blockchain.pending_transactions(self.recipient_address)), 1)
+        self.assertEqual(self.blockchain.pending_transactions('unknown_address'), [])
+        self.assertEqual(len(self.blockchain.pending_transactions()), 3)
+
+    def test_address_interning(self):
+        # Addresses decoded from JSON arrive as separate string objects
+        self.blockchain.submit_transaction(MINING_SENDER, None, ''.join(['recipient', '_address']), 1.0)
+        self.blockchain.create_block(nonce=1, previous_hash='abcd')
+        block = {'block_number': 3, 'timestamp': 0.0, 'nonce': 2, 'previous_hash': self.blockchain.block_hashes[-1],
+                 'transactions': [{'sender_address': MINING_SENDER,
+                                   'recipient_address': ''.join(['recipient', '_address']), 'value': 1.0}]}
+        self.blockchain.splice_chain(2, [block])
+
+        # Both transactions share one string, and the index is keyed by its integer id
+        first, second = (block['transactions'][0] for block in self.blockchain.chain[1:])
+        self.assertIs(first['recipient_address'], second['recipient_address'])
+        recipient_id = self.blockchain.addresses.lookup('recipient_address')
+        self.assertIsInstance(recipient_id, int)
+        self.assertEqual(self.blockchain.addresses.address(recipient_id), 'recipient_address')
+        self.assertEqual(self.blockchain.balances[recipient_id], 2.0)
+        self.assertIsNone(self.blockchain.addresses.lookup('unknown_address'))
+
     def test_create_block(self):
         block = self.blockchain.create_block(nonce=12345, previous_hash='abcd')
 
@@ -127,10 +379,59 @@ class TestBlockchain(unittest.TestCase):
         block_hash = self.blockchain.hash(block)
         self.assertEqual(len(block_hash), 64)  # SHA-256 hash length
 
+    def test_block_hash_index(self):
+        block = self.blockchain.create_block(nonce=12345, previous_hash='abcd')
+
+        # Every block's hash is computed once when it's added and reused afterwards
+        self.assertEqual(self.blockchain.block_hashes, [self.blockchain.hash(block) for block in self.blockchain.chain])
+        with unittest.mock.patch.object(self.blockchain, 'hash') as mock_hash:
+            self.assertEqual(self.blockchain.block_hash(block), self.blockchain.block_hashes[-1])
+            self.blockchain.valid_chain(self.blockchain.chain)
+            self.blockchain.chain_summary()
+            mock_hash.assert_not_called()
+
+        # Blocks that aren't part of our chain are hashed
+        other_block = Blockchain().chain[0]
+        self.assertEqual(self.blockchain.block_hash(other_block), self.blockchain.hash(other_block))
+
     def test_proof_of_work(self):
         nonce = self.blockchain.proof_of_work()
         self.assertIsInstance(nonce, int)
 
+    def test_proof_of_work_matches_valid_proof(self):
+        self.blockchain.submit_transaction(
+            self.sender_address, self.sender_private_key, self.recipient_address, 100)
+        last_hash = self.blockchain.hash(self.blockchain.chain[-1])
+
+        nonce = self.blockchain.proof_of_work(workers=1, difficulty=3)
+
+        # The fast path must return the same nonce as a plain valid_proof search
+        expected_nonce = 0
+        while not self.blockchain.valid_proof(self.blockchain.transactions, last_hash, expected_nonce, difficulty=3):
+            expected_nonce += 1
+        self.assertEqual(nonce, expected_nonce)
+
+    def test_difficulty_target(self):
+        # Comparing raw digests against the target agrees with the hex prefix check
+        for difficulty in range(1, 5):
+            target = difficulty_target(difficulty)
+            for digest in (bytes(32), bytes([0, 0, 0x0f]) + bytes(29), bytes([0, 0, 0x10]) + bytes(29), b'\xff' * 32):
+                self.assertEqual(digest < target, digest.hex()[:difficulty] == '0' * difficulty)
+
+        self.assertIsNone(difficulty_target(0))
+
+    def test_parallel_proof_of_work(self):
+        self.blockchain.submit_transaction(
+            self.sender_address, self.sender_private_key, self.recipient_address, 100)
+        last_hash = self.blockchain.hash(self.blockchain.chain[-1])
+
+        # Any nonce found by the worker pool must be accepted by valid_proof
+        nonce = self.blockchain.proof_of_work(workers=2, difficulty=3)
+
+        self.assertIsInstance(nonce, int)
+        self.assertTrue(self.blockchain.valid_proof(
+            self.blockchain.transactions, last_hash, nonce, difficulty=3))
+
     def test_valid_proof(self):
         # Test that valid_proof correctly identifies a valid hash
         last_block = self.blockchain.chain[-1]
@@ -178,6 +479,117 @@ class TestBlockchain(unittest.TestCase):
         self.assertFalse(self.blockchain.valid_chain(self.blockchain.chain))
 
 
+    def test_misnumbered_blocks_are_invalid(self):
+        # Blocks whose number doesn't follow the block they build on, still linked by their hashes
+        for _ in range(2):
+            last_block = self.blockchain.chain[-1]
+            last_block['block_number'] = 1000
+            self.blockchain.block_hashes[-1] = self.blockchain.hash(last_block)
+            self.blockchain.create_block(nonce=self.blockchain.proof_of_work(),
+                                         previous_hash=self.blockchain.block_hashes[-1])
+
+        chain = copy.deepcopy(list(self.blockchain.chain))
+        self.assertFalse(Blockchain().valid_chain(chain))
+        self.assertIsNone(Blockchain().hash_valid_blocks(chain[0], chain[1:2]))
+        self.assertIsNone(Blockchain().hash_valid_blocks(chain[1], chain[2:]))
+
+    def test_signed_transactions_in_chain(self):
+        self.blockchain.submit_transaction(
+            self.sender_address, self.sender_private_key, self.recipient_address, 100)
+        self.assertIn('signature', list(self.blockchain.transactions)[0])
+
+        previous_hash = self.blockchain.hash(self.blockchain.chain[-1])
+        nonce = self.blockchain.proof_of_work()
+        self.blockchain.submit_transaction(MINING_SENDER, None, self.recipient_address, MINING_REWARD)
+        self.blockchain.create_block(nonce=nonce, previous_hash=previous_hash)
+        chain = copy.deepcopy(self.blockchain.chain)
+
+        # The transaction was verified when this node accepted it, so no RSA work is left
+        with unittest.mock.patch('src.blockchain.verify') as mock_verify:
+            self.assertTrue(self.blockchain.valid_chain(chain))
+            mock_verify.assert_not_called()
+
+        # Another node verifies it once, and then remembers it
+        other_blockchain = Blockchain()
+        self.assertTrue(other_blockchain.valid_chain(chain))
+        self.assertTrue(other_blockchain.valid_chain(chain))
+        self.assertEqual(other_blockchain.signatures.stats(), {'hits': 1, 'misses': 1, 'signatures': 1})
+
+        # The proof of work doesn't cover signatures, but a forged or missing one makes the chain invalid
+        forged = other_blockchain.create_transaction(self.sender_address, self.recipient_address, 1)
+        chain[1]['transactions'][0]['signature'] = self.blockchain.sign_transaction(self.sender_private_key, forged)
+        self.assertFalse(other_blockchain.valid_chain(chain))
+        del chain[1]['transactions'][0]['signature']
+        self.assertFalse(other_blockchain.valid_chain(chain))
+
+    def test_replayed_transaction_in_chain(self):
+        self.blockchain.submit_transaction(
+            self.sender_address, self.sender_private_key, self.recipient_address, 100)
+        transfer = list(self.blockchain.transactions)[0]
+        genesis = self.blockchain.chain[0]
+
+        def mine(blockchain, transfers):
+            transactions = copy.deepcopy(transfers)
+            nonce = blockchain.proof_of_work(transactions=transactions)
+            reward = blockchain.create_transaction(MINING_SENDER, self.recipient_address, MINING_REWARD)
+            return blockchain.create_block(nonce, blockchain.block_hashes[-1], transactions=transactions + [reward])
+
+        # A neighbour that forked after the genesis block mined the transfer as well, then replayed it
+        other_blockchain = Blockchain()
+        other_blockchain.replace_chain(copy.deepcopy([genesis]))
+        mine(other_blockchain, [transfer])
+        mine(other_blockchain, [transfer])
+        mine(self.blockchain, [transfer])
+
+        # Our block holding the transfer is past the fork, but the replay isn't valid
+        blocks = copy.deepcopy(list(other_blockchain.chain))
+        genesis_hash = self.blockchain.block_hashes[0]
+        self.assertIsNotNone(self.blockchain.validate_stream(genesis, genesis_hash, iter(blocks[1:2])))
+        self.assertIsNone(self.blockchain.validate_stream(genesis, genesis_hash, iter(blocks[1:])))
+        self.assertFalse(Blockchain().valid_chain(blocks))
+
+        # Nor is a block replaying a transfer of the blocks it builds on, or twice the same transfer in a block
+        mine(self.blockchain, [transfer])
+        base_blockchain = Blockchain()
+        base_blockchain.replace_chain(copy.deepcopy(list(self.blockchain.chain[:2])))
+        self.assertIsNone(base_blockchain.hash_valid_blocks(self.blockchain.chain[1], [self.blockchain.chain[2]]))
+        self.assertFalse(Blockchain().valid_chain(copy.deepcopy(list(self.blockchain.chain))))
+        self.assertFalse(Blockchain().valid_chain([copy.deepcopy(genesis), mine(Blockchain(), [transfer, transfer])]))
+
+        # Nor is a transfer skipping a sequence number
+        skipping = self.blockchain.create_transaction(self.sender_address, self.recipient_address, 100, 3)
+        skipping['signature'] = self.blockchain.sign_transaction(self.sender_private_key, skipping)
+        self.assertFalse(Blockchain().valid_chain([copy.deepcopy(genesis), mine(Blockchain(), [skipping])]))
+
+        # Adopting a chain that confirmed a pending transfer takes it out of the pool
+        pending_blockchain = Blockchain()
+        pending_blockchain.replace_chain(copy.deepcopy([genesis]))
+        pending_blockchain.add_pending_transaction(copy.deepcopy(transfer))
+        pending_blockchain.splice_chain(1, blocks[1:2])
+        self.assertEqual(len(pending_blockchain.transactions), 0)
+        self.assertFalse(pending_blockchain.add_pending_transaction(copy.deepcopy(transfer)))
+
+    def test_splice_chain(self):
+        self.blockchain.submit_transaction(MINING_SENDER, None, self.recipient_address, 5.0)
+        self.blockchain.create_block(nonce=1, previous_hash='abcd')
+        self.blockchain.submit_transaction(MINING_SENDER, None, self.recipient_address, 3.0)
+        self.blockchain.create_block(nonce=2, previous_hash='abcd')
+
+        # Replace the last block with two others
+        other_blockchain = Blockchain()
+        other_blockchain.submit_transaction(MINING_SENDER, None, self.sender_address, 2.0)
+        first_block = other_blockchain.create_block(nonce=3, previous_hash='abcd')
+        second_block = other_blockchain.create_block(nonce=4, previous_hash='abcd')
+
+        self.blockchain.splice_chain(2, [first_block, second_block])
+
+        self.assertEqual(len(self.blockchain.chain), 4)
+        self.assertIs(self.blockchain.chain[-1], second_block)
+        self.assertEqual(self.blockchain.get_balance(self.recipient_address), 5.0)
+        self.assertEqual(self.blockchain.get_balance(self.sender_address), 2.0)
+        self.assertEqual(self.blockchain.balances, self.blockchain.build_balances(self.blockchain.chain))
+        self.assertEqual(self.blockchain.block_hashes, [self.blockchain.hash(block) for block in self.blockchain.chain])
+
     def test_resolve_conflicts(self):
         # Create another blockchain instance with a longer chain
         other_blockchain = Blockchain()
@@ -192,14 +604,18 @@ class TestBlockchain(unittest.TestCase):
         # Simulate adding a node and that node providing the other blockchain
         self.blockchain.nodes.add('localhost:5000')  # Simulate another node
 
-        # Mock the requests.get to simulate returning the longer chain from the other node
-        requests.get = unittest.mock.MagicMock(return_value=unittest.mock.Mock(
-            status_code=200,
-            json=lambda: {
-                'length': len(other_blockchain.chain),
-                'chain': other_blockchain.chain
-            }
-        ))
+        # Mock the session's get to simulate the other node serving its summary and its blocks
+        def get(url, params=None, **kwargs):
+            if url.endswith('/chain/blocks'):
+                blocks = other_blockchain.chain[params['from'] - 1:params['to']]
+                return unittest.mock.MagicMock(status_code=200, headers={'Content-Type': 'application/json'}, json=lambda: {
+                    'blocks': blocks,
+                    'length': len(other_blockchain.chain)
+                })
+
+            return unittest.mock.MagicMock(status_code=200, json=lambda: other_blockchain.chain_summary())
+
+        self.blockchain.session.get = unittest.mock.MagicMock(side_effect=get)
 
         # Now resolve conflicts; our blockchain should adopt the longer valid chain
         conflict_resolved = self.blockchain.resolve_conflicts()
@@ -210,6 +626,10 @@ class TestBlockchain(unittest.TestCase):
         # Assert that our blockchain's chain is now the same as the other blockchain's chain
         self.assertEqual(self.blockchain.chain, other_blockchain.chain)
 
+        # The balance index is rebuilt for the adopted chain
+        for address in other_blockchain.addresses.addresses:
+            self.assertEqual(self.blockchain.get_balance(address), other_blockchain.get_balance(address))
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,166 @@
+import os
+import random
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.blockchain import Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+from src.keys import KEY_SCHEMES  # noqa: E402
+from src.locks import ReadWriteLock  # noqa: E402
+from src.mining import MiningScheduler  # noqa: E402
+
+
+class TestReadWriteLock(unittest.TestCase):
+
+    def test_readers_share_the_lock(self):
+        lock = ReadWriteLock()
+        inside = threading.Barrier(3, timeout=5)
+
+        def reader():
+            with lock.read():
+                # Only returns once all readers are holding the lock together
+                inside.wait()
+
+        threads = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def test_writer_excludes_readers(self):
+        lock = ReadWriteLock()
+        events = []
+
+        with lock.write():
+            reader = threading.Thread(target=lambda: lock.read().__enter__() or events.append('read'))
+            reader.start()
+            time.sleep(0.1)
+            events.append('write')
+        reader.join()
+
+        self.assertEqual(events, ['write', 'read'])
+
+    def test_reentrant(self):
+        lock = ReadWriteLock()
+
+        with lock.write():
+            with lock.write():
+                with lock.read():
+                    pass
+        with lock.read():
+            with lock.read():
+                with self.assertRaises(RuntimeError):
+                    lock.acquire_write()
+
+
+class TestConcurrentBlockchain(unittest.TestCase):
+
+    WALLETS = 8
+    DURATION = 2.0
+
+    def setUp(self):
+        # Switch threads as often as possible to shake out races
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    def check_conservation(self, blockchain):
+        """
+        Every transaction moves value from one address to another, so the balances and the pending
+        totals always add up, and the mining sender's debit matches the rewards it paid
+        """
+        with blockchain.lock.read():
+            self.assertEqual(sum(blockchain.balances.values()), 0)
+            self.assertEqual(sum(blockchain.transactions.debits.values()), sum(blockchain.transactions.credits.values()))
+            self.assertEqual(len(blockchain.chain), len(blockchain.block_hashes))
+            self.assertEqual(blockchain.block_hashes[-1], blockchain.hash(blockchain.chain[-1]))
+
+    def test_submitters_miners_and_readers(self):
+        blockchain = Blockchain()
+        scheduler = MiningScheduler(blockchain)
+        scheme = KEY_SCHEMES['ed25519']
+        wallets = [scheme.generate() for _ in range(self.WALLETS)]
+        for address, _ in wallets:
+            blockchain.submit_transaction(MINING_SENDER, None, address, 100.0)
+        blockchain.create_block(nonce=0, previous_hash=blockchain.block_hashes[-1])
+
+        stop = threading.Event()
+        errors = []
+        rewards = []
+
+        def run(target):
+            def loop():
+                try:
+                    while not stop.is_set():
+                        target()
+                except Exception as error:
+                    errors.append(error)
+                    stop.set()
+            return threading.Thread(target=loop)
+
+        def submit(address, private_key):
+            recipient = random.choice(wallets)[0]
+            amount = float(random.randint(1, 5))
+            with blockchain.sender_lock(address):
+                if blockchain.get_available_balance(address) >= amount:
+                    self.assertTrue(blockchain.submit_transaction(address, private_key, recipient, amount))
+
+        def mine():
+            job = scheduler.submit(miner_address=random.choice(wallets)[0])
+            job.wait(timeout=5)
+            if job.status == 'completed':
+                rewards.append(MINING_REWARD)
+
+        def forge():
+            # Blocks taking the whole pool, without a proof of work, racing the mining jobs
+            blockchain.submit_transaction(MINING_SENDER, None, random.choice(wallets)[0], MINING_REWARD)
+            rewards.append(MINING_REWARD)
+            blockchain.create_block(nonce=0, previous_hash=blockchain.block_hashes[-1])
+            time.sleep(0.01)
+
+        def read():
+            self.check_conservation(blockchain)
+            for address, _ in wallets:
+                # Senders never spend more than they have
+                self.assertGreaterEqual(blockchain.get_available_balance(address), 0)
+            blockchain.chain_summary()
+
+        def resync():
+            # Consensus swapping in the blocks of a chain, here a copy of our own
+            with blockchain.lock.write():
+                chain = list(blockchain.chain)
+                blockchain.splice_chain(len(chain) // 2, chain[len(chain) // 2:])
+            time.sleep(0.05)
+
+        threads = ([run(lambda wallet=wallet: submit(*wallet)) for wallet in wallets]
+                   + [run(mine), run(forge)]
+                   + [run(read) for _ in range(4)]
+                   + [run(resync)])
+        for thread in threads:
+            thread.start()
+        time.sleep(self.DURATION)
+        stop.set()
+        for thread in threads:
+            thread.join(timeout=10)
+
+        self.assertEqual(errors, [])
+        self.assertGreater(len(blockchain.chain), 2)
+        self.check_conservation(blockchain)
+        self.assertEqual(blockchain.balances, blockchain.build_balances(blockchain.chain))
+        self.assertEqual(blockchain.sequences, blockchain.build_sequences(blockchain.chain))
+
+        # Everything the wallets hold came from the mining sender, pending or confirmed
+        total = sum(blockchain.get_available_balance(address) for address, _ in wallets)
+        self.assertEqual(total, -blockchain.get_available_balance(MINING_SENDER))
+        self.assertEqual(total, 100.0 * self.WALLETS + sum(rewards))
+
+
+if __name__ == '__main__':
+    unittest.main()
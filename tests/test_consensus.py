@@ -0,0 +1,342 @@
+import copy
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.blockchain import NDJSON_MIMETYPE, Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+from src.wire import BLOCKS_MIMETYPE, encode_blocks  # noqa: E402
+
+
+def mine_blocks(blockchain, count):
+    """
+    Grow a blockchain by count valid blocks, each rewarding a miner
+    """
+    for _ in range(count):
+        previous_hash = blockchain.hash(blockchain.chain[-1])
+        nonce = blockchain.proof_of_work()
+        blockchain.submit_transaction(MINING_SENDER, None, 'miner_address', MINING_REWARD)
+        blockchain.create_block(nonce=nonce, previous_hash=previous_hash)
+
+
+class StandInPeer:
+    """
+    Local HTTP server that serves the routes of a peer node for a blockchain, after an injected latency,
+    optionally sending block streams one line at a time with a delay in between
+    """
+
+    def __init__(self, blockchain, latency=0.0, serves_summary=True, serves_blocks=True, serves_ndjson=True,
+                 serves_binary=True, line_delay=0.0):
+
+        self.blockchain = blockchain
+        self.latency = latency
+        self.line_delay = line_delay
+        self.lines_sent = 0
+        self.serves_summary = serves_summary
+        self.serves_blocks = serves_blocks
+        self.serves_ndjson = serves_ndjson
+        self.serves_binary = serves_binary
+        self.requests = []
+        peer = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                peer.requests.append(self.path)
+                time.sleep(peer.latency)
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if self.path == '/chain':
+                    blocks, key = peer.blockchain.chain, 'chain'
+                elif url.path == '/chain/blocks' and peer.serves_blocks:
+                    first, last = int(query['from'][0]), int(query['to'][0])
+                    blocks, key = peer.blockchain.chain[first - 1:last], 'blocks'
+                elif self.path == '/chain/summary' and peer.serves_summary:
+                    blocks, key = None, None
+                else:
+                    self.send_error(404)
+                    return
+
+                if blocks is None:
+                    content_type = 'application/json'
+                    body = json.dumps(peer.blockchain.chain_summary()).encode()
+                elif peer.serves_binary and BLOCKS_MIMETYPE in self.headers.get('Accept', ''):
+                    content_type = BLOCKS_MIMETYPE
+                    body = b''.join(encode_blocks(blocks))
+                elif peer.serves_ndjson and NDJSON_MIMETYPE in self.headers.get('Accept', ''):
+                    content_type = NDJSON_MIMETYPE
+                    body = ''.join(json.dumps(block) + '\n' for block in blocks).encode()
+                else:
+                    content_type = 'application/json'
+                    body = json.dumps({key: blocks, 'length': len(peer.blockchain.chain)}).encode()
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('X-Chain-Length', str(len(peer.blockchain.chain)))
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if not (peer.line_delay and content_type == NDJSON_MIMETYPE):
+                    self.wfile.write(body)
+                    return
+
+                for line in body.splitlines(keepends=True):
+                    try:
+                        self.wfile.write(line)
+                        self.wfile.flush()
+                    except OSError:
+                        return
+                    peer.lines_sent += 1
+                    time.sleep(peer.line_delay)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.node = f'127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestConsensus(unittest.TestCase):
+
+    def setUp(self):
+        self.blockchain = Blockchain()
+        self.peers = []
+
+    def tearDown(self):
+        for peer in self.peers:
+            peer.close()
+
+    def add_peer(self, blocks, latency=0.0, serves_summary=True):
+        blockchain = Blockchain()
+        mine_blocks(blockchain, blocks)
+        peer = StandInPeer(blockchain, latency=latency, serves_summary=serves_summary)
+        self.peers.append(peer)
+        self.blockchain.register_node(peer.node)
+        return peer
+
+    def test_adopts_longest_chain(self):
+        self.add_peer(blocks=1)
+        longest = self.add_peer(blocks=3)
+        self.add_peer(blocks=2)
+
+        self.assertTrue(self.blockchain.resolve_conflicts())
+        self.assertEqual(self.blockchain.chain, longest.blockchain.chain)
+
+    def test_only_longer_chains_are_downloaded(self):
+        mine_blocks(self.blockchain, 2)
+        shorter = self.add_peer(blocks=1)
+        longer = self.add_peer(blocks=4)
+
+        self.assertTrue(self.blockchain.resolve_conflicts())
+        self.assertEqual(self.blockchain.chain, longer.blockchain.chain)
+
+        # The shorter neighbour was only asked for its summary
+        self.assertEqual(shorter.requests, ['/chain/summary'])
+        self.assertEqual(longer.requests[0], '/chain/summary')
+
+    def test_same_chain_is_downloaded_once(self):
+        first = self.add_peer(blocks=2)
+        # A second neighbour announcing the very same chain
+        second = StandInPeer(first.blockchain)
+        self.peers.append(second)
+        self.blockchain.register_node(second.node)
+
+        self.assertTrue(self.blockchain.resolve_conflicts())
+        downloads = [path for path in first.requests + second.requests if path.startswith('/chain/blocks')]
+        self.assertEqual(len(downloads), 1)
+
+    def test_neighbour_without_summary(self):
+        # Nodes that don't serve /chain/summary yet still take part with their full chain
+        legacy = self.add_peer(blocks=2, serves_summary=False)
+
+        self.assertTrue(self.blockchain.resolve_conflicts())
+        self.assertEqual(self.blockchain.chain, legacy.blockchain.chain)
+
+    def share_chain(self, blocks):
+        """
+        Add a neighbour whose chain is a copy of ours plus blocks more
+        """
+        blockchain = Blockchain()
+        blockchain.replace_chain(copy.deepcopy(self.blockchain.chain))
+        mine_blocks(blockchain, blocks)
+        peer = StandInPeer(blockchain)
+        self.peers.append(peer)
+        self.blockchain.register_node(peer.node)
+        return peer
+
+    def test_sync_only_downloads_new_blocks(self):
+        mine_blocks(self.blockchain, 200)
+        peer = self.share_chain(blocks=1)
+
+        # Only our last block and the new one are downloaded, and only the new one is validated
+        with patch.object(self.blockchain, 'valid_chain') as mock_valid_chain:
+            self.assertTrue(self.blockchain.resolve_conflicts())
+            mock_valid_chain.assert_not_called()
+
+        self.assertEqual(peer.requests, ['/chain/summary', '/chain/blocks?from=201&to=202'])
+        self.assertEqual(self.blockchain.chain, peer.blockchain.chain)
+
+    def test_sync_from_fork(self):
+        mine_blocks(self.blockchain, 20)
+        peer = self.share_chain(blocks=0)
+
+        # Both sides mine on top of the shared history, the neighbour more than us
+        mine_blocks(self.blockchain, 3)
+        peer.blockchain.submit_transaction(MINING_SENDER, None, 'recipient_address', 1.0)
+        mine_blocks(peer.blockchain, 5)
+
+        self.assertTrue(self.blockchain.resolve_conflicts())
+        self.assertEqual(self.blockchain.chain, peer.blockchain.chain)
+        self.assertEqual(self.blockchain.balances, self.blockchain.build_balances(self.blockchain.chain))
+        self.assertEqual(self.blockchain.block_hashes, [self.blockchain.hash(block) for block in self.blockchain.chain])
+        # The walk back stopped long before the genesis block
+        self.assertNotIn('/chain', peer.requests)
+        self.assertFalse(any('from=1&' in path for path in peer.requests))
+
+    def test_invalid_new_blocks_are_rejected(self):
+        mine_blocks(self.blockchain, 5)
+        peer = self.share_chain(blocks=2)
+        peer.blockchain.chain[-1]['nonce'] += 1
+        peer.blockchain.chain[-1]['previous_hash'] = 'tampered'
+
+        self.assertFalse(self.blockchain.resolve_conflicts())
+        self.assertEqual(len(self.blockchain.chain), 6)
+
+    def test_neighbour_without_ranged_blocks(self):
+        peer = StandInPeer(Blockchain(), serves_blocks=False)
+        mine_blocks(peer.blockchain, 2)
+        self.peers.append(peer)
+        self.blockchain.register_node(peer.node)
+
+        # Falls back to downloading the whole chain
+        self.assertTrue(self.blockchain.resolve_conflicts())
+        self.assertEqual(self.blockchain.chain, peer.blockchain.chain)
+        self.assertIn('/chain', peer.requests)
+
+    def test_neighbour_without_ndjson(self):
+        # Older neighbours answer with a JSON document whatever the Accept header
+        mine_blocks(self.blockchain, 3)
+        legacy = StandInPeer(Blockchain(), serves_ndjson=False, serves_binary=False)
+        legacy.blockchain.replace_chain(copy.deepcopy(self.blockchain.chain))
+        mine_blocks(legacy.blockchain, 2)
+        self.peers.append(legacy)
+        self.blockchain.register_node(legacy.node)
+
+        self.assertTrue(self.blockchain.resolve_conflicts())
+        self.assertEqual(self.blockchain.chain, legacy.blockchain.chain)
+
+    def test_json_chain_is_parsed_once(self):
+        legacy = StandInPeer(Blockchain(), serves_ndjson=False, serves_binary=False)
+        mine_blocks(legacy.blockchain, 2)
+        self.peers.append(legacy)
+
+        with patch.object(requests.Response, 'json', autospec=True, side_effect=requests.Response.json) as parse:
+            chain, hashes = self.blockchain.fetch_chain(legacy.node)
+        self.assertEqual(parse.call_count, 1)
+        self.assertEqual(chain, legacy.blockchain.chain)
+        self.assertEqual(hashes, legacy.blockchain.block_hashes)
+
+    def test_neighbour_without_binary_format(self):
+        mine_blocks(self.blockchain, 3)
+        peer = self.share_chain(blocks=2)
+        peer.serves_binary = False
+
+        self.assertTrue(self.blockchain.resolve_conflicts())
+        self.assertEqual(self.blockchain.chain, peer.blockchain.chain)
+
+    def test_sync_over_binary_format(self):
+        self.blockchain.submit_transaction(MINING_SENDER, None, 'recipient_address', 2.0)
+        mine_blocks(self.blockchain, 3)
+        peer = self.share_chain(blocks=3)
+
+        with patch.object(self.blockchain, 'read_blocks', wraps=self.blockchain.read_blocks) as mock_read_blocks:
+            self.assertTrue(self.blockchain.resolve_conflicts())
+        self.assertEqual(self.blockchain.chain, peer.blockchain.chain)
+        self.assertEqual(self.blockchain.block_hashes, [self.blockchain.hash(block) for block in self.blockchain.chain])
+        response = mock_read_blocks.call_args[0][0]
+        self.assertEqual(response.headers['Content-Type'], BLOCKS_MIMETYPE)
+
+    def test_streamed_chain_stops_at_invalid_block(self):
+        mine_blocks(self.blockchain, 5)
+        blocks = copy.deepcopy(self.blockchain.chain[1:])
+        blocks[1]['nonce'] += 1
+
+        def stream():
+            yield from blocks[:2]
+            self.fail('Blocks after an invalid block were read')
+
+        self.assertIsNone(self.blockchain.validate_stream(
+            last_block=self.blockchain.chain[0], last_hash=self.blockchain.block_hashes[0], blocks=stream()))
+
+    def test_neighbours_are_queried_concurrently(self):
+        for blocks in range(1, 6):
+            self.add_peer(blocks=blocks, latency=0.5)
+
+        # Five slow neighbours take about as long as one
+        start = time.perf_counter()
+        self.assertTrue(self.blockchain.resolve_conflicts(timeout=5))
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertEqual(len(self.blockchain.chain), 6)
+
+    def test_slow_neighbour_is_ignored_after_deadline(self):
+        reachable = self.add_peer(blocks=2)
+        self.add_peer(blocks=4, latency=3)
+
+        # The slow neighbour has the longest chain but misses the deadline
+        start = time.perf_counter()
+        self.assertTrue(self.blockchain.resolve_conflicts(timeout=1))
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertEqual(self.blockchain.chain, reachable.blockchain.chain)
+
+    def test_download_stops_at_deadline(self):
+        # Every line arrives well within the read timeout, but the whole chain takes longer than the deadline
+        peer = StandInPeer(Blockchain(), serves_binary=False, line_delay=0.1)
+        mine_blocks(peer.blockchain, 30)
+        self.peers.append(peer)
+
+        start = time.perf_counter()
+        with self.assertRaises(TimeoutError):
+            self.blockchain.fetch_chain(peer.node, timeout=1)
+        self.assertLess(time.perf_counter() - start, 1.5)
+
+        # The connection is closed, the neighbour stops sending soon after
+        time.sleep(0.5)
+        lines_sent = peer.lines_sent
+        time.sleep(0.5)
+        self.assertEqual(peer.lines_sent, lines_sent)
+        self.assertLess(lines_sent, 31)
+
+    def test_unreachable_neighbour_is_ignored(self):
+        reachable = self.add_peer(blocks=2)
+        unreachable = self.add_peer(blocks=4)
+        unreachable.close()
+
+        self.assertTrue(self.blockchain.resolve_conflicts())
+        self.assertEqual(self.blockchain.chain, reachable.blockchain.chain)
+
+    def test_invalid_longer_chain_is_rejected(self):
+        peer = self.add_peer(blocks=3)
+        peer.blockchain.chain[1]['nonce'] += 1
+
+        self.assertFalse(self.blockchain.resolve_conflicts())
+        self.assertEqual(len(self.blockchain.chain), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.keypool import KeyPool, generate_key_pair  # noqa: E402
+from src.keys import KeyCache  # noqa: E402
+
+
+class TestKeyPool(unittest.TestCase):
+
+    def test_generate_key_pair(self):
+        public_key, private_key = generate_key_pair('ed25519')
+
+        self.assertTrue(public_key.startswith('ed25519:'))
+        self.assertEqual(KeyCache().public_key(private_key), public_key)
+
+    def test_pool_fills_up_to_its_size(self):
+        pool = KeyPool(size=2, workers=1, scheme='ed25519')
+        pool.start()
+        self.assertTrue(pool.wait_full(timeout=60))
+
+        key_pair = pool.pop()
+        self.assertEqual(len(key_pair), 2)
+        # The pool is refilled after a key pair is taken
+        self.assertTrue(pool.wait_full(timeout=60))
+        self.assertEqual(len(pool), 2)
+        self.assertNotIn(key_pair, pool.key_pairs)
+        self.assertEqual(pool.stats(), {'depth': 2, 'size': 2, 'hits': 1, 'misses': 0})
+        pool.executor.shutdown()
+
+    def test_empty_pool(self):
+        # A pool of size 0 never starts, every wallet generates its own key pair
+        pool = KeyPool(size=0)
+        pool.start()
+
+        self.assertIsNone(pool.executor)
+        self.assertIsNone(pool.pop())
+        self.assertEqual(pool.stats(), {'depth': 0, 'size': 0, 'hits': 0, 'misses': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import binascii
+import os
+import sys
+import unittest
+from Crypto.PublicKey import RSA
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.keys import KEY_SCHEMES, KeyCache, SignatureCache, key_scheme  # noqa: E402
+
+
+def new_key_pair():
+    # while RSA key sizes below 2048 bits are considered breakable, this is for test only.
+    private_key = RSA.generate(1024)
+    return (binascii.hexlify(private_key.exportKey(format='DER')).decode('ascii'),
+            binascii.hexlify(private_key.publickey().exportKey(format='DER')).decode('ascii'))
+
+
+class TestKeyCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.key_pairs = [new_key_pair() for _ in range(3)]
+
+    def test_sign_and_verify(self):
+        cache = KeyCache(maxsize=2)
+        private_key, public_key = self.key_pairs[0]
+
+        signature = cache.signer(private_key).sign(b'transaction')
+        self.assertTrue(cache.verifier(public_key).verify(b'transaction', signature))
+        self.assertFalse(cache.verifier(public_key).verify(b'other transaction', signature))
+        self.assertEqual(cache.public_key(private_key), public_key)
+
+    def test_ed25519_keys(self):
+        cache = KeyCache(maxsize=2)
+        public_key, private_key = KEY_SCHEMES['ed25519'].generate()
+
+        # Ed25519 addresses are a short prefixed hex string instead of a DER RSA key
+        self.assertEqual(len(public_key), len('ed25519:') + 64)
+        self.assertEqual(cache.public_key(private_key), public_key)
+        signature = cache.signer(private_key).sign(b'transaction')
+        self.assertTrue(cache.verifier(public_key).verify(b'transaction', signature))
+        self.assertFalse(cache.verifier(public_key).verify(b'other transaction', signature))
+
+    def test_key_scheme(self):
+        _, rsa_public_key = self.key_pairs[0]
+        self.assertIs(key_scheme(rsa_public_key), KEY_SCHEMES['rsa'])
+        self.assertIs(key_scheme('ed25519:' + '00' * 32), KEY_SCHEMES['ed25519'])
+        with self.assertRaises(ValueError):
+            key_scheme('dsa:abcd')
+
+    def test_hits_and_misses(self):
+        cache = KeyCache(maxsize=2)
+        private_key, public_key = self.key_pairs[0]
+
+        signer = cache.signer(private_key)
+        self.assertIs(cache.signer(private_key), signer)
+        cache.verifier(public_key)
+
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'signers': 1, 'verifiers': 1})
+
+        cache.clear()
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0, 'signers': 0, 'verifiers': 0})
+
+    def test_least_recently_used_key_is_evicted(self):
+        cache = KeyCache(maxsize=2)
+        first, second, third = (public_key for _, public_key in self.key_pairs)
+
+        cache.verifier(first)
+        cache.verifier(second)
+        # Using the first key again makes the second one the least recently used
+        cache.verifier(first)
+        cache.verifier(third)
+
+        self.assertEqual(list(cache.verifiers), [first, third])
+        cache.verifier(second)
+        self.assertEqual(cache.stats()['misses'], 4)
+
+    def test_disabled_cache(self):
+        cache = KeyCache(maxsize=0)
+        _, public_key = self.key_pairs[0]
+
+        cache.verifier(public_key)
+        cache.verifier(public_key)
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 2, 'signers': 0, 'verifiers': 0})
+
+
+class TestSignatureCache(unittest.TestCase):
+
+    def test_seen(self):
+        cache = SignatureCache(maxsize=2)
+
+        self.assertFalse(cache.seen(b'transaction', 'abcd'))
+        cache.add(b'transaction', 'abcd')
+        self.assertTrue(cache.seen(b'transaction', 'abcd'))
+        # The same signature over another transaction was never verified
+        self.assertFalse(cache.seen(b'other transaction', 'abcd'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2, 'signatures': 1})
+
+    def test_least_recently_used_signature_is_evicted(self):
+        cache = SignatureCache(maxsize=2)
+        cache.add(b'first', 'abcd')
+        cache.add(b'second', 'abcd')
+        cache.seen(b'first', 'abcd')
+        cache.add(b'third', 'abcd')
+
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(cache.seen(b'first', 'abcd'))
+        self.assertFalse(cache.seen(b'second', 'abcd'))
+
+    def test_disabled_cache(self):
+        cache = SignatureCache(maxsize=0)
+        cache.add(b'transaction', 'abcd')
+        self.assertFalse(cache.seen(b'transaction', 'abcd'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.mempool import Mempool, transaction_hash  # noqa: E402
+
+
+def transaction(sender, recipient, value):
+    return {'sender_address': sender, 'recipient_address': recipient, 'value': value}
+
+
+class TestMempool(unittest.TestCase):
+
+    def add(self, mempool, sender_id, recipient_id, value):
+        pending = transaction(f'address_{sender_id}', f'address_{recipient_id}', value)
+        tx_hash = transaction_hash(pending)
+        return tx_hash, mempool.add(tx_hash, pending, sender_id, recipient_id)
+
+    def test_deduplicates_by_content(self):
+        mempool = Mempool()
+        tx_hash, added = self.add(mempool, 1, 2, 5.0)
+        self.assertTrue(added)
+        self.assertFalse(self.add(mempool, 1, 2, 5.0)[1])
+
+        self.assertEqual(len(mempool), 1)
+        self.assertIn(tx_hash, mempool)
+        self.assertEqual(mempool.get(tx_hash)['value'], 5.0)
+        self.assertEqual(mempool.debits, {1: 5.0})
+
+        # The same transfer with another signature is another transaction
+        signed = dict(transaction('address_1', 'address_2', 5.0), signature='ab')
+        self.assertNotEqual(transaction_hash(signed), tx_hash)
+
+    def test_remove_keeps_indexes_and_totals(self):
+        mempool = Mempool()
+        first, _ = self.add(mempool, 1, 2, 0.1)
+        second, _ = self.add(mempool, 1, 3, 0.2)
+        third, _ = self.add(mempool, 3, 1, 0.3)
+
+        self.assertEqual(mempool.remove(second)['value'], 0.2)
+        self.assertIsNone(mempool.remove(second))
+        self.assertAlmostEqual(mempool.debits[1], 0.1)
+        self.assertEqual(mempool.debits[3], 0.3)
+        self.assertEqual(mempool.credits, {2: 0.1, 1: 0.3})
+        self.assertNotIn(3, mempool.by_recipient)
+
+        # Addresses without pending transactions have no total left, not a rounding error
+        mempool.remove(first)
+        mempool.remove(third)
+        self.assertEqual((mempool.debits, mempool.credits, mempool.by_sender, mempool.by_recipient), ({}, {}, {}, {}))
+
+    def test_for_address_oldest_first(self):
+        mempool = Mempool()
+        self.add(mempool, 1, 2, 1.0)
+        self.add(mempool, 3, 1, 2.0)
+        self.add(mempool, 3, 4, 3.0)
+        self.add(mempool, 1, 4, 4.0)
+
+        self.assertEqual([pending['value'] for pending in mempool.for_address(1)], [1.0, 2.0, 4.0])
+        self.assertEqual([pending['value'] for pending in mempool.for_address(4)], [3.0, 4.0])
+        self.assertEqual(mempool.for_address(5), [])
+
+    def test_full(self):
+        mempool = Mempool(max_size=2)
+        first, _ = self.add(mempool, 1, 2, 1.0)
+        self.assertFalse(mempool.full())
+        self.add(mempool, 2, 3, 2.0)
+        self.assertTrue(mempool.full())
+
+        mempool.remove(first)
+        self.assertFalse(mempool.full())
+
+    def test_sequences(self):
+        mempool = Mempool()
+        hashes = {}
+        for sequence in (1, 2, 3):
+            pending = dict(transaction('address_1', 'address_2', float(sequence)), sequence=sequence)
+            hashes[sequence] = transaction_hash(pending)
+            self.assertTrue(mempool.add(hashes[sequence], pending, 1, 2))
+        self.assertEqual(mempool.last_sequence(1), 3)
+        self.assertIsNone(mempool.last_sequence(2))
+
+        # A sender can't have two pending transfers with the same sequence number
+        other = dict(transaction('address_1', 'address_3', 5.0), sequence=2)
+        self.assertFalse(mempool.add(transaction_hash(other), other, 1, 3))
+
+        # Once the chain used sequence number 1, the pending transfers after a gap are stale
+        mempool.remove(hashes[2])
+        self.assertEqual(mempool.stale({1: 1}), [hashes[1], hashes[3]])
+        self.assertEqual(mempool.stale({}), [hashes[3]])
+        mempool.remove(hashes[1])
+        mempool.remove(hashes[3])
+        self.assertEqual(mempool.by_sequence, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.blockchain import Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+from src.mining import MiningScheduler  # noqa: E402
+from src.storage import BlockStore  # noqa: E402
+
+
+class TestMiningScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.blockchain = Blockchain()
+        self.scheduler = MiningScheduler(self.blockchain)
+
+    def test_mine_block(self):
+        self.blockchain.submit_transaction(MINING_SENDER, None, 'address_1', 5.0)
+
+        job = self.scheduler.submit(miner_address='miner_address')
+        self.assertTrue(job.wait(timeout=5))
+
+        # The block holds the pending transaction plus the reward, and passes chain validation
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(job.block['block_number'], 2)
+        self.assertEqual(len(self.blockchain.chain), 2)
+        self.assertEqual(len(self.blockchain.transactions), 0)
+        self.assertEqual(self.blockchain.get_balance('miner_address'), MINING_REWARD)
+        self.assertTrue(self.blockchain.valid_chain(self.blockchain.chain))
+
+    def test_transactions_submitted_while_mining_stay_pending(self):
+        self.blockchain.submit_transaction(MINING_SENDER, None, 'address_1', 5.0)
+        proof_of_work = self.blockchain.proof_of_work
+
+        def slow_proof_of_work(**kwargs):
+            # A transaction arrives after the pool snapshot was taken
+            self.blockchain.submit_transaction(MINING_SENDER, None, 'address_2', 3.0)
+            return proof_of_work(**kwargs)
+
+        with patch.object(self.blockchain, 'proof_of_work', side_effect=slow_proof_of_work):
+            job = self.scheduler.submit(miner_address='miner_address')
+            self.assertTrue(job.wait(timeout=5))
+
+        self.assertEqual(job.status, 'completed')
+        self.assertTrue(self.blockchain.valid_chain(self.blockchain.chain))
+        self.assertEqual(len(self.blockchain.transactions), 1)
+        self.assertEqual(self.blockchain.get_available_balance('address_2'), 3.0)
+
+    @patch('src.blockchain.MAX_BLOCK_TRANSACTIONS', 2)
+    def test_block_size_is_bounded(self):
+        for value in (1.0, 2.0, 3.0):
+            self.blockchain.submit_transaction(MINING_SENDER, None, 'address_1', value)
+
+        job = self.scheduler.submit(miner_address='miner_address')
+        self.assertTrue(job.wait(timeout=5))
+
+        # The two oldest transactions and the reward were mined, the newest one waits for the next block
+        self.assertEqual([transaction['value'] for transaction in job.block['transactions']],
+                         [1.0, 2.0, MINING_REWARD])
+        self.assertEqual([transaction['value'] for transaction in self.blockchain.transactions], [3.0])
+        self.assertTrue(self.blockchain.valid_chain(self.blockchain.chain))
+
+    def test_chain_replaced_cancels_jobs(self):
+        with patch.object(self.blockchain, 'proof_of_work',
+                          side_effect=lambda **kwargs: kwargs['cancel'].wait(timeout=5) and None):
+            job = self.scheduler.submit(miner_address='miner_address')
+            queued_job = self.scheduler.submit(miner_address='miner_address')
+
+            # Adopting another chain cancels both the running and the queued job
+            self.blockchain.replace_chain(Blockchain().chain)
+
+            self.assertTrue(job.wait(timeout=5))
+            self.assertTrue(queued_job.wait(timeout=5))
+
+        self.assertEqual(job.status, 'cancelled')
+        self.assertEqual(queued_job.status, 'cancelled')
+
+    def test_failed_job(self):
+        with patch.object(self.blockchain, 'proof_of_work', side_effect=RuntimeError('boom')):
+            job = self.scheduler.submit(miner_address='miner_address')
+            self.assertTrue(job.wait(timeout=5))
+
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, 'boom')
+
+
+class TestSharedMiningScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'chain.db')
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        self.directory.cleanup()
+
+    def worker(self):
+        """
+        A Blockchain and mining scheduler with their own connection to the shared store, like a WSGI worker process
+        """
+        store = BlockStore(self.path, shared=True)
+        self.stores.append(store)
+        blockchain = Blockchain(store=store)
+        return blockchain, MiningScheduler(blockchain)
+
+    def test_jobs_are_shared(self):
+        (first, first_scheduler), (_, second_scheduler) = self.worker(), self.worker()
+
+        def wait_for_cancel(**kwargs):
+            # The cancel of another worker is only seen by checking the event, as the proof of work does
+            deadline = time.monotonic() + 5
+            while not kwargs['cancel'].is_set() and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+        with patch.object(first, 'proof_of_work', side_effect=wait_for_cancel):
+            job = first_scheduler.submit(miner_address='miner_address')
+            queued_job = first_scheduler.submit(miner_address='miner_address')
+            while second_scheduler.get(job.job_id).status != 'mining':
+                time.sleep(0.01)
+
+            # Another worker sees both jobs, and a queued job it cancels is finished right away
+            self.assertEqual(second_scheduler.get(queued_job.job_id).status, 'queued')
+            self.assertTrue(second_scheduler.cancel(queued_job.job_id))
+            self.assertEqual(second_scheduler.get(queued_job.job_id).status, 'cancelled')
+            self.assertFalse(second_scheduler.cancel(queued_job.job_id))
+
+            # The running job stops once its worker sees the cancel
+            self.assertTrue(second_scheduler.cancel(job.job_id))
+            self.assertTrue(job.wait(timeout=5))
+            self.assertTrue(queued_job.wait(timeout=5))
+
+        self.assertEqual((job.status, job.error), ('cancelled', 'Cancelled while mining'))
+        self.assertEqual(queued_job.status, 'cancelled')
+        self.assertEqual(second_scheduler.get(job.job_id).to_dict(), job.to_dict())
+        self.assertIsNone(second_scheduler.get('unknown_job'))
+
+        # Completed jobs are reported to every worker as well
+        job = first_scheduler.submit(miner_address='miner_address')
+        self.assertTrue(job.wait(timeout=5))
+        self.assertEqual(second_scheduler.get(job.job_id).block['block_number'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
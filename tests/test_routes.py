@@ -1,14 +1,19 @@
 import binascii
+import json
 import os
 import sys
 import unittest
 from unittest.mock import MagicMock, patch
+from Crypto.PublicKey import RSA
 from src.app import create_app
 
 sys.path.insert(0, os.path.abspath(
     # to solve import issues in src
     os.path.join(os.path.dirname(__file__), '../src')))
 
+from src.blockchain import MINING_SENDER, Blockchain  # noqa: E402
+from src.wire import BLOCKS_MIMETYPE, decode_blocks  # noqa: E402
+
 
 class TestRoutes(unittest.TestCase):
 
@@ -23,10 +28,43 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'Welcome to Flask!', response.data)
 
+    @patch.dict('src.app.routes.wallets', {}, clear=True)
+    def test_new_wallet_key_scheme(self):
+        response = self.client.post('/wallet/new', json={'scheme': 'ed25519'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['public_key'].startswith('ed25519:'))
+        self.assertTrue(response.get_json()['private_key'].startswith('ed25519:'))
+
+        response = self.client.post('/wallet/new', json={'scheme': 'dsa'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'Unknown key scheme, must be one of: rsa, ed25519')
+
+    @patch.dict('src.app.routes.wallets', {}, clear=True)
+    def test_new_wallet_from_pool(self):
+        from src.app import routes
+        key_pool = routes.KeyPool(size=1)
+        key_pool.key_pairs.append(('public_key_pooled', 'private_key_pooled'))
+
+        with patch('src.app.routes.key_pool', key_pool), patch('src.app.routes.generate_key_pair') as mock_generate:
+            response = self.client.post('/wallet/new')
+            self.assertEqual(response.get_json(), {'public_key': 'public_key_pooled',
+                                                   'private_key': 'private_key_pooled'})
+            mock_generate.assert_not_called()
+
+            # Once the pool is empty the key pair is generated in the request
+            mock_generate.return_value = ('public_key_inline', 'private_key_inline')
+            response = self.client.post('/wallet/new')
+            self.assertEqual(response.get_json()['public_key'], 'public_key_inline')
+
+            response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['wallet_pool'], {'depth': 0, 'size': 1, 'hits': 1, 'misses': 1})
+
     # Patch the wallets dictionary with an empty dictionary
     @patch.dict('src.app.routes.wallets', {}, clear=True)
-    @patch('src.app.routes.RSA.generate')  # Mock RSA.generate
-    @patch('src.app.routes.Crypto.Random.new')  # Mock Crypto.Random.new().read
+    @patch('keys.RSA.generate')  # Mock RSA.generate
+    @patch('keys.Crypto.Random.new')  # Mock Crypto.Random.new().read
     def test_new_wallet(self, mock_random_new, mock_rsa_generate):
         # Mocking the random generator
         mock_random_gen = MagicMock()
@@ -120,9 +158,49 @@ class TestRoutes(unittest.TestCase):
             'sender_address_123',
             'private_key_abc123',
             'recipient_address_456',
-            100.0
+            100.0,
+            sequence=None
         )
 
+    @patch.dict('src.app.routes.wallets', {}, clear=True)
+    @patch('src.app.routes.blockchain.get_available_balance')
+    @patch('src.app.routes.blockchain.submit_transaction')
+    def test_new_presigned_transaction(self, mock_submit_transaction, mock_get_available_balance):
+        from src.app.routes import wallets  # Import wallets after patching
+        wallets['sender_address_123'] = {'private_key': 'private_key_abc123', 'balance': 200.0}
+        wallets['recipient_address_456'] = {'private_key': 'private_key_xyz456', 'balance': 50.0}
+        mock_get_available_balance.return_value = 200.0
+        mock_submit_transaction.return_value = 1
+
+        # A client that signed the transaction itself sends the signature and the sequence number it signed
+        # instead of its private key
+        json_data = {
+            'sender_address': 'sender_address_123',
+            'recipient_address': 'recipient_address_456',
+            'amount': 100.0,
+            'signature': 'abcd',
+            'sequence': 1
+        }
+        response = self.client.post('/transactions/new', json=json_data)
+
+        self.assertEqual(response.status_code, 201)
+        mock_submit_transaction.assert_called_once_with(
+            'sender_address_123', None, 'recipient_address_456', 100.0, signature='abcd', sequence=1)
+
+        # The signature alone can't be submitted, and sequence numbers are positive integers
+        for fields, error in (({'sequence': None}, 'Missing required field: sequence'),
+                              ({'sequence': 0}, 'sequence must be a positive integer.'),
+                              ({'sequence': '1'}, 'sequence must be a positive integer.')):
+            data = {**json_data, **fields}
+            data = {key: value for key, value in data.items() if value is not None}
+            response = self.client.post('/transactions/new', json=data)
+            self.assertEqual((response.status_code, response.get_json()['error']), (400, error))
+
+        # A signature that can't be parsed is an invalid transaction
+        mock_submit_transaction.side_effect = ValueError
+        response = self.client.post('/transactions/new', json=json_data)
+        self.assertEqual(response.status_code, 406)
+
     @patch.dict('src.app.routes.wallets', {}, clear=True)
     @patch('src.app.routes.blockchain.get_available_balance')
     @patch('src.app.routes.blockchain.submit_transaction')
@@ -201,6 +279,156 @@ class TestRoutes(unittest.TestCase):
         mock_get_available_balance.assert_called_once_with(
             address='sender_address_123')
 
+    @patch.dict('src.app.routes.wallets', {}, clear=True)
+    def test_new_transactions_batch(self):
+        from src.app import routes
+        from src.app.routes import wallets  # Import wallets after patching
+
+        # while RSA key sizes below 2048 bits are considered breakable, this is for test only.
+        private_key = RSA.generate(1024)
+        sender_address = binascii.hexlify(private_key.publickey().exportKey(format='DER')).decode('ascii')
+        sender_private_key = binascii.hexlify(private_key.exportKey(format='DER')).decode('ascii')
+        wallets[sender_address] = {'private_key': sender_private_key, 'balance': 0.0}
+        wallets['recipient_address_456'] = {'private_key': 'private_key_xyz456', 'balance': 0.0}
+
+        # The sender owns a single mining reward
+        blockchain = routes.Blockchain()
+        blockchain.submit_transaction(MINING_SENDER, None, sender_address, 1.0)
+        blockchain.create_block(nonce=0, previous_hash='00')
+
+        transaction = {
+            'sender_address': sender_address,
+            'sender_private_key': sender_private_key,
+            'recipient_address': 'recipient_address_456',
+            'amount': 0.6
+        }
+        batch = [
+            transaction,
+            # Only affordable if the first transaction isn't counted
+            transaction,
+            dict(transaction, amount=0.1, sender_private_key='invalid_private_key'),
+            dict(transaction, amount='invalid_amount'),
+            {'sender_address': sender_address},
+            dict(transaction, recipient_address='non_existent_recipient'),
+            dict(transaction, amount=0.4),
+        ]
+
+        with patch('src.app.routes.blockchain', blockchain):
+            response = self.client.post('/transactions/batch', json={'transactions': batch})
+
+        response_json = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_json['accepted'], 2)
+        self.assertEqual([result['status'] for result in response_json['results']],
+                         [201, 400, 406, 400, 400, 400, 201])
+        self.assertEqual(response_json['results'][0]['message'], 'Transaction will be added to Block 3')
+        self.assertEqual(response_json['results'][1]['error'], 'Insufficient balance.')
+        self.assertEqual(response_json['results'][4]['error'], 'Missing required field: sender_private_key')
+        self.assertEqual([pending['value'] for pending in blockchain.transactions], [0.6, 0.4])
+
+    @patch.dict('src.app.routes.wallets', {}, clear=True)
+    def test_new_transaction_sequence_used(self):
+        from src.app import routes
+        from src.app.routes import wallets  # Import wallets after patching
+
+        # while RSA key sizes below 2048 bits are considered breakable, this is for test only.
+        private_key = RSA.generate(1024)
+        sender_address = binascii.hexlify(private_key.publickey().exportKey(format='DER')).decode('ascii')
+        sender_private_key = binascii.hexlify(private_key.exportKey(format='DER')).decode('ascii')
+        wallets[sender_address] = {'private_key': sender_private_key, 'balance': 0.0}
+        wallets['recipient_address_456'] = {'private_key': 'private_key_xyz456', 'balance': 0.0}
+
+        blockchain = routes.Blockchain()
+        blockchain.submit_transaction(MINING_SENDER, None, sender_address, 1.0)
+        blockchain.create_block(nonce=0, previous_hash='00')
+
+        transaction = {
+            'sender_address': sender_address,
+            'sender_private_key': sender_private_key,
+            'recipient_address': 'recipient_address_456',
+            'amount': 0.1
+        }
+        with patch('src.app.routes.blockchain', blockchain):
+            # Two payments of the same amount get their own sequence numbers
+            for _ in range(2):
+                self.assertEqual(self.client.post('/transactions/new', json=transaction).status_code, 201)
+
+            # A retried request with the sequence number the client picked is only paid once
+            retried = dict(transaction, sequence=3)
+            self.assertEqual(self.client.post('/transactions/new', json=retried).status_code, 201)
+            response = self.client.post('/transactions/new', json=retried)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.get_json(), {'error': 'Transaction already submitted.', 'next_sequence': 4})
+
+            # Skipping a sequence number is refused as well
+            response = self.client.post('/transactions/new', json=dict(transaction, sequence=5))
+            self.assertEqual((response.status_code, response.get_json()['next_sequence']), (400, 4))
+
+            # Anyone can read a signature, but replaying it is refused while pending and once mined
+            pending = blockchain.pending_transactions()[0]
+            replayed = {key: pending[key] for key in ('sender_address', 'recipient_address', 'signature', 'sequence')}
+            replayed['amount'] = pending['value']
+            self.assertEqual(self.client.post('/transactions/new', json=replayed).status_code, 409)
+            blockchain.create_block(nonce=0, previous_hash=blockchain.block_hashes[-1])
+            self.assertEqual(self.client.post('/transactions/new', json=replayed).status_code, 409)
+            self.assertAlmostEqual(blockchain.get_balance(sender_address), 0.7)
+            response = self.client.get('/transactions/get', query_string={'address': sender_address})
+            self.assertEqual(response.get_json()['next_sequence'], 4)
+
+            batch = [dict(transaction, sequence=4), dict(transaction, sequence=4)]
+            response = self.client.post('/transactions/batch', json={'transactions': batch})
+            self.assertEqual([result['status'] for result in response.get_json()['results']], [201, 409])
+
+            # The node renumbers its transactions that come after a refused one
+            batch = [dict(transaction, amount=100), transaction]
+            response = self.client.post('/transactions/batch', json={'transactions': batch})
+
+        response_json = response.get_json()
+        self.assertEqual(response_json['accepted'], 1)
+        self.assertEqual([result['status'] for result in response_json['results']], [400, 201])
+        self.assertEqual([pending['sequence'] for pending in blockchain.transactions], [4, 5])
+
+    @patch.dict('src.app.routes.wallets', {}, clear=True)
+    def test_new_transaction_pool_full(self):
+        from src.app import routes
+        from src.app.routes import wallets  # Import wallets after patching
+
+        # while RSA key sizes below 2048 bits are considered breakable, this is for test only.
+        private_key = RSA.generate(1024)
+        sender_address = binascii.hexlify(private_key.publickey().exportKey(format='DER')).decode('ascii')
+        sender_private_key = binascii.hexlify(private_key.exportKey(format='DER')).decode('ascii')
+        wallets[sender_address] = {'private_key': sender_private_key, 'balance': 0.0}
+        wallets['recipient_address_456'] = {'private_key': 'private_key_xyz456', 'balance': 0.0}
+
+        # A pool with room for one transaction, which the sender's credit takes
+        blockchain = routes.Blockchain()
+        blockchain.transactions.max_size = 1
+        blockchain.submit_transaction(MINING_SENDER, None, sender_address, 1.0)
+
+        transaction = {
+            'sender_address': sender_address,
+            'sender_private_key': sender_private_key,
+            'recipient_address': 'recipient_address_456',
+            'amount': 0.5
+        }
+        with patch('src.app.routes.blockchain', blockchain):
+            response = self.client.post('/transactions/new', json=transaction)
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.get_json()['error'], 'Transactions pool is full, try again later.')
+
+            response = self.client.post('/transactions/batch', json={'transactions': [transaction]})
+        self.assertEqual(response.get_json()['results'][0]['status'], 503)
+        self.assertEqual([pending['value'] for pending in blockchain.transactions], [1.0])
+
+    def test_new_transactions_batch_invalid(self):
+        response = self.client.post('/transactions/batch', json={'transactions': []})
+        self.assertEqual(response.status_code, 400)
+
+        with patch('src.app.routes.TRANSACTION_BATCH_LIMIT', 1):
+            response = self.client.post('/transactions/batch', json={'transactions': [{}, {}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'At most 1 transactions can be submitted at once.')
+
     @patch.dict('src.app.routes.wallets', {}, clear=True)
     def test_new_transaction_sender_address_not_exist(self):
         # Set up only the recipient wallet
@@ -285,13 +513,46 @@ class TestRoutes(unittest.TestCase):
         self.assertIn('message', response_json)
         self.assertEqual(response_json['message'], 'Invalid Transaction!')
 
+    def test_chain_summary(self):
+        from src.app.routes import blockchain
+
+        response = self.client.get('/chain/summary')
+        response_json = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_json['length'], len(blockchain.chain))
+        self.assertEqual(response_json['tip_hash'], blockchain.hash(blockchain.chain[-1]))
+
+    @patch('src.app.routes.blockchain.chain', new_callable=list)
+    def test_chain_blocks(self, mock_chain):
+        mock_chain.extend({'block_number': number} for number in range(1, 6))
+
+        response = self.client.get('/chain/blocks?from=2&to=3')
+        response_json = response.get_json()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([block['block_number'] for block in response_json['blocks']], [2, 3])
+        self.assertEqual(response_json['length'], 5)
+
+        # The range defaults to the whole chain and stops at its end
+        self.assertEqual(len(self.client.get('/chain/blocks').get_json()['blocks']), 5)
+        self.assertEqual(len(self.client.get('/chain/blocks?from=4&to=99').get_json()['blocks']), 2)
+
+    def test_chain_blocks_invalid_range(self):
+        response = self.client.get('/chain/blocks?from=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'from and to must be block numbers.')
+
+        response = self.client.get('/chain/blocks?from=3&to=2')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['error'], 'Invalid block range.')
+
     @patch.dict('src.app.routes.wallets', {}, clear=True)
     @patch('src.app.routes.blockchain.proof_of_work')
     @patch('src.app.routes.blockchain.create_block')
-    @patch('src.app.routes.blockchain.submit_transaction')
-    def test_mine(self, mock_submit_transaction, mock_create_block, mock_proof_of_work):
+    def test_mine(self, mock_create_block, mock_proof_of_work):
         # Set up wallet for the miner
-        from src.app.routes import wallets, blockchain  # Import wallets after patching
+        from src.app.routes import wallets, blockchain, mining_scheduler  # Import wallets after patching
         wallets['miner_address_123'] = {
             'private_key': 'private_key_abc123', 'balance': 0.0}
 
@@ -311,31 +572,66 @@ class TestRoutes(unittest.TestCase):
             'previous_hash': previous_hash
         }
 
-        # Mock the transaction submission
-        mock_submit_transaction.return_value = True
-
         # Send POST request to /mine route with JSON data
         response = self.client.post('/mine', json=json_data)
 
         # Parse the JSON response
         response_json = response.get_json()
 
-        # Validate the response status code and content
-        self.assertEqual(response.status_code, 200)
-        self.assertEqual(response_json['message'], 'New Block Forged')
-        self.assertEqual(response_json['block_number'], 2)
+        # The job is accepted right away and mined in the background
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response_json['message'], 'Mining job started')
+        self.assertTrue(mining_scheduler.get(response_json['job_id']).wait(timeout=5))
 
-        # Ensure the submit_transaction method was called for the mining reward
-        mock_submit_transaction.assert_called_once_with(
-            sender_address='THE BLOCKCHAIN',
-            sender_private_key=None,
-            recipient_address='miner_address_123',
-            value=1
-        )
+        # Poll the job status for the forged block
+        response = self.client.get(f"/mine/status/{response_json['job_id']}")
+        response_json = response.get_json()
 
-        # Ensure the proof_of_work and create_block methods were called
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response_json['status'], 'completed')
+        self.assertEqual(response_json['block']['block_number'], 2)
+
+        # Ensure the proof_of_work and create_block methods were called, with the mining reward last
         mock_proof_of_work.assert_called_once()
-        mock_create_block.assert_called_once_with(123, previous_hash)
+        mock_create_block.assert_called_once()
+        nonce, block_previous_hash = mock_create_block.call_args.args
+        self.assertEqual((nonce, block_previous_hash), (123, previous_hash))
+        reward = dict(mock_create_block.call_args.kwargs['transactions'][-1])
+        self.assertEqual(reward, {
+            'sender_address': 'THE BLOCKCHAIN',
+            'recipient_address': 'miner_address_123',
+            'value': 1
+        })
+
+    @patch('src.app.routes.blockchain.proof_of_work')
+    def test_mine_cancel(self, mock_proof_of_work):
+        from src.app.routes import mining_scheduler
+
+        # Mock a proof of work that only ends when the job is cancelled
+        mock_proof_of_work.side_effect = lambda **kwargs: kwargs['cancel'].wait(timeout=5) and None
+
+        job_id = self.client.post('/mine', json={'miner_address': 'miner_address_123'}).get_json()['job_id']
+
+        response = self.client.post(f'/mine/cancel/{job_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['message'], 'Mining job cancelled')
+
+        self.assertTrue(mining_scheduler.get(job_id).wait(timeout=5))
+        self.assertEqual(self.client.get(f'/mine/status/{job_id}').get_json()['status'], 'cancelled')
+
+        # A finished job can't be cancelled again
+        response = self.client.post(f'/mine/cancel/{job_id}')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()['error'], 'Mining job already finished.')
+
+    def test_mine_unknown_job(self):
+        response = self.client.get('/mine/status/unknown_job')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['error'], 'Mining job not found.')
+
+        response = self.client.post('/mine/cancel/unknown_job')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.get_json()['error'], 'Mining job not found.')
 
     @patch.dict('src.app.routes.wallets', {}, clear=True)
     @patch('src.app.routes.blockchain.proof_of_work')
@@ -555,6 +851,18 @@ class TestRoutes(unittest.TestCase):
         self.assertIn('transactions', response_json)
         self.assertEqual(len(response_json['transactions']), 0)  # No transactions in the pool
 
+    @patch('src.app.routes.blockchain', new_callable=Blockchain)
+    def test_get_transactions_by_address(self, blockchain):
+        blockchain.submit_transaction(MINING_SENDER, None, 'address_1', 1.0)
+        blockchain.submit_transaction(MINING_SENDER, None, 'address_2', 2.0)
+
+        response = self.client.get('/transactions/get?address=address_2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([pending['value'] for pending in response.get_json()['transactions']], [2.0])
+
+        response = self.client.get('/transactions/get?address=address_3')
+        self.assertEqual(response.get_json()['transactions'], [])
+
     @patch('src.app.routes.blockchain.chain', new_callable=list)
     def test_full_chain(self, mock_chain):
         # Simulate a blockchain with a few blocks
@@ -607,6 +915,44 @@ class TestRoutes(unittest.TestCase):
         self.assertEqual(len(response_json['chain']), 0)
         self.assertEqual(response_json['length'], 0)
 
+    @patch('src.app.routes.blockchain.chain', new_callable=list)
+    def test_full_chain_pages(self, mock_chain):
+        mock_chain.extend({'block_number': number} for number in range(1, 6))
+
+        response_json = self.client.get('/chain?from=2&to=3').get_json()
+        self.assertEqual([block['block_number'] for block in response_json['chain']], [2, 3])
+        self.assertEqual(response_json['length'], 5)
+
+        self.assertEqual(self.client.get('/chain?from=0').status_code, 400)
+
+    @patch('src.app.routes.blockchain.chain', new_callable=list)
+    def test_full_chain_ndjson(self, mock_chain):
+        mock_chain.extend({'block_number': number} for number in range(1, 4))
+
+        # One block per line, with the length of the chain in a header
+        response = self.client.get('/chain', headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        self.assertEqual(response.headers['X-Chain-Length'], '3')
+        self.assertEqual([json.loads(line) for line in response.data.splitlines()], mock_chain)
+
+        response = self.client.get('/chain/blocks?from=3', headers={'Accept': 'application/x-ndjson'})
+        self.assertEqual([json.loads(line) for line in response.data.splitlines()], [{'block_number': 3}])
+
+    @patch('src.app.routes.blockchain.chain', new_callable=list)
+    def test_full_chain_binary(self, mock_chain):
+        mock_chain.extend({'block_number': number, 'timestamp': 1.0, 'transactions': [], 'nonce': number,
+                           'previous_hash': '0' * 64} for number in range(1, 4))
+
+        response = self.client.get('/chain?from=2', headers={'Accept': BLOCKS_MIMETYPE})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, BLOCKS_MIMETYPE)
+        self.assertEqual(response.headers['X-Chain-Length'], '3')
+        self.assertEqual(list(decode_blocks([response.data])), mock_chain[1:])
+
+        # JSON stays the default
+        self.assertEqual(self.client.get('/chain', headers={'Accept': '*/*'}).mimetype, 'application/json')
+
     def test_swagger_ui(self):
         # Test the Swagger UI route and follow redirects
         response = self.client.get('/swagger', follow_redirects=True)
@@ -0,0 +1,215 @@
+import os
+import sys
+import tempfile
+import sqlite3
+import threading
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.blockchain import Blockchain, MINING_REWARD, MINING_SENDER, PoolFull  # noqa: E402
+from src.storage import BlockStore  # noqa: E402
+
+
+class TestBlockStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'chain.db')
+        self.store = BlockStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def restart(self):
+        """
+        Simulate a node restart by opening the same file again
+        """
+        self.store.close()
+        self.store = BlockStore(self.path)
+        return Blockchain(store=self.store)
+
+    def test_genesis_block_is_stored(self):
+        blockchain = Blockchain(store=self.store)
+
+        chain, hashes = self.store.load_blocks()
+        self.assertEqual(chain, blockchain.chain)
+        self.assertEqual(hashes, blockchain.block_hashes)
+
+    def test_chain_survives_restart(self):
+        blockchain = Blockchain(store=self.store)
+        for _ in range(3):
+            blockchain.submit_transaction(MINING_SENDER, None, 'miner_address', MINING_REWARD)
+            blockchain.create_block(nonce=1, previous_hash=blockchain.block_hashes[-1])
+
+        restarted = self.restart()
+
+        self.assertEqual(restarted.chain, blockchain.chain)
+        self.assertEqual(restarted.block_hashes, blockchain.block_hashes)
+        self.assertEqual(restarted.get_balance('miner_address'), 3 * MINING_REWARD)
+
+        # New blocks continue the stored chain
+        restarted.create_block(nonce=1, previous_hash=restarted.block_hashes[-1])
+        self.assertEqual(len(self.restart().chain), 5)
+
+    def test_spliced_chain_is_stored(self):
+        blockchain = Blockchain(store=self.store)
+        blockchain.create_block(nonce=1, previous_hash='abcd')
+        blockchain.create_block(nonce=2, previous_hash='abcd')
+
+        other_blockchain = Blockchain()
+        blocks = [other_blockchain.create_block(nonce=3, previous_hash='abcd'),
+                  other_blockchain.create_block(nonce=4, previous_hash='abcd')]
+        blockchain.splice_chain(2, blocks)
+
+        restarted = self.restart()
+        self.assertEqual(restarted.chain, blockchain.chain)
+        self.assertEqual(restarted.block_hashes, blockchain.block_hashes)
+
+        # Replacing the whole chain rewrites the store
+        restarted.replace_chain(other_blockchain.chain)
+        self.assertEqual(self.restart().chain, other_blockchain.chain)
+
+    def test_wallets_survive_restart(self):
+        self.store.save_wallet(public_key='public_key', private_key='private_key')
+        self.restart()
+
+        self.assertEqual(self.store.load_wallets(), {'public_key': 'private_key'})
+
+    def test_invalid_sync_policy(self):
+        with self.assertRaises(ValueError):
+            BlockStore(self.path, sync='sometimes')
+
+
+
+class TestSharedBlockStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'chain.db')
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.close()
+        self.directory.cleanup()
+
+    def worker(self):
+        """
+        A Blockchain with its own connection to the shared store, like a WSGI worker process
+        """
+        store = BlockStore(self.path, shared=True)
+        self.stores.append(store)
+        return Blockchain(store=store)
+
+    def test_workers_share_one_node(self):
+        first, second = self.worker(), self.worker()
+
+        # Only the first worker created a genesis block
+        self.assertEqual(first.block_hashes, second.block_hashes)
+        self.assertEqual(first.node_id, second.node_id)
+
+        first.submit_transaction(MINING_SENDER, None, 'miner_address', MINING_REWARD)
+        second.sync()
+        self.assertEqual(list(second.transactions), list(first.transactions))
+        self.assertEqual(second.get_available_balance('miner_address'), MINING_REWARD)
+
+        second.create_block(nonce=1, previous_hash=second.block_hashes[-1])
+        first.sync()
+        self.assertEqual(first.chain, second.chain)
+        self.assertEqual(len(first.transactions), 0)
+        self.assertEqual(first.get_balance('miner_address'), MINING_REWARD)
+
+        # A worker starting later picks up the pool as well
+        first.submit_transaction(MINING_SENDER, None, 'miner_address', MINING_REWARD)
+        self.assertEqual(list(self.worker().transactions), list(first.transactions))
+
+    def test_replaced_chain_is_reloaded(self):
+        first, second = self.worker(), self.worker()
+        first.create_block(nonce=1, previous_hash='abcd')
+        second.sync()
+
+        other_blockchain = Blockchain()
+        other_blockchain.submit_transaction(MINING_SENDER, None, 'miner_address', MINING_REWARD)
+        blocks = [other_blockchain.create_block(nonce=2, previous_hash='abcd'),
+                  other_blockchain.create_block(nonce=3, previous_hash='abcd')]
+        first.splice_chain(1, blocks)
+
+        second.sync()
+        self.assertEqual(second.chain, first.chain)
+        self.assertEqual(second.block_hashes, first.block_hashes)
+        self.assertEqual(second.get_balance('miner_address'), MINING_REWARD)
+
+    def test_registered_nodes_are_shared(self):
+        first, second = self.worker(), self.worker()
+        first.register_node('http://192.168.0.5:5000')
+
+        second.sync()
+        self.assertEqual(second.nodes, {'192.168.0.5:5000'})
+        self.assertEqual(self.worker().nodes, {'192.168.0.5:5000'})
+
+    def test_full_pool_is_shared(self):
+        first, second = self.worker(), self.worker()
+        first.transactions.max_size = second.transactions.max_size = 2
+
+        for value in (1.0, 2.0):
+            first.submit_transaction(MINING_SENDER, None, 'miner_address', value)
+
+        # The other worker counts the transactions of the first one
+        with self.assertRaises(PoolFull):
+            second.submit_transaction(MINING_SENDER, None, 'miner_address', 3.0)
+        self.assertEqual([pending['value'] for pending in second.transactions], [1.0, 2.0])
+        self.assertEqual([pending['value'] for _, pending in self.stores[0].load_transactions()], [1.0, 2.0])
+
+    def test_pool_and_store_stay_in_step(self):
+        blockchain = self.worker()
+        transaction = blockchain.create_transaction(MINING_SENDER, 'miner_address', MINING_REWARD)
+
+        # A transaction the pool refuses is reported and never written to the store
+        with unittest.mock.patch.object(blockchain.transactions, 'add', return_value=False):
+            self.assertFalse(blockchain.add_pending_transaction(dict(transaction)))
+        self.assertEqual(self.stores[0].load_transactions(), [])
+
+        # Nor does the pool keep a transaction the store failed to write
+        with unittest.mock.patch.object(self.stores[0], 'add_transaction', side_effect=sqlite3.OperationalError):
+            with self.assertRaises(sqlite3.OperationalError):
+                blockchain.add_pending_transaction(dict(transaction))
+        self.assertEqual(len(blockchain.transactions), 0)
+
+        self.assertTrue(blockchain.add_pending_transaction(dict(transaction)))
+        (seq, stored), = self.stores[0].load_transactions()
+        self.assertEqual(stored, transaction)
+        self.assertEqual(list(blockchain.transactions.seqs.values()), [seq])
+
+    def test_workers_write_concurrently(self):
+        workers = [self.worker() for _ in range(3)]
+
+        def mine(blockchain):
+            for _ in range(10):
+                # Identical transactions pending at the same time would only be pooled once
+                blockchain.submit_transaction(MINING_SENDER, None, f'miner_{id(blockchain)}', MINING_REWARD)
+                # Every worker forges on top of the latest block, whoever added it
+                with blockchain.write():
+                    blockchain.create_block(nonce=1, previous_hash=blockchain.block_hashes[-1])
+
+        threads = [threading.Thread(target=mine, args=(blockchain,)) for blockchain in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for blockchain in workers:
+            blockchain.sync()
+            self.assertEqual(len(blockchain.chain), 31)
+            self.assertEqual(blockchain.chain, workers[0].chain)
+            for worker in workers:
+                self.assertEqual(blockchain.get_balance(f'miner_{id(worker)}'), 10 * MINING_REWARD)
+        self.assertEqual(self.stores[0].load_blocks()[0], workers[0].chain)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import copy
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(
+    # to solve import issues in src
+    os.path.join(os.path.dirname(__file__), '../src')))
+
+from src.blockchain import Blockchain, MINING_REWARD, MINING_SENDER  # noqa: E402
+from src.wire import decode_blocks, encode_blocks  # noqa: E402
+
+
+class TestWire(unittest.TestCase):
+
+    def build_chain(self, blocks):
+        blockchain = Blockchain()
+        for index in range(blocks):
+            blockchain.submit_transaction(MINING_SENDER, None, 'ab' * 400, MINING_REWARD)
+            blockchain.submit_transaction(MINING_SENDER, None, f'miner_{index % 3}', index)
+            blockchain.create_block(nonce=index, previous_hash=blockchain.block_hashes[-1])
+        return blockchain
+
+    def round_trip(self, blocks, level=1, chunk_size=None):
+        data = b''.join(encode_blocks(blocks, level))
+        if chunk_size:
+            return list(decode_blocks(data[offset:offset + chunk_size] for offset in range(0, len(data), chunk_size)))
+        return list(decode_blocks([data]))
+
+    def test_blocks_round_trip(self):
+        blockchain = self.build_chain(blocks=3)
+        blocks = copy.deepcopy(list(blockchain.chain))
+        # Fields that don't fit the fixed records
+        blocks[1]['extra_field'] = 'extra'
+        blocks[2]['transactions'][0]['signature'] = '0f' * 384
+        blocks[2]['transactions'][1]['signature'] = 'not hex'
+        blocks[2]['transactions'][1]['value'] = '12'
+        blocks[3]['nonce'] = 2**70
+        # A block missing fields of the fixed records
+        blocks.append({'block_number': 5})
+
+        for level in (0, 1):
+            for chunk_size in (None, 7):
+                decoded = self.round_trip(blocks, level, chunk_size)
+                self.assertEqual(decoded, blocks)
+                self.assertEqual([blockchain.hash(block) for block in decoded],
+                                 [blockchain.hash(block) for block in blocks])
+
+    def test_addresses_are_sent_once(self):
+        blocks = list(self.build_chain(blocks=20).chain)
+
+        data = b''.join(encode_blocks(blocks, level=0))
+        self.assertEqual(data.count(bytes.fromhex('ab' * 400)), 1)
+        self.assertLess(len(data), len(json.dumps(blocks)) / 4)
+
+    def test_invalid_streams(self):
+        data = b''.join(encode_blocks(list(self.build_chain(blocks=2).chain)))
+
+        with self.assertRaises(ValueError):
+            list(decode_blocks([b'{"chain": []}']))
+        with self.assertRaises(ValueError):
+            list(decode_blocks([data[:-4]]))
+
+
+if __name__ == '__main__':
+    unittest.main()